@@ -1,15 +1,38 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import functools
+import heapq
+import itertools
 import json
 import logging
 import os
+import struct
+import sys
+import tempfile
 from pathlib import Path
-from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 from cachito.errors import InvalidRequestData
 
 log = logging.getLogger(__name__)
 
+# The version of the packages data files written by PackagesData.write_to_file. In version 1, which
+# has no "version" key, each package embeds its dependencies. In version 2, the unique
+# dependencies are stored once in the "dependencies" table and the packages refer to them by index.
+PACKAGES_DATA_VERSION = 2
+
 
 def _package_sort_key(package: Dict[str, Any]) -> Tuple[str, bool, str, Optional[str]]:
     """Return the sort key for sorting packages.
@@ -64,18 +87,264 @@ def unique_packages(packages: List[Dict[str, Any]]) -> Iterator:
             j += 1
 
 
+# The packages data files are written with each dependency and package on its own line, so they
+# can be read one item at a time. They are valid JSON documents all the same.
+_DEPENDENCIES_START = f'{{"version": {PACKAGES_DATA_VERSION}, "dependencies": [\n'
+_PACKAGES_START = '], "packages": [\n'
+_END = "]}\n"
+
+
+def _write_items(f: TextIO, items: Iterable[Dict[str, Any]]) -> None:
+    separator = ""
+    for item in items:
+        f.write(separator)
+        f.write(json.dumps(item))
+        separator = ",\n"
+    if separator:
+        f.write("\n")
+
+
+def _write_packages_data(
+    f: TextIO, dependencies: Iterable[Dict[str, Any]], packages: Iterable[Dict[str, Any]]
+) -> None:
+    """Write the dependency table and the packages to a packages data file, one at a time.
+
+    :param f: the file to write to
+    :param dependencies: the dependency table
+    :param packages: the packages referring to the dependencies by index
+    """
+    f.write(_DEPENDENCIES_START)
+    _write_items(f, dependencies)
+    f.write(_PACKAGES_START)
+    _write_items(f, packages)
+    f.write(_END)
+
+
+class _PackagesDataFileReader:
+    """Read the dependency table and the packages of a packages data file one at a time.
+
+    Files which are not written one item per line, by previous versions, are loaded at once.
+    """
+
+    def __init__(self, file_name: Union[str, Path]) -> None:
+        """Initialize the reader of the given file, it does not need to exist."""
+        self.file_name = file_name
+        self._table: Optional[Tuple[List["_Record"], List[Dict[str, Any]]]] = None
+        if os.path.exists(file_name):
+            with open(file_name, "r", encoding="utf-8") as f:
+                if f.readline() == _DEPENDENCIES_START:
+                    return
+
+        packages_data = PackagesData()
+        packages_data.load(file_name)
+        self._table = packages_data._to_table()
+
+    def iter_dependencies(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the dependency table of the file."""
+        if self._table is not None:
+            yield from (dep.to_dict() for dep in self._table[0])
+            return
+
+        with open(self.file_name, "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                if line == _PACKAGES_START:
+                    return
+                yield json.loads(line.rstrip(",\n"))
+
+    def iter_packages(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the packages of the file, their dependencies are indexes to the table."""
+        if self._table is not None:
+            yield from self._table[1]
+            return
+
+        with open(self.file_name, "r", encoding="utf-8") as f:
+            for line in f:
+                if line == _PACKAGES_START:
+                    break
+            for line in f:
+                if line == _END:
+                    return
+                yield json.loads(line.rstrip(",\n"))
+
+
+def merge_packages_data_files(
+    file_names: List[Union[str, Path]], output_file: Union[str, Path]
+) -> Tuple[int, int]:
+    """Merge packages data files into a single one, streaming their contents.
+
+    The dependency tables of the files are concatenated and their packages are merged in sorted
+    order, so only a few items of each file are in memory at a time. The files must be written by
+    ``PackagesData.write_to_file``, which sorts the packages and the dependency tables.
+
+    :param file_names: the packages data files to merge, missing files are skipped
+    :param output_file: the file to write the merged packages data into
+    :return: the number of packages and the number of unique dependencies, as they would be counted
+        by ``PackagesData.packages`` and ``PackagesData.all_dependencies``
+    :rtype: tuple[int, int]
+    :raises InvalidRequestData: if a package is in more than one of the files
+    """
+    readers = [_PackagesDataFileReader(file_name) for file_name in file_names]
+    offsets = []
+    packages_count = 0
+
+    def iter_table() -> Iterator[Dict[str, Any]]:
+        for reader in readers:
+            count = 0
+            for dep in reader.iter_dependencies():
+                count += 1
+                yield dep
+            offsets.append(count)
+
+    def iter_packages(reader: _PackagesDataFileReader, offset: int) -> Iterator[Dict[str, Any]]:
+        for package in reader.iter_packages():
+            package["dependencies"] = [offset + index for index in package["dependencies"]]
+            yield package
+
+    def iter_merged_packages() -> Iterator[Dict[str, Any]]:
+        nonlocal packages_count
+        start = itertools.accumulate(offsets[:-1], initial=0)
+        last_key = None
+        for package in heapq.merge(*map(iter_packages, readers, start), key=_package_sort_key):
+            key = (package["name"], package["type"], package["version"])
+            if key == last_key:
+                raise InvalidRequestData(f"Duplicate package: {package!r}")
+            last_key = key
+            packages_count += 1
+            yield package
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        _write_packages_data(f, iter_table(), iter_merged_packages())
+
+    # Like all_dependencies, count the dependencies which differ in type, dev, name or version
+    dependencies_count = 0
+    last_key = None
+    merged_dependencies = heapq.merge(
+        *(reader.iter_dependencies() for reader in readers), key=_package_sort_key
+    )
+    for key in map(_package_sort_key, merged_dependencies):
+        if key != last_key:
+            dependencies_count += 1
+            last_key = key
+
+    log.debug(
+        "Merged %d packages with %d unique dependencies into file %s.",
+        packages_count,
+        dependencies_count,
+        output_file,
+    )
+    return packages_count, dependencies_count
+
+
+class _Layout:
+    """The keys of the records which have the same keys.
+
+    The records only store their values, the keys are stored once in the layout shared by them.
+    The layout also knows the positions of the values the records are sorted by.
+    """
+
+    __slots__ = ("keys", "_type", "_dev", "_name", "_version")
+
+    def __init__(self, keys: Tuple[str, ...]) -> None:
+        """Initialize the layout of the records with the given sorted keys."""
+        self.keys = keys
+        # The values of a record follow its layout, so they start at index 1
+        positions = {key: i for i, key in enumerate(keys, start=1)}
+        self._type = positions.get("type")
+        self._dev = positions.get("dev")
+        self._name = positions.get("name")
+        self._version = positions.get("version")
+
+    def sort_key(self, record: "_Record") -> Tuple[str, bool, str, Optional[str]]:
+        """Return the same sort key for the record as ``_package_sort_key`` for its dict."""
+        dev = False if self._dev is None else record[self._dev]
+        return record[self._type], dev, record[self._name], record[self._version]
+
+
+@functools.lru_cache(maxsize=256)
+def _get_layout(keys: Tuple[str, ...]) -> _Layout:
+    return _Layout(keys)
+
+
+class _Record(tuple):
+    """An immutable package or dependency, stored as its layout followed by its values.
+
+    Nested mappings are stored as records and lists as tuples.
+    """
+
+    __slots__ = ()
+
+    def sort_key(self) -> Tuple[str, bool, str, Optional[str]]:
+        """Return the sort key of the record, see ``_package_sort_key``."""
+        return self[0].sort_key(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materialize the record as the dict it was created from."""
+        return {
+            key: _thaw(value) for key, value in zip(self[0].keys, itertools.islice(self, 1, None))
+        }
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class _Package:
+    """A package with its dependencies."""
+
+    __slots__ = ("info", "dependencies")
+
+    def __init__(self, info: _Record, dependencies: List[_Record]) -> None:
+        """Initialize the package with the record of its info and of its dependencies."""
+        self.info = info
+        self.dependencies = dependencies
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materialize the package as a dict with the list of its dependencies."""
+        package = self.info.to_dict()
+        package["dependencies"] = [dep.to_dict() for dep in self.dependencies]
+        return package
+
+
 class PackagesData:
-    """A collection of resolved packages."""
+    """A collection of resolved packages.
+
+    The packages and dependencies are stored compactly as records with interned strings, so
+    large requests fit in memory. Equal dependencies of different packages share one record.
+    They are materialized as dicts only when they are accessed.
+    """
 
     def __init__(self) -> None:
         """Initialize an empty PackagesData instance."""
         self._index: Set[Tuple[str, str, str]] = set()
-        self._packages: List[Dict[str, Any]] = []
+        self._packages: List[_Package] = []
+        self._records: Dict[_Record, _Record] = {}
 
     @property
     def packages(self) -> List[Dict[str, Any]]:
-        """Get added packages."""
-        return self._packages
+        """Get added packages.
+
+        The packages are materialized on every access, changing them does not change the data.
+        """
+        return list(self.iter_packages())
+
+    @property
+    def packages_count(self) -> int:
+        """Get the number of added packages."""
+        return len(self._packages)
+
+    def iter_packages(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the added packages, materializing one at a time.
+
+        :return: an iterator of the packages in the order they are stored.
+        :rtype: Iterator[dict[str, any]]
+        """
+        for package in self._packages:
+            yield package.to_dict()
 
     @property
     def all_dependencies(self) -> List[Dict[str, Any]]:
@@ -85,14 +354,50 @@ class PackagesData:
             every package. If no package is added, an empty list will be returned.
         :rtype: list[dict[str, any]]
         """
-        return list(
-            unique_packages(
-                sorted(
-                    (dep for pkg in self._packages for dep in pkg["dependencies"]),
-                    key=_package_sort_key,
-                )
-            )
-        )
+        return list(self.iter_all_dependencies())
+
+    @property
+    def dependencies_count(self) -> int:
+        """Get the number of dependencies in ``all_dependencies``."""
+        return len(self._unique_dependencies())
+
+    def iter_all_dependencies(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the dependencies in ``all_dependencies``, materializing one at a time.
+
+        :return: an iterator of the sorted and deduplicated dependencies of every package.
+        :rtype: Iterator[dict[str, any]]
+        """
+        for dep in self._unique_dependencies():
+            yield dep.to_dict()
+
+    def _unique_dependencies(self) -> List[_Record]:
+        # Equal dependencies share a record, skip the repeated ones before sorting. The first
+        # occurrence of each one is kept, so the result is the same as sorting all of them.
+        dependencies = dict.fromkeys(dep for pkg in self._packages for dep in pkg.dependencies)
+        unique = []
+        last_key = None
+        for dep in sorted(dependencies, key=_Record.sort_key):
+            key = dep.sort_key()
+            if key != last_key:
+                unique.append(dep)
+                last_key = key
+        return unique
+
+    def _freeze(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return self._make_record(value)
+        if isinstance(value, list):
+            return tuple(self._freeze(item) for item in value)
+        if isinstance(value, str):
+            return sys.intern(value)
+        return value
+
+    def _make_record(self, data: Dict[str, Any], share: bool = True) -> _Record:
+        keys = tuple(sorted(data))
+        record = _Record((_get_layout(keys), *(self._freeze(data[key]) for key in keys)))
+        if not share:
+            return record
+        return self._records.setdefault(record, record)
 
     def add_package(self, pkg_info: Dict[str, str], path: str, deps: List[Dict[str, Any]]) -> None:
         """Add a package with deps.
@@ -106,35 +411,64 @@ class PackagesData:
         :raises InvalidRequestData: if there is a package with same name, type and version
             has been added already.
         """
+        self._add_package(pkg_info, path, [self._make_record(dep) for dep in deps])
+
+    def _add_package(self, pkg_info: Dict[str, str], path: str, deps: List[_Record]) -> None:
         key = (pkg_info["name"], pkg_info["type"], pkg_info["version"])
         if key in self._index:
             raise InvalidRequestData(f"Duplicate package: {pkg_info!r}")
         self._index.add(key)
-        package = {
+        info = {
             "name": pkg_info["name"],
             "type": pkg_info["type"],
             "version": pkg_info["version"],
-            "dependencies": deps,
         }
         if path != os.curdir:
-            package["path"] = path
-        self._packages.append(package)
+            info["path"] = path
+        self._packages.append(_Package(self._make_record(info), deps))
+
+    def _to_table(self) -> Tuple[List[_Record], List[Dict[str, Any]]]:
+        """Sort the data and split it into the dependency table and the packages referring to it.
+
+        The table is sorted like the dependencies, see ``_package_sort_key``.
+        """
+        self.sort()
+        dependencies = sorted(
+            dict.fromkeys(dep for pkg in self._packages for dep in pkg.dependencies),
+            key=_Record.sort_key,
+        )
+        indexes = {dep: index for index, dep in enumerate(dependencies)}
+        packages = []
+        for package in self._packages:
+            data = package.info.to_dict()
+            data["dependencies"] = [indexes[dep] for dep in package.dependencies]
+            packages.append(data)
+        return dependencies, packages
 
     def write_to_file(self, file_name: Union[str, Path]) -> None:
         """Write the added packages to a file as JSON data.
 
         It ensures that the packages and every package's dependencies are sorted
-        by the combination in the order of type, dev, name and version.
+        by the combination in the order of type, dev, name and version. The data is written
+        in the ``PACKAGES_DATA_VERSION`` format, so each distinct dependency is only written once.
+        The table of dependencies is sorted the same way, so the file can be merged with
+        ``merge_packages_data_files``.
 
         :param file_name: an absolute or relative filename to write the added packages into.
             When a relative path is used, it will be opened directly and depends on the
             ``os.curdir``.
         :type file_name: str or pathlib.Path
         """
-        self.sort()
-        log.debug("Write packages with dependencies into file %s.", file_name)
+        dependencies, packages = self._to_table()
+
+        log.debug(
+            "Write %d packages with %d distinct dependencies into file %s.",
+            len(packages),
+            len(dependencies),
+            file_name,
+        )
         with open(file_name, "w", encoding="utf-8") as f:
-            json.dump({"packages": self._packages}, f)
+            _write_packages_data(f, (dep.to_dict() for dep in dependencies), packages)
 
     def _clear_nfs_cache(self, file_name: Union[str, Path]) -> None:
         """
@@ -155,10 +489,13 @@ class PackagesData:
     def load(self, file_name: Union[str, Path]) -> None:
         """Load data from a specified file written by write_to_file method.
 
+        Files of every version are supported.
+
         :param file_name: an absolute or relative filename to write the added packages into.
             When a relative path is used, it will be opened directly and depends on the
             ``os.curdir``. If the file does not exist, nothing is changed internally.
         :type file_name: str or pathlib.Path
+        :raises InvalidRequestData: if the version of the file is not supported.
         """
         self._clear_nfs_cache(file_name)
 
@@ -175,8 +512,23 @@ class PackagesData:
 
             log.info("Loaded file %s, found %i packages.", file_name, len(packages))
 
-            for p in packages:
-                self.add_package(p, p.get("path", os.curdir), p["dependencies"])
+            version = data.get("version", 1)
+            if version == 1:
+                for p in packages:
+                    self.add_package(p, p.get("path", os.curdir), p["dependencies"])
+            elif version == 2:
+                # The dependencies in the table are unique already, so they are not looked up in
+                # the shared records. Replace them one by one to free the parsed dicts early.
+                dependencies = data["dependencies"]
+                for index, dep in enumerate(dependencies):
+                    dependencies[index] = self._make_record(dep, share=False)
+                for p in packages:
+                    deps = [dependencies[index] for index in p["dependencies"]]
+                    self._add_package(p, p.get("path", os.curdir), deps)
+            else:
+                raise InvalidRequestData(
+                    f"Unsupported version {version!r} of the packages data file {file_name}"
+                )
 
     def sort(self):
         """Sort both added packages and every package's dependencies in place.
@@ -184,8 +536,222 @@ class PackagesData:
         Sorting order: type -> dev -> name -> version.
         If a package has a "dependencies" list, the packages inside it will be sorted as well.
         """
-        self._packages.sort(key=_package_sort_key)
+        self._packages.sort(key=lambda package: package.info.sort_key())
         for package in self._packages:
-            deps = package.get("dependencies")
-            if deps:
-                deps.sort(key=_package_sort_key)
+            package.dependencies.sort(key=_Record.sort_key)
+
+
+class PackagesDataIndex:
+    """An index of the lines of a packages data file, to read slices of it without loading it.
+
+    The index holds the offsets of the dependency table, of the packages and of the dependencies
+    as listed by ``PackagesData.all_dependencies``. The packages and dependencies are sorted, so
+    they are grouped by type and dev, and sorted by name within each group. A filtered slice is
+    found with a binary search in the groups and only the lines of the slice are read.
+
+    The index is stored in a file which starts with a JSON header line followed by the offsets
+    as little-endian unsigned 64-bit integers. Only files written one item per line can be
+    indexed, see ``PackagesData.write_to_file``.
+    """
+
+    VERSION = 1
+
+    def __init__(self, file_name: Union[str, Path], header: Dict[str, Any], offsets: bytes):
+        """Initialize the index, use ``open`` to get the index of a file instead."""
+        self.file_name = file_name
+        self._header = header
+        self._offsets = offsets
+        # The offsets are stored in the order: table, packages, dependencies
+        table_count, packages_count, _ = header["counts"]
+        self._bases = {
+            "table": 0,
+            "packages": table_count,
+            "dependencies": table_count + packages_count,
+        }
+
+    @classmethod
+    def open(
+        cls, file_name: Union[str, Path], index_file_name: Union[str, Path]
+    ) -> Optional["PackagesDataIndex"]:
+        """Get the index of a packages data file, building it if it is missing or outdated.
+
+        :param file_name: the packages data file
+        :param index_file_name: the file the index is stored in
+        :return: the index, or None if the file is not written one item per line
+        :rtype: PackagesDataIndex or None
+        """
+        stat = os.stat(file_name)
+        try:
+            with open(index_file_name, "rb") as f:
+                header = json.loads(f.readline())
+                offsets = f.read()
+        except (OSError, ValueError):
+            header = {}
+
+        if header.get("version") != cls.VERSION or header.get("file") != [
+            stat.st_size,
+            stat.st_mtime_ns,
+        ]:
+            if not cls.build(file_name, index_file_name):
+                return None
+            return cls.open(file_name, index_file_name)
+
+        return cls(file_name, header, offsets)
+
+    @classmethod
+    def build(cls, file_name: Union[str, Path], index_file_name: Union[str, Path]) -> bool:
+        """Build the index of a packages data file and store it, replacing it atomically.
+
+        :param file_name: the packages data file
+        :param index_file_name: the file to store the index in
+        :return: False if the file is not written one item per line, so it cannot be indexed
+        :rtype: bool
+        """
+        stat = os.stat(file_name)
+        table: List[Tuple[Tuple[str, bool, str, Optional[str]], int]] = []
+        packages: List[Tuple[str, bool, int]] = []
+        with open(file_name, "rb") as f:
+            first_line = f.readline()
+            if first_line != _DEPENDENCIES_START.encode():
+                return False
+            offset = len(first_line)
+            for line in f:
+                if line == _PACKAGES_START.encode():
+                    offset += len(line)
+                    break
+                table.append((_package_sort_key(json.loads(line.rstrip(b",\n"))), offset))
+                offset += len(line)
+            for line in f:
+                if line == _END.encode():
+                    break
+                package = json.loads(line.rstrip(b",\n"))
+                packages.append((package["type"], package.get("dev", False), offset))
+                offset += len(line)
+
+        # The dependencies as listed by all_dependencies, the first one of those which have the
+        # same sort key is kept
+        dependencies = []
+        for key, offset in sorted(table, key=lambda item: item[0]):
+            if not dependencies or dependencies[-1][:4] != key:
+                dependencies.append((*key, offset))
+
+        header = {
+            "version": cls.VERSION,
+            "file": [stat.st_size, stat.st_mtime_ns],
+            "counts": [len(table), len(packages), len(dependencies)],
+            "packages": _get_groups(packages),
+            "dependencies": _get_groups(dependencies),
+        }
+        offsets = [
+            *(offset for _, offset in table),
+            *(package[-1] for package in packages),
+            *(dep[-1] for dep in dependencies),
+        ]
+        content = json.dumps(header).encode() + b"\n" + struct.pack(f"<{len(offsets)}Q", *offsets)
+
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f"{os.path.basename(index_file_name)}.",
+            suffix=".tmp",
+            dir=os.path.dirname(index_file_name) or os.curdir,
+        )
+        try:
+            with open(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, index_file_name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        log.debug("Wrote the index of the packages data file %s to %s", file_name, index_file_name)
+        return True
+
+    def select(
+        self,
+        kind: str,
+        types: Optional[List[str]] = None,
+        dev: Optional[bool] = None,
+        name: Optional[str] = None,
+    ) -> List[range]:
+        """Select the packages or dependencies matching the filters.
+
+        :param str kind: ``packages`` or ``dependencies``
+        :param types: the types to select, all of them if not set
+        :param dev: select only the dev or non-dev ones if set
+        :param name: select only the ones with this name if set
+        :return: the ranges of positions of the selected items, in sort order
+        :rtype: list[range]
+        """
+        ranges = []
+        with open(self.file_name, "rb") as f:
+            for group_type, group_dev, start, stop in self._header[kind]:
+                if types and group_type not in types:
+                    continue
+                if dev is not None and group_dev != dev:
+                    continue
+                if name is not None:
+                    start = self._bisect_name(f, kind, start, stop, name, right=False)
+                    stop = self._bisect_name(f, kind, start, stop, name, right=True)
+                if start < stop:
+                    ranges.append(range(start, stop))
+        return ranges
+
+    def read(self, kind: str, ranges: List[range], offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Read a slice of the selected packages or dependencies.
+
+        The dependencies of the packages are included as in ``PackagesData.packages``.
+
+        :param str kind: ``packages`` or ``dependencies``
+        :param ranges: the selected items, see ``select``
+        :param int offset: the number of selected items to skip
+        :param int limit: the maximum number of items to read
+        :return: the items
+        :rtype: list[dict[str, any]]
+        """
+        positions = itertools.islice(itertools.chain.from_iterable(ranges), offset, offset + limit)
+        items = []
+        with open(self.file_name, "rb") as f:
+            for position in positions:
+                item = self._read_item(f, self._item_offset(kind, position))
+                if kind == "packages":
+                    item["dependencies"] = [
+                        self._read_item(f, self._item_offset("table", index))
+                        for index in item["dependencies"]
+                    ]
+                items.append(item)
+        return items
+
+    def _item_offset(self, kind: str, position: int) -> int:
+        return struct.unpack_from("<Q", self._offsets, (self._bases[kind] + position) * 8)[0]
+
+    @staticmethod
+    def _read_item(f: BinaryIO, offset: int) -> Dict[str, Any]:
+        f.seek(offset)
+        return json.loads(f.readline().rstrip(b",\n"))
+
+    def _bisect_name(
+        self, f: BinaryIO, kind: str, start: int, stop: int, name: str, right: bool
+    ) -> int:
+        # The items of a group are sorted by name, find the first one after (or with) the name
+        while start < stop:
+            middle = (start + stop) // 2
+            item_name = self._read_item(f, self._item_offset(kind, middle))["name"]
+            if item_name < name or (right and item_name == name):
+                start = middle + 1
+            else:
+                stop = middle
+        return start
+
+
+def _get_groups(items: List[Tuple[Any, ...]]) -> List[List[Any]]:
+    """Get the groups of the items which have the same type and dev.
+
+    :param items: the sorted items as tuples starting with their type and dev
+    :return: the type, dev, start and stop positions of each group
+    """
+    groups: List[List[Any]] = []
+    for position, item in enumerate(items):
+        if groups and groups[-1][:2] == [item[0], item[1]]:
+            groups[-1][3] = position + 1
+        else:
+            groups.append([item[0], item[1], position, position + 1])
+    return groups
@@ -58,8 +58,12 @@ class RequestBundleDir(base_path):
 
         self.bundle_archive_file = Path(root, f"{request_id}.tar.gz")
         self.bundle_archive_checksum = Path(root, f"{request_id}.checksum.sha256")
+        self.bundle_components_dir = Path(root, f"{request_id}-components")
 
         self.packages_data = Path(root, f"{request_id}-packages.json")
+        self.packages_data_index = Path(root, f"{request_id}-packages.index")
+        self.content_manifest = Path(root, f"{request_id}-content-manifest.json")
+        self.content_manifest_metadata = Path(root, f"{request_id}-content-manifest.meta.json")
         self.gomod_packages_data = self.joinpath("gomod_packages.json")
         self.npm_packages_data = self.joinpath("npm_packages.json")
         self.pip_packages_data = self.joinpath("pip_packages.json")
@@ -73,6 +77,16 @@ class RequestBundleDir(base_path):
         """Create a new ``RequestBundleDir`` object with the sources pointed to the subpath."""
         return RequestBundleDir(self._request_id, self._path_root, subpath)
 
+    def component_archive_file(self, component):
+        """
+        Get the path to the archive of a single bundle component.
+
+        :param str component: the component of the bundle, such as ``app`` or ``deps/npm``
+        :return: the path to the component archive
+        :rtype: Path
+        """
+        return self.bundle_components_dir.joinpath(f"{component}.tar.gz")
+
     def relpath(self, path):
         """Get the relative path of a path from the root of the source directory."""
         return os.path.relpath(path, start=self.source_root_dir)
@@ -1,12 +1,15 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import functools
-import json
+import hashlib
+import heapq
 import os
-import tempfile
+import shutil
 from collections import OrderedDict
 from copy import deepcopy
+from dataclasses import dataclass, field
 from datetime import date, datetime
-from typing import Any, Dict, Union
+from http import HTTPStatus
+from typing import Any, Dict, List, Union
 
 import flask
 import kombu.exceptions
@@ -14,31 +17,47 @@ import pydantic
 from celery import chain
 from flask import stream_with_context
 from flask_login import current_user, login_required
+from flask_sqlalchemy import Pagination
 from sqlalchemy import and_, func
 from sqlalchemy.orm import joinedload, load_only
 from werkzeug.exceptions import BadRequest, Forbidden, Gone, InternalServerError, NotFound
 
-from cachito.common.checksum import hash_file
-from cachito.common.packages_data import PackagesData
+from cachito.common.packages_data import PackagesData, PackagesDataIndex
 from cachito.common.paths import RequestBundleDir
 from cachito.common.utils import b64encode
 from cachito.errors import MessageBrokerError, NoWorkers, RequestErrorOrigin, ValidationError
 from cachito.web import db
-from cachito.web.content_manifest import BASE_ICM
+from cachito.web.content_manifest import (
+    BASE_ICM,
+    get_stored_content_manifest,
+    iter_stored_image_contents,
+    store_content_manifest,
+)
 from cachito.web.metrics import cachito_metrics
 from cachito.web.models import (
     ConfigFileBase64,
     EnvironmentVariable,
+    IndexedDependency,
     PackageManager,
     Request,
     RequestError,
+    RequestMetric,
     RequestState,
     RequestStateMapping,
     is_request_ref_valid,
     is_request_repo_valid,
+    request_indexed_dependency_table,
 )
 from cachito.web.status import status
-from cachito.web.utils import deep_sort_icm, normalize_end_date, pagination_metadata, str_to_bool
+from cachito.web.utils import (
+    SORT_KEY_BY_PURL,
+    get_file_sha256,
+    iter_merged_tar_gz,
+    json_stream_response,
+    normalize_end_date,
+    pagination_metadata,
+    str_to_bool,
+)
 from cachito.workers import tasks
 
 api_v1 = flask.Blueprint("api_v1", __name__)
@@ -108,8 +127,7 @@ def get_requests():
                 f"{state} is not a valid request state. Valid states are: {states}"
             )
         state_int = RequestStateMapping.__members__[state].value
-        query = query.join(RequestState, Request.request_state_id == RequestState.id)
-        query = query.filter(RequestState.state == state_int)
+        query = query.filter(Request.current_state == state_int)
     repo = flask.request.args.get("repo")
     if repo:
         if not is_request_repo_valid(repo):
@@ -122,7 +140,7 @@ def get_requests():
         query = query.filter(Request.ref == ref)
     pkg_managers = flask.request.args.getlist("pkg_manager")
     if pkg_managers:
-        pkg_manager_ids = []
+        pkg_managers_mask = 0
         for name in pkg_managers:
             if not name:
                 # Ignore if pkg_manager= presents in the querystring
@@ -130,13 +148,10 @@ def get_requests():
             pkg_manager: PackageManager = PackageManager.get_by_name(name)
             if pkg_manager is None:
                 raise ValidationError(f"Cachito does not have package manager {name}.")
-            pkg_manager_ids.append(pkg_manager.id)
-        if pkg_manager_ids:
-            query = (
-                query.join(PackageManager, Request.pkg_managers)
-                .filter(PackageManager.id.in_(pkg_manager_ids))
-                .group_by(Request.id)
-                .having(func.count(PackageManager.id) == len(pkg_manager_ids))
+            pkg_managers_mask |= pkg_manager.mask
+        if pkg_managers_mask:
+            query = query.filter(
+                Request.pkg_managers_mask.op("&")(pkg_managers_mask) == pkg_managers_mask
             )
     try:
         per_page = int(flask.request.args.get("per_page", 10))
@@ -156,6 +171,73 @@ def get_requests():
     return flask.jsonify(response)
 
 
+# Resources of stale requests never change again, except for the details of the request whose
+# state history is compacted. Resources of complete requests change when the request becomes stale.
+# Clients must revalidate the resources which can change.
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def get_request_etag(request, *validators):
+    """
+    Get a strong ETag for a resource of a complete or stale request.
+
+    The resources of complete and stale requests only change when the request changes state, so
+    the ETag is derived from the latest state of the request and the given validators, such as
+    the checksum of a file the resource is read from.
+
+    :param Request request: the request the resource belongs to
+    :param validators: any other values the resource depends on
+    :return: the ETag or None if the request is neither complete nor stale
+    :rtype: str
+    """
+    if request.state.state_name not in (
+        RequestStateMapping.complete.name,
+        RequestStateMapping.stale.name,
+    ):
+        return None
+
+    validator = ":".join(str(v) for v in (request.id, request.state.id, *validators))
+    return hashlib.sha256(validator.encode("utf-8")).hexdigest()
+
+
+def send_request_resource(request, make_response, *validators, immutable=True):
+    """
+    Send a resource of a request, with a strong ETag if the request is complete or stale.
+
+    See ``get_request_etag`` for how the ETag is derived. If the client already has the resource,
+    ``make_response`` is not called and a "304 Not Modified" response is sent back.
+
+    :param Request request: the request the resource belongs to
+    :param callable make_response: a function returning the response with the resource
+    :param validators: any other values the resource depends on
+    :param bool immutable: whether the resource never changes once the request is stale
+    :return: a Flask response
+    :rtype: flask.Response
+    """
+    etag = get_request_etag(request, *validators)
+    if etag is None:
+        return make_response()
+
+    if flask.request.if_none_match.contains(etag):
+        resp = flask.Response(status=HTTPStatus.NOT_MODIFIED)
+    else:
+        resp = flask.make_response(make_response())
+
+    resp.set_etag(etag)
+    if immutable and request.state.state_name == RequestStateMapping.stale.name:
+        resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        resp.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    return resp
+
+
+def _get_file_validator(path):
+    """Get a value that changes whenever the file at the given path changes, without reading it."""
+    stat = path.stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
 @api_v1.route("/requests/<int:request_id>", methods=["GET"])
 def get_request(request_id):
     """
@@ -166,22 +248,68 @@ def get_request(request_id):
     :rtype: flask.Response
     :raise NotFound: if the request is not found
     """
-    json = Request.query.get_or_404(request_id).to_json()
+    request = Request.query.get_or_404(request_id)
 
-    if json["state"] == RequestStateMapping.complete.name:
-        package_count = len(json["packages"])
-        dependency_count = len(json["dependencies"])
+    def make_response():
+        json = request.to_json()
 
-        flask.current_app.logger.info(
-            "Returning data for request %i. Found %i packages and %i dependencies. "
-            "The following package managers were used: %s.",
-            request_id,
-            package_count,
-            dependency_count,
-            json["pkg_managers"],
+        if json["state"] == RequestStateMapping.complete.name:
+            package_count = len(json["packages"])
+            dependency_count = len(json["dependencies"])
+
+            flask.current_app.logger.info(
+                "Returning data for request %i. Found %i packages and %i dependencies. "
+                "The following package managers were used: %s.",
+                request_id,
+                package_count,
+                dependency_count,
+                json["pkg_managers"],
+            )
+
+        return flask.jsonify(json)
+
+    # Compacting the state history of a stale request removes some of its states
+    validators = [flask.request.host_url, len(request.states)]
+    if request.state.state_name == RequestStateMapping.complete.name:
+        bundle_dir = RequestBundleDir(
+            request.id, root=flask.current_app.config["CACHITO_BUNDLES_DIR"]
         )
+        if bundle_dir.packages_data.exists():
+            validators.append(_get_file_validator(bundle_dir.packages_data))
 
-    return flask.jsonify(json)
+    return send_request_resource(request, make_response, *validators, immutable=False)
+
+
+@api_v1.route("/requests/<int:request_id>/state", methods=["GET"])
+def get_request_state(request_id):
+    """
+    Retrieve the current state of the given request.
+
+    This is a lightweight alternative to ``get_request`` for clients that poll the state, such as
+    the workers, since it doesn't load the packages of the request.
+
+    :param int request_id: the value of the request ID
+    :return: a Flask JSON response
+    :rtype: flask.Response
+    :raise NotFound: if the request is not found
+    """
+    state = (
+        db.session.query(RequestState.state, RequestState.state_reason, RequestState.updated)
+        .join(Request, Request.request_state_id == RequestState.id)
+        .filter(Request.id == request_id)
+        .one_or_none()
+    )
+    if state is None:
+        raise NotFound()
+
+    return flask.jsonify(
+        {
+            "id": request_id,
+            "state": RequestStateMapping(state.state).name,
+            "state_reason": state.state_reason,
+            "updated": state.updated.isoformat(),
+        }
+    )
 
 
 @api_v1.route("/requests/<int:request_id>/configuration-files", methods=["GET"])
@@ -194,10 +322,14 @@ def get_request_config_files(request_id):
     :rtype: flask.Response
     :raise NotFound: if the request is not found
     """
-    config_files = Request.query.get_or_404(request_id).config_files_base64
-    config_files_json = [config_file.to_json() for config_file in config_files]
-    config_files_json = sorted(config_files_json, key=lambda c: c["path"])
-    return flask.jsonify(config_files_json)
+    request = Request.query.get_or_404(request_id)
+
+    def make_response():
+        config_files_json = [config_file.to_json() for config_file in request.config_files_base64]
+        config_files_json = sorted(config_files_json, key=lambda c: c["path"])
+        return flask.jsonify(config_files_json)
+
+    return send_request_resource(request, make_response)
 
 
 @api_v1.route("/requests/<int:request_id>/content-manifest", methods=["GET"])
@@ -205,6 +337,9 @@ def get_request_content_manifest(request_id):
     """
     Retrieve the content manifest associated with the given request.
 
+    The content manifest of a complete request is served from the file stored when the request
+    was completed.
+
     :param int request_id: the value of the request ID
     :return: a Flask JSON response
     :rtype: flask.Response
@@ -216,9 +351,21 @@ def get_request_content_manifest(request_id):
         raise ValidationError(
             'Content manifests are only available for requests in the "complete" or "stale" states'
         )
-    content_manifest = request.content_manifest
-    content_manifest_json = content_manifest.to_json()
-    return send_content_manifest_back(content_manifest_json)
+    if request.state.state_name == "complete":
+        content_manifest_path, checksum = get_stored_content_manifest(request)
+        return send_request_resource(
+            request,
+            lambda: flask.send_file(
+                str(content_manifest_path), mimetype="application/json", etag=False
+            ),
+            checksum,
+        )
+
+    # The packages of stale requests are deleted, so their content manifests are empty and there
+    # is nothing to stream from a file
+    return send_request_resource(
+        request, lambda: send_content_manifest_back(request.content_manifest.to_json())
+    )
 
 
 @api_v1.route("/requests/<int:request_id>/environment-variables", methods=["GET"])
@@ -231,11 +378,15 @@ def get_request_environment_variables(request_id):
     :rtype: flask.Response
     :raise NotFound: if the request is not found
     """
-    env_vars = Request.query.get_or_404(request_id).environment_variables
-    env_vars_json = OrderedDict()
-    for env_var in env_vars:
-        env_vars_json[env_var.name] = {"value": env_var.value, "kind": env_var.kind}
-    return flask.jsonify(env_vars_json)
+    request = Request.query.get_or_404(request_id)
+
+    def make_response():
+        env_vars_json = OrderedDict()
+        for env_var in request.environment_variables:
+            env_vars_json[env_var.name] = {"value": env_var.value, "kind": env_var.kind}
+        return flask.jsonify(env_vars_json)
+
+    return send_request_resource(request, make_response)
 
 
 @api_v1.route("/requests/<int:request_id>/download", methods=["GET"])
@@ -243,6 +394,11 @@ def download_archive(request_id):
     """
     Download archive of source code.
 
+    Range requests are supported so that interrupted downloads can be resumed. If configured,
+    the web server in front of the API sends the archive instead, see
+    ``CACHITO_BUNDLE_DOWNLOAD_OFFLOAD``. The ``include`` query parameter limits the download to
+    some components of the bundle, for example ``app`` or ``deps/npm``.
+
     :param int request_id: the value of the request ID
     :return: a Flask send_file response
     :rtype: flask.Response
@@ -264,25 +420,130 @@ def download_archive(request_id):
         )
         raise InternalServerError()
 
-    hasher = hash_file(bundle_dir.bundle_archive_file)
-    checksum = hasher.hexdigest()
     store_checksum = bundle_dir.bundle_archive_checksum.read_text(encoding="utf-8")
-    if checksum != store_checksum:
-        msg = "Checksum of bundle archive {} has changed."
-        flask.current_app.logger.error(msg.format(bundle_dir.bundle_archive_file))
-        raise InternalServerError(msg.format(bundle_dir.bundle_archive_file.name))
 
-    flask.current_app.logger.info(
-        "Sending the bundle at %s for request %d", bundle_dir.bundle_archive_file, request_id
-    )
+    include = flask.request.args.get("include")
+    if include is not None:
+        components = _get_bundle_components(bundle_dir, include)
+        download_name = f"cachito-{request_id}-{'-'.join(components).replace('/', '-')}.tar.gz"
+        validators = (store_checksum, ",".join(components))
 
-    resp = flask.send_file(
-        str(bundle_dir.bundle_archive_file),
-        mimetype="application/gzip",
-        as_attachment=True,
-        download_name=f"cachito-{request_id}.tar.gz",
-    )
-    resp.headers["Digest"] = f"sha-256={b64encode(bytes.fromhex(store_checksum))}"
+        def make_component_response():
+            archives = [bundle_dir.component_archive_file(component) for component in components]
+            flask.current_app.logger.info(
+                "Sending the bundle components %s for request %d", ", ".join(components), request_id
+            )
+            if len(archives) == 1:
+                return _send_bundle_file(
+                    bundle_dir,
+                    archives[0],
+                    download_name,
+                    get_file_sha256(archives[0]),
+                    get_request_etag(request, *validators),
+                )
+            # Merging the component archives changes the compressed bytes on every response, so
+            # ranges and the digest are only available for a single component
+            resp = flask.Response(iter_merged_tar_gz(archives), mimetype="application/gzip")
+            resp.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+            return resp
+
+        return send_request_resource(request, make_component_response, *validators)
+
+    def make_response():
+        # The digest is cached until the archive changes, so resumed downloads don't read the
+        # whole archive again
+        checksum = get_file_sha256(bundle_dir.bundle_archive_file)
+        if checksum != store_checksum:
+            msg = "Checksum of bundle archive {} has changed."
+            flask.current_app.logger.error(msg.format(bundle_dir.bundle_archive_file))
+            raise InternalServerError(msg.format(bundle_dir.bundle_archive_file.name))
+
+        flask.current_app.logger.info(
+            "Sending the bundle at %s for request %d", bundle_dir.bundle_archive_file, request_id
+        )
+        return _send_bundle_file(
+            bundle_dir,
+            bundle_dir.bundle_archive_file,
+            f"cachito-{request_id}.tar.gz",
+            store_checksum,
+            get_request_etag(request, store_checksum),
+        )
+
+    return send_request_resource(request, make_response, store_checksum)
+
+
+def _get_bundle_components(bundle_dir, include):
+    """
+    Get the bundle components to download from the value of the ``include`` query parameter.
+
+    :param RequestBundleDir bundle_dir: the bundle directory of the request
+    :param str include: the comma separated components, such as ``app,deps/npm``. The ``deps``
+        component stands for the dependencies of all the package managers.
+    :return: the sorted list of components, ``app`` first
+    :rtype: list[str]
+    :raise ValidationError: if a component is not available for the request
+    """
+    available = []
+    if bundle_dir.component_archive_file("app").exists():
+        available.append("app")
+        available.extend(
+            f"deps/{path.name[:-len('.tar.gz')]}"
+            for path in sorted(bundle_dir.bundle_components_dir.joinpath("deps").glob("*.tar.gz"))
+        )
+    if not available:
+        raise ValidationError(
+            "The bundle components of this request are not available, download the whole bundle"
+        )
+
+    components = set()
+    for component in filter(None, (item.strip() for item in include.split(","))):
+        if component == "deps":
+            components.update(c for c in available if c.startswith("deps/"))
+        elif component in available:
+            components.add(component)
+        else:
+            raise ValidationError(
+                f'The bundle component "{component}" is invalid. It must be one of: '
+                f"{', '.join(['deps'] + available)}"
+            )
+    if not components:
+        raise ValidationError('The "include" parameter must specify at least one bundle component')
+
+    return [c for c in available if c in components]
+
+
+def _send_bundle_file(bundle_dir, path, download_name, checksum, etag):
+    """
+    Send a bundle archive file, or let the web server in front of the API send it if configured.
+
+    :param RequestBundleDir bundle_dir: the bundle directory of the request
+    :param Path path: the path to the archive
+    :param str download_name: the file name the archive is downloaded as
+    :param str checksum: the hex encoded SHA-256 digest of the archive
+    :param str etag: the ETag of the response, which is needed up front for range requests
+    :return: a Flask response
+    :rtype: flask.Response
+    """
+    offload = flask.current_app.config.get("CACHITO_BUNDLE_DOWNLOAD_OFFLOAD")
+    if offload:
+        resp = flask.Response(mimetype="application/gzip")
+        resp.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+        if offload == "x-accel-redirect":
+            location = flask.current_app.config["CACHITO_BUNDLE_DOWNLOAD_OFFLOAD_LOCATION"]
+            relpath = path.relative_to(bundle_dir.bundle_archive_file.parent).as_posix()
+            resp.headers["X-Accel-Redirect"] = f"{location.rstrip('/')}/{relpath}"
+        else:
+            resp.headers["X-Sendfile"] = str(path)
+    else:
+        # send_file handles the Range and If-Range headers, which needs the ETag up front
+        resp = flask.send_file(
+            str(path),
+            mimetype="application/gzip",
+            as_attachment=True,
+            download_name=download_name,
+            etag=etag,
+        )
+    resp.headers["Digest"] = f"sha-256={b64encode(bytes.fromhex(checksum))}"
     return resp
 
 
@@ -291,8 +552,8 @@ def list_packages_and_dependencies(request_id):
     """
     Return the contents of the packages file for a request.
 
-    The primary intent of this endpoint is to allow the packages file verification by the workers.
-    All dependencies are also gathered and deduped under a separate key for convenience.
+    All dependencies are also gathered and deduped under a separate key for convenience. The
+    workers verify the packages file with ``verify_packages_file`` instead.
 
     :rtype: flask.Response
     :raise NotFound: the file is not present. It is a valid state.
@@ -313,10 +574,124 @@ def list_packages_and_dependencies(request_id):
         flask.current_app.logger.info(message)
         raise NotFound("The packages file is not present for this request.")
 
-    packages_data = PackagesData()
-    packages_data.load(bundle_dir.packages_data)
+    if any(param in flask.request.args for param in _PACKAGES_QUERY_PARAMS):
+        # Validate the parameters before checking the validators of the request
+        query = _get_packages_query()
+
+        def make_response():
+            return flask.jsonify(_get_packages_page(request_id, bundle_dir, query))
+
+    else:
+
+        def make_response():
+            packages_data = PackagesData()
+            packages_data.load(bundle_dir.packages_data)
+
+            return json_stream_response(
+                {
+                    "packages": packages_data.iter_packages(),
+                    "dependencies": packages_data.iter_all_dependencies(),
+                },
+                sort_keys=True,
+            )
+
+    return send_request_resource(
+        request, make_response, _get_file_validator(bundle_dir.packages_data)
+    )
+
+
+_PACKAGES_QUERY_PARAMS = ("type", "dev", "name", "page", "per_page")
+
+
+def _get_packages_query() -> Dict[str, Any]:
+    """
+    Get the filters and the page of the packages and dependencies to list from the query string.
+
+    :return: the ``types``, ``dev``, ``name``, ``page`` and ``per_page`` to list
+    :rtype: dict
+    :raise ValidationError: if the page or the number of items per page is invalid
+    """
+    args = flask.request.args
+    try:
+        page = int(args.get("page", 1))
+        per_page = int(args.get("per_page", 10))
+    except ValueError:
+        raise ValidationError('The "page" and "per_page" parameters must be integers')
+    if page < 1 or per_page < 1:
+        raise ValidationError('The "page" and "per_page" parameters must be positive')
+
+    dev = args.get("dev")
+    return {
+        "types": [pkg_type for pkg_type in args.getlist("type") if pkg_type],
+        "dev": None if dev is None else str_to_bool(dev),
+        "name": args.get("name") or None,
+        "page": page,
+        "per_page": min(per_page, flask.current_app.config["CACHITO_MAX_PER_PAGE"]),
+    }
+
+
+def _get_packages_page(
+    request_id: int, bundle_dir: RequestBundleDir, query: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Get a page of the filtered packages and dependencies of a request.
+
+    The same page of both lists is returned. The packages and dependencies are read from the
+    index of the packages file, which is built the first time. Packages files written before
+    they could be indexed are loaded and filtered in memory.
+
+    :param int request_id: the ID of the request
+    :param RequestBundleDir bundle_dir: the bundle directory of the request
+    :param dict query: the filters and the page, see ``_get_packages_query``
+    :return: the JSON response with the ``packages``, ``dependencies`` and ``meta`` keys
+    :rtype: dict
+    """
+    start = (query["page"] - 1) * query["per_page"]
+    stop = start + query["per_page"]
+    filters = {"types": query["types"], "dev": query["dev"], "name": query["name"]}
+    rv: Dict[str, Any] = {}
+    totals = {}
+
+    index = PackagesDataIndex.open(bundle_dir.packages_data, bundle_dir.packages_data_index)
+    if index is not None:
+        for kind in ("packages", "dependencies"):
+            ranges = index.select(kind, **filters)
+            totals[kind] = sum(len(selected) for selected in ranges)
+            rv[kind] = index.read(kind, ranges, start, query["per_page"])
+    else:
+        packages_data = PackagesData()
+        packages_data.load(bundle_dir.packages_data)
+        for kind, items in (
+            ("packages", packages_data.iter_packages()),
+            ("dependencies", packages_data.iter_all_dependencies()),
+        ):
+            selected = [item for item in items if _package_matches(item, **filters)]
+            totals[kind] = len(selected)
+            rv[kind] = selected[start:stop]
+
+    pagination = Pagination(
+        None, query["page"], query["per_page"], max(totals.values()), rv["packages"]
+    )
+    rv["meta"] = pagination_metadata(
+        pagination,
+        request_id=request_id,
+        type=query["types"],
+        dev=query["dev"],
+        name=query["name"],
+    )
+    rv["meta"]["packages_total"] = totals["packages"]
+    rv["meta"]["dependencies_total"] = totals["dependencies"]
+    return rv
+
 
-    return {"packages": packages_data.packages, "dependencies": packages_data.all_dependencies}
+def _package_matches(
+    package: Dict[str, Any], types: List[str], dev: Union[bool, None], name: Union[str, None]
+) -> bool:
+    if types and package["type"] not in types:
+        return False
+    if dev is not None and package.get("dev", False) != dev:
+        return False
+    return name is None or package["name"] == name
 
 
 @api_v1.route("/requests", methods=["POST"])
@@ -466,20 +841,26 @@ def worker_required(func):
     return wrapper
 
 
-@api_v1.route("/requests/<int:request_id>", methods=["PATCH"])
-@login_required
-@worker_required
-def patch_request(request_id):
+@dataclass
+class _RequestUpdateEffects:
+    """The work to do once the updates of a request are committed, see ``_apply_request_update``."""
+
+    delete_bundle: bool = False
+    delete_bundle_temp: bool = False
+    cleanup_nexus: List[str] = field(default_factory=list)
+    delete_logs: bool = False
+    store_manifest: bool = False
+    index_dependencies: bool = False
+
+
+def _validate_request_update(payload, allow_config_files=False):
     """
-    Modify the given request.
+    Validate an update of a request.
 
-    :param int request_id: the request ID from the URL
-    :return: a Flask JSON response
-    :rtype: flask.Response
-    :raise NotFound: if the request is not found
-    :raise ValidationError: if the JSON is invalid
+    :param payload: the update, see the ``patch_request`` endpoint
+    :param bool allow_config_files: allow the ``configuration_files`` key
+    :raise ValidationError: if the update is invalid
     """
-    payload = flask.request.get_json()
     if not isinstance(payload, dict):
         raise ValidationError("The input data must be a JSON object")
 
@@ -495,6 +876,8 @@ def patch_request(request_id):
         "error_origin",
         "error_type",
     }
+    if allow_config_files:
+        valid_keys.add("configuration_files")
     invalid_keys = set(payload.keys()) - valid_keys
     if invalid_keys:
         raise ValidationError(
@@ -507,6 +890,11 @@ def patch_request(request_id):
                 raise ValidationError('The value for "{}" must be an object'.format(key))
             for env_var_name, env_var_info in value.items():
                 EnvironmentVariable.validate_json(env_var_name, env_var_info)
+        elif key == "configuration_files":
+            if not isinstance(value, list):
+                raise ValidationError(f'The value for "{key}" must be an array')
+            for config_file in value:
+                ConfigFileBase64.validate_json(config_file)
         elif key in ("packages_count", "dependencies_count"):
             if not isinstance(value, int):
                 raise ValidationError(f'The value for "{key}" must be an integer')
@@ -518,23 +906,32 @@ def patch_request(request_id):
     elif "state_reason" in payload and "state" not in payload:
         raise ValidationError('The "state" key is required when "state_reason" is supplied')
 
-    request = Request.query.get_or_404(request_id)
-    delete_bundle = False
-    delete_bundle_temp = False
-    cleanup_nexus = []
-    delete_logs = False
+
+def _apply_request_update(request, payload, effects):
+    """
+    Apply a validated update to a request, without committing it.
+
+    :param Request request: the request to update
+    :param dict payload: the update, see ``_validate_request_update``
+    :param _RequestUpdateEffects effects: the work to do after the commit, which is updated
+    """
+    request_id = request.id
 
     if "state" in payload and "state_reason" in payload:
         cachito_metrics["gauge_state"].labels(state=payload["state"]).inc()
         cachito_metrics["gauge_state"].labels(state=request.state.state_name).dec()
         new_state = payload["state"]
-        delete_bundle = new_state == "stale" and request.state.state_name != "failed"
+        if new_state == "stale" and request.state.state_name != "failed":
+            effects.delete_bundle = True
         if new_state in ("stale", "failed"):
             for pkg_manager in ["npm", "pip", "yarn"]:
                 if any(p.name == pkg_manager for p in request.pkg_managers):
-                    cleanup_nexus.append(pkg_manager)
-        delete_bundle_temp = new_state in ("complete", "failed", "stale")
-        delete_logs = new_state == "stale"
+                    if pkg_manager not in effects.cleanup_nexus:
+                        effects.cleanup_nexus.append(pkg_manager)
+        if new_state in ("complete", "failed", "stale"):
+            effects.delete_bundle_temp = True
+        if new_state == "stale":
+            effects.delete_logs = True
         new_state_reason = payload["state_reason"]
         # This is to protect against a Celery task getting executed twice and setting the
         # state each time
@@ -545,6 +942,10 @@ def patch_request(request_id):
                 cachito_metrics["request_duration"].observe(
                     (datetime.now() - request.created).total_seconds()
                 )
+                effects.store_manifest = True
+                effects.index_dependencies = True
+            if new_state == "stale":
+                IndexedDependency.prune_request(request_id)
             request.add_state(new_state, new_state_reason)
 
     # If the request fails, a RequestError object will be added to the DB
@@ -579,18 +980,42 @@ def patch_request(request_id):
         if env_var_obj not in request.environment_variables:
             request.environment_variables.append(env_var_obj)
 
+    _add_config_files(request, payload.get("configuration_files", []))
+
     for attr in ("packages_count", "dependencies_count"):
         value = payload.get(attr)
         if value is not None:
             setattr(request, attr, value)
 
-    db.session.commit()
 
+def _add_config_files(request, config_files):
+    """
+    Add validated configuration files to a request, without committing them.
+
+    :param Request request: the request to add the configuration files to
+    :param list config_files: the configuration files as JSON objects
+    """
+    for config_file in config_files:
+        config_file_obj = ConfigFileBase64.get_or_create(
+            config_file["path"], config_file["content"]
+        )
+        if config_file_obj not in request.config_files_base64:
+            request.config_files_base64.append(config_file_obj)
+
+
+def _run_request_update_effects(request, effects):
+    """
+    Do the work that follows committed updates of a request, such as deleting its bundle.
+
+    :param Request request: the updated request
+    :param _RequestUpdateEffects effects: the work to do
+    """
+    request_id = request.id
     bundle_dir: RequestBundleDir = RequestBundleDir(
         request.id, root=flask.current_app.config["CACHITO_BUNDLES_DIR"]
     )
 
-    if delete_bundle and bundle_dir.bundle_archive_file.exists():
+    if effects.delete_bundle and bundle_dir.bundle_archive_file.exists():
         flask.current_app.logger.info(
             "Deleting the bundle archive %s", bundle_dir.bundle_archive_file
         )
@@ -603,7 +1028,66 @@ def patch_request(request_id):
                 "Failed to delete the bundle archive %s", bundle_dir.bundle_archive_file
             )
 
-    if delete_bundle_temp and bundle_dir.exists():
+    if effects.delete_bundle and bundle_dir.bundle_components_dir.exists():
+        flask.current_app.logger.info(
+            "Deleting the bundle component archives at %s", bundle_dir.bundle_components_dir
+        )
+        try:
+            shutil.rmtree(bundle_dir.bundle_components_dir)
+        except OSError:
+            flask.current_app.logger.exception(
+                "Failed to delete the bundle component archives at %s",
+                bundle_dir.bundle_components_dir,
+            )
+
+    if effects.delete_bundle:
+        for path in (bundle_dir.content_manifest, bundle_dir.content_manifest_metadata):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                flask.current_app.logger.exception("Failed to delete the content manifest %s", path)
+        try:
+            bundle_dir.packages_data_index.unlink(missing_ok=True)
+        except OSError:
+            flask.current_app.logger.exception(
+                "Failed to delete the packages file index %s", bundle_dir.packages_data_index
+            )
+
+    if effects.store_manifest:
+        # The content manifest is regenerated on demand if this fails, so don't fail the request
+        try:
+            store_content_manifest(request)
+        except Exception:
+            flask.current_app.logger.exception(
+                "Failed to store the content manifest of request %d", request.id
+            )
+        # The same goes for the index of the packages file
+        try:
+            if bundle_dir.packages_data.exists():
+                PackagesDataIndex.build(bundle_dir.packages_data, bundle_dir.packages_data_index)
+        except Exception:
+            flask.current_app.logger.exception(
+                "Failed to index the packages file of request %d", request.id
+            )
+
+    if effects.index_dependencies and bundle_dir.packages_data.exists():
+        # Concurrent indexing is retried by index_request. The request is left out of the dependency
+        # search rather than failing it if the indexing still fails, and it's added again by the
+        # "cachito index-dependencies" command.
+        try:
+            packages_data = PackagesData()
+            packages_data.load(bundle_dir.packages_data)
+            IndexedDependency.index_request(request_id, packages_data.iter_all_dependencies())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            flask.current_app.logger.exception(
+                "Failed to index the dependencies of request %d, run the "
+                '"cachito index-dependencies" command to index them again',
+                request_id,
+            )
+
+    if effects.delete_bundle_temp and bundle_dir.exists():
         flask.current_app.logger.info(
             "Deleting the temporary files used to create the bundle at %s", bundle_dir
         )
@@ -618,7 +1102,7 @@ def patch_request(request_id):
                 "Failed to delete the temporary files (%s) at %s", type(ex).__name__, bundle_dir
             )
 
-    if delete_logs:
+    if effects.delete_logs:
         request_log_dir = flask.current_app.config["CACHITO_REQUEST_FILE_LOGS_DIR"]
         path_to_file = os.path.join(request_log_dir, f"{request_id}.log")
         try:
@@ -626,7 +1110,7 @@ def patch_request(request_id):
         except OSError:
             flask.current_app.logger.exception("Failed to delete the log file %s", path_to_file)
 
-    for pkg_mgr in cleanup_nexus:
+    for pkg_mgr in effects.cleanup_nexus:
         flask.current_app.logger.info(
             "Cleaning up the Nexus %s content for request %d", pkg_mgr, request_id
         )
@@ -641,6 +1125,30 @@ def patch_request(request_id):
                 request.id,
             )
 
+
+@api_v1.route("/requests/<int:request_id>", methods=["PATCH"])
+@login_required
+@worker_required
+def patch_request(request_id):
+    """
+    Modify the given request.
+
+    :param int request_id: the request ID from the URL
+    :return: a Flask JSON response
+    :rtype: flask.Response
+    :raise NotFound: if the request is not found
+    :raise ValidationError: if the JSON is invalid
+    """
+    payload = flask.request.get_json()
+    _validate_request_update(payload)
+
+    request = Request.query.get_or_404(request_id)
+    effects = _RequestUpdateEffects()
+    _apply_request_update(request, payload, effects)
+    db.session.commit()
+
+    _run_request_update_effects(request, effects)
+
     if current_user.is_authenticated:
         flask.current_app.logger.info(
             "The user %s patched request %d", current_user.username, request.id
@@ -651,6 +1159,52 @@ def patch_request(request_id):
     return "", 200
 
 
+@api_v1.route("/requests/<int:request_id>/updates", methods=["POST"])
+@login_required
+@worker_required
+def batch_update_request(request_id):
+    """
+    Apply several updates to the given request at once.
+
+    The updates are applied in order and committed together, so either all of them or none are
+    applied. Each update has the same keys as the ``patch_request`` payload, and can also have the
+    ``configuration_files`` key with the same value as the ``add_request_config_files`` payload.
+
+    :param int request_id: the request ID from the URL
+    :return: a Flask JSON response
+    :rtype: flask.Response
+    :raise NotFound: if the request is not found
+    :raise ValidationError: if the JSON is invalid
+    """
+    payload = flask.request.get_json()
+    if not isinstance(payload, list) or not payload:
+        raise ValidationError("The input data must be a non-empty JSON array of objects")
+    for update in payload:
+        _validate_request_update(update, allow_config_files=True)
+
+    request = Request.query.get_or_404(request_id)
+    effects = _RequestUpdateEffects()
+    for update in payload:
+        _apply_request_update(request, update, effects)
+    db.session.commit()
+
+    _run_request_update_effects(request, effects)
+
+    if current_user.is_authenticated:
+        flask.current_app.logger.info(
+            "The user %s applied %d updates to request %d",
+            current_user.username,
+            len(payload),
+            request.id,
+        )
+    else:
+        flask.current_app.logger.info(
+            "An anonymous user applied %d updates to request %d", len(payload), request.id
+        )
+
+    return "", 200
+
+
 @api_v1.route("/requests/<int:request_id>/configuration-files", methods=["POST"])
 @login_required
 @worker_required
@@ -675,11 +1229,7 @@ def add_request_config_files(request_id):
 
     for config_file in payload:
         ConfigFileBase64.validate_json(config_file)
-        config_file_obj = ConfigFileBase64.get_or_create(
-            config_file["path"], config_file["content"]
-        )
-        if config_file_obj not in request.config_files_base64:
-            request.config_files_base64.append(config_file_obj)
+    _add_config_files(request, payload)
 
     if current_user.is_authenticated:
         flask.current_app.logger.info(
@@ -697,6 +1247,68 @@ def add_request_config_files(request_id):
     return "", 204
 
 
+@api_v1.route("/requests/<int:request_id>/packages/verification", methods=["POST"])
+@login_required
+@worker_required
+def verify_packages_file(request_id):
+    """
+    Verify that the packages file of the request is the one the workers wrote.
+
+    This allows the workers to check that the packages file is visible to the API, without loading
+    the file and sending it back. The digest of the file is cached until the file changes, and the
+    counts are compared with the ones stored on the request.
+
+    :param int request_id: the value of the request ID
+    :return: a Flask JSON response with the ``verified`` key, and the ``errors`` key listing the
+        differences found
+    :rtype: flask.Response
+    :raise NotFound: if the request is not found
+    :raise ValidationError: if the JSON is invalid
+    """
+    payload = flask.request.get_json()
+    if not isinstance(payload, dict):
+        raise ValidationError("The input data must be a JSON object")
+
+    expected_keys = {"sha256", "packages_count", "dependencies_count"}
+    missing_keys = expected_keys - payload.keys()
+    if missing_keys:
+        raise ValidationError(
+            "The following keys are missing: {}".format(", ".join(sorted(missing_keys)))
+        )
+    invalid_keys = payload.keys() - expected_keys
+    if invalid_keys:
+        raise ValidationError(
+            "The following keys are not allowed: {}".format(", ".join(sorted(invalid_keys)))
+        )
+    if not isinstance(payload["sha256"], str):
+        raise ValidationError('The value for "sha256" must be a string')
+    for key in ("packages_count", "dependencies_count"):
+        if not isinstance(payload[key], int):
+            raise ValidationError(f'The value for "{key}" must be an integer')
+
+    request = Request.query.get_or_404(request_id)
+    bundle_dir = RequestBundleDir(request_id, root=flask.current_app.config["CACHITO_BUNDLES_DIR"])
+
+    errors = []
+    try:
+        checksum = get_file_sha256(bundle_dir.packages_data)
+    except FileNotFoundError:
+        errors.append("The packages file doesn't exist")
+    else:
+        if checksum != payload["sha256"]:
+            errors.append(f"The checksum of the packages file is {checksum}")
+    for key in ("packages_count", "dependencies_count"):
+        if getattr(request, key) != payload[key]:
+            errors.append(f'The "{key}" of the request is {getattr(request, key)}')
+
+    if errors:
+        flask.current_app.logger.warning(
+            "The packages file of request %d doesn't match: %s", request_id, "; ".join(errors)
+        )
+
+    return flask.jsonify({"verified": not errors, "errors": errors})
+
+
 def generate_stream_response(text_file_path):
     """
     Generate response by streaming the content.
@@ -745,16 +1357,7 @@ def get_request_logs(request_id):
 
 def send_content_manifest_back(content_manifest: Dict[str, Any]) -> flask.Response:
     """Send content manifest back to the client."""
-    debug = flask.current_app.logger.debug
-    fd, filename = tempfile.mkstemp(prefix="request-content-manifest-json-", text=True)
-    debug("Write content manifest into file: %s", filename)
-    try:
-        with open(fd, "w") as f:
-            json.dump(content_manifest, f, sort_keys=True)
-        return flask.send_file(filename, mimetype="application/json")
-    finally:
-        debug("The content manifest is sent back to the client. Remove %s", filename)
-        os.unlink(filename)
+    return json_stream_response(content_manifest, sort_keys=True)
 
 
 @api_v1.route("/content-manifest", methods=["GET"])
@@ -798,15 +1401,73 @@ def get_content_manifest_by_requests():
         nonexistent_ids = ",".join(map(str, request_ids))
         raise BadRequest(f"Cannot find request(s) {nonexistent_ids}.")
 
-    assembled_icm = deepcopy(BASE_ICM)
+    # Each content manifest is already sorted, so merging their image contents by purl is enough
+    # to get the same result as sorting the assembled content manifest. The stored content
+    # manifests are read one image content at a time while the response is streamed.
+    image_contents = []
     for request in requests:
-        manifest = request.content_manifest.to_json()
-        assembled_icm["image_contents"].extend(manifest["image_contents"])
-    if len(requests) > 1:
-        deep_sort_icm(assembled_icm)
+        if request.state.state_name == RequestStateMapping.complete.name:
+            content_manifest_path, _ = get_stored_content_manifest(request)
+            image_contents.append(iter_stored_image_contents(content_manifest_path))
+        else:
+            # The content manifests of stale requests are empty, see get_request_content_manifest
+            image_contents.append(request.content_manifest.to_json()["image_contents"])
+
+    assembled_icm = deepcopy(BASE_ICM)
+    assembled_icm["image_contents"] = heapq.merge(*image_contents, key=SORT_KEY_BY_PURL)
     return send_content_manifest_back(assembled_icm)
 
 
+class DependencySearchArgs(pydantic.BaseModel):
+    """Query parameters for /dependencies/search endpoint."""
+
+    name: str
+    version: Union[str, None]
+    type: Union[str, None]
+
+
+@api_v1.route("/dependencies/search", methods=["GET"])
+def search_dependencies():
+    """
+    Retrieve paginated complete requests which have a dependency.
+
+    :rtype: flask.Response
+    """
+    max_per_page = flask.current_app.config["CACHITO_MAX_PER_PAGE"]
+    args = DependencySearchArgs(**flask.request.args)
+    query = (
+        db.session.query(Request.id, Request.repo, Request.ref, IndexedDependency)
+        .join(
+            request_indexed_dependency_table,
+            request_indexed_dependency_table.c.request_id == Request.id,
+        )
+        .join(
+            IndexedDependency,
+            IndexedDependency.id == request_indexed_dependency_table.c.indexed_dependency_id,
+        )
+        .filter(IndexedDependency.name == args.name)
+        .order_by(Request.id.desc(), IndexedDependency.id)
+    )
+    query_params = {"name": args.name}
+    if args.version:
+        query = query.filter(IndexedDependency.version == args.version)
+        query_params["version"] = args.version
+    if args.type:
+        query = query.filter(IndexedDependency.type == args.type)
+        query_params["type"] = args.type
+
+    pagination_query = query.paginate(max_per_page=max_per_page)
+    return flask.jsonify(
+        {
+            "items": [
+                {"request_id": request_id, "repo": repo, "ref": ref, **dependency.to_json()}
+                for request_id, repo, ref, dependency in pagination_query.items
+            ],
+            "meta": pagination_metadata(pagination_query, **query_params),
+        }
+    )
+
+
 class RequestMetricsArgs(pydantic.BaseModel):
     """Query parameters for /request-metrics endpoint."""
 
@@ -869,29 +1530,25 @@ class RequestMetricsSummaryArgs(pydantic.BaseModel):
 def get_request_metrics_summary():
     """Return a summary about completed requests for a given period of time."""
     args = RequestMetricsSummaryArgs(**flask.request.args)
-    query = (
-        RequestState.get_final_states_query()
-        .filter(RequestState.updated >= args.finished_from)
-        .filter(RequestState.updated <= args.finished_to)
+    # The metrics of the finalized requests are stored by Request.add_state, so that the summary
+    # doesn't have to go through the whole state history
+    query = db.session.query(RequestMetric).filter(
+        RequestMetric.finished >= args.finished_from, RequestMetric.finished <= args.finished_to
     )
 
-    client_errors = query.filter(
-        and_(RequestState.request, Request.error, RequestError.origin == RequestErrorOrigin.client)
-    ).count()
-    server_errors = query.filter(
-        and_(RequestState.request, Request.error, RequestError.origin == RequestErrorOrigin.server)
-    ).count()
-
-    requests = query.subquery()
+    errors_summary = dict.fromkeys(RequestErrorOrigin, 0)
+    errors_summary.update(
+        query.join(RequestError, RequestError.request_id == RequestMetric.request_id)
+        .group_by(RequestError.origin)
+        .with_entities(RequestError.origin, func.count(RequestMetric.request_id))
+    )
 
     states_summary = dict.fromkeys(["complete", "failed"], 0)
     states_summary.update(
-        {
-            RequestStateMapping(state.state).name: state.requests
-            for state in db.session.query(
-                requests.c.state, func.count(requests.c.request_id).label("requests")
-            ).group_by(requests.c.state)
-        }
+        (RequestStateMapping(state).name, requests)
+        for state, requests in query.group_by(RequestMetric.state).with_entities(
+            RequestMetric.state, func.count(RequestMetric.request_id)
+        )
     )
 
     (
@@ -901,13 +1558,13 @@ def get_request_metrics_summary():
         time_in_queue_avg,
         time_in_queue_95,
         total_requests,
-    ) = db.session.query(
-        func.avg(requests.c.duration),
-        func.percentile_cont(0.5).within_group(requests.c.duration),
-        func.percentile_cont(0.95).within_group(requests.c.duration),
-        func.avg(requests.c.time_in_queue),
-        func.percentile_cont(0.95).within_group(requests.c.time_in_queue),
-        func.count(requests.c.request_id),
+    ) = query.with_entities(
+        func.avg(RequestMetric.duration),
+        func.percentile_cont(0.5).within_group(RequestMetric.duration),
+        func.percentile_cont(0.95).within_group(RequestMetric.duration),
+        func.avg(RequestMetric.time_in_queue),
+        func.percentile_cont(0.95).within_group(RequestMetric.time_in_queue),
+        func.count(RequestMetric.request_id),
     ).one()
 
     return flask.jsonify(
@@ -917,8 +1574,8 @@ def get_request_metrics_summary():
             "duration_95": duration_95,
             "time_in_queue_avg": time_in_queue_avg,
             "time_in_queue_95": time_in_queue_95,
-            "client_errors": client_errors,
-            "server_errors": server_errors,
+            "client_errors": errors_summary[RequestErrorOrigin.client],
+            "server_errors": errors_summary[RequestErrorOrigin.server],
             "total": total_requests,
             **states_summary,
         }
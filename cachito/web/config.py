@@ -6,6 +6,7 @@ from typing import List, Optional
 from cachito.errors import ConfigError
 
 TEST_DB_FILE = os.path.join(os.environ.get("TOX_ENV_DIR") or tempfile.gettempdir(), "cachito.db")
+BUNDLE_DOWNLOAD_OFFLOAD_MODES = (None, "x-accel-redirect", "x-sendfile")
 
 
 class Config(object):
@@ -14,6 +15,10 @@ class Config(object):
     DEBUG = False
     # Additional loggers to set to the level defined in CACHITO_LOG_LEVEL
     CACHITO_ADDITIONAL_LOGGERS: List[str] = ["cachito.common.packages_data"]
+    # Let the web server send the bundle archives: "x-accel-redirect" (nginx) or "x-sendfile"
+    CACHITO_BUNDLE_DOWNLOAD_OFFLOAD: Optional[str] = None
+    # The internal location the web server maps to CACHITO_BUNDLES_DIR, for X-Accel-Redirect
+    CACHITO_BUNDLE_DOWNLOAD_OFFLOAD_LOCATION = "/cachito-bundles/"
     CACHITO_DEFAULT_PACKAGE_MANAGERS: List[str] = ["gomod"]
     # This sets the level of the "flask.app" logger, which is accessed from current_app.logger
     CACHITO_LOG_LEVEL = "INFO"
@@ -127,3 +132,10 @@ def validate_cachito_config(config, cli=False):
                 )
         elif not config.get(config_var):
             raise ConfigError(f'The configuration "{config_var}" must be set')
+
+    offload = config.get("CACHITO_BUNDLE_DOWNLOAD_OFFLOAD")
+    if offload not in BUNDLE_DOWNLOAD_OFFLOAD_MODES:
+        modes = ", ".join(mode for mode in BUNDLE_DOWNLOAD_OFFLOAD_MODES if mode)
+        raise ConfigError(
+            f'The configuration "CACHITO_BUNDLE_DOWNLOAD_OFFLOAD" must be one of: {modes}'
+        )
@@ -1,9 +1,16 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
+import functools
+import hashlib
+import json
+import os
+import tempfile
 from copy import deepcopy
-from typing import List, Optional
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
 
 import flask
 
+from cachito.common.paths import RequestBundleDir
 from cachito.common.utils import get_repo_name
 from cachito.web.purl import (
     replace_parent_purl_gopkg,
@@ -34,6 +41,56 @@ BASE_ICM = {
     "image_contents": [],
 }
 
+# The maximum number of dependency purls to keep in memory across content manifests
+PURL_CACHE_SIZE = 65536
+
+
+class DependencyRecord(NamedTuple):
+    """The fields of a dependency that are relevant to a content manifest."""
+
+    type: str
+    name: str
+    version: Optional[str]
+    dev: bool = False
+
+    @classmethod
+    def from_dependency(cls, dependency):
+        """
+        Create a DependencyRecord from a dependency.
+
+        :param dependency: the dependency as a Package object or as its JSON representation
+        :return: the DependencyRecord object
+        :rtype: DependencyRecord
+        """
+        if isinstance(dependency, dict):
+            return cls(
+                dependency["type"],
+                dependency["name"],
+                dependency["version"],
+                dependency.get("dev", False),
+            )
+        return cls(dependency.type, dependency.name, dependency.version, dependency.dev)
+
+
+@functools.lru_cache(maxsize=PURL_CACHE_SIZE)
+def _dependency_purl(dep_type, name, version, parent_package_rel_path=None):
+    """
+    Generate the purl of a dependency.
+
+    The same dependencies show up under many packages and across requests, so the purls are
+    memoized. Only the relative path of RubyGems packages is part of their dependencies' purls,
+    so it must be None for other package types to make the most out of the cache.
+
+    :param str dep_type: the type of the dependency
+    :param str name: the name of the dependency
+    :param str version: the version of the dependency
+    :param str parent_package_rel_path: relative path from repo root to the parent package root
+    :return: the purl of the dependency
+    :rtype: str
+    :raise ContentManifestError: if there is no implementation for the dependency type
+    """
+    return to_purl(DependencyRecord(dep_type, name, version), parent_package_rel_path)
+
 
 class ContentManifest:
     """A content manifest associated with a Cachito request."""
@@ -62,17 +119,20 @@ class ContentManifest:
         # dict to store gitsubmodule package level data; uses the package id as key to identify a
         # package
         self._gitsubmodule_data = {}
+        # the purl of the request's repository, which is the parent of relative RubyGems
+        # dependencies; it is only computed if needed
+        self._repo_purl = None
 
     def process_gomod(self, package, dependency):
         """
         Process gomod package.
 
         :param Package package: the gomod package to process
-        :param Dependency dependency: the gomod package dependency to process
+        :param DependencyRecord dependency: the gomod package dependency to process
         """
         if dependency.type == "gomod":
             parent_purl = self._gomod_data[package.name]["purl"]
-            dep_purl = to_purl(dependency)
+            dep_purl = _dependency_purl(dependency.type, dependency.name, dependency.version)
             dep_purl = replace_parent_purl_placeholder(dep_purl, parent_purl)
             icm_source = {"purl": dep_purl}
             self._gomod_data[package.name]["dependencies"].append(icm_source)
@@ -82,10 +142,11 @@ class ContentManifest:
         Process go-package package.
 
         :param Package package: the go-package package to process
-        :param Dependency dependency: the go-package package dependency to process
+        :param DependencyRecord dependency: the go-package package dependency to process
         """
         if dependency.type == "go-package":
-            icm_dependency = {"purl": to_purl(dependency)}
+            dep_purl = _dependency_purl(dependency.type, dependency.name, dependency.version)
+            icm_dependency = {"purl": dep_purl}
             self._gopkg_data[package]["dependencies"].append(icm_dependency)
 
     def set_go_package_sources(self):
@@ -97,13 +158,10 @@ class ContentManifest:
         in each content manifest entry, we associate each Go package to a Go
         module based on their names.
         """
+        modules = gomod.ModuleTrie(self._gomod_data)
         for package_id, pkg_data in self._gopkg_data.items():
             pkg_name = pkg_data.pop("name")
-
-            if pkg_name in self._gomod_data:
-                module_name = pkg_name
-            else:
-                module_name = gomod.match_parent_module(pkg_name, self._gomod_data.keys())
+            module_name = modules.match_parent_module(pkg_name)
 
             if module_name is not None:
                 module = self._gomod_data[module_name]
@@ -119,7 +177,7 @@ class ContentManifest:
         Process npm package.
 
         :param Package package: the npm package to process
-        :param Dependency dependency: the npm package dependency to process
+        :param DependencyRecord dependency: the npm package dependency to process
         """
         if dependency.type == "npm":
             self._process_standard_package("npm", package, dependency)
@@ -129,7 +187,7 @@ class ContentManifest:
         Process pip package.
 
         :param Package package: the pip package to process
-        :param Dependency dependency: the pip package dependency to process
+        :param DependencyRecord dependency: the pip package dependency to process
         """
         if dependency.type == "pip":
             self._process_standard_package("pip", package, dependency)
@@ -139,7 +197,7 @@ class ContentManifest:
         Process yarn package.
 
         :param Package package: the yarn package to process
-        :param Dependency dependency: the yarn package dependency to process
+        :param DependencyRecord dependency: the yarn package dependency to process
         """
         if dependency.type == "yarn":
             self._process_standard_package("yarn", package, dependency)
@@ -152,7 +210,8 @@ class ContentManifest:
         """
         pkg_type_data = getattr(self, f"_{pkg_type}_data")
 
-        icm_dependency = {"purl": to_purl(dependency)}
+        dep_purl = _dependency_purl(dependency.type, dependency.name, dependency.version)
+        icm_dependency = {"purl": dep_purl}
         pkg_type_data[package]["sources"].append(icm_dependency)
         if not dependency.dev:
             pkg_type_data[package]["dependencies"].append(icm_dependency)
@@ -162,14 +221,18 @@ class ContentManifest:
         Process RubyGems package.
 
         :param Package package: the RubyGems package to process
-        :param Dependency dependency: the RubyGems package dependency to process
+        :param DependencyRecord dependency: the RubyGems package dependency to process
         """
         if dependency.type == "rubygems":
-            parent_package_name = get_repo_name(self.request.repo).split("/")[-1]
-            parent_purl = to_vcs_purl(parent_package_name, self.request.repo, self.request.ref)
-
-            dep_purl = to_purl(dependency, package.path)
-            dep_purl = replace_parent_purl_placeholder(dep_purl, parent_purl)
+            dep_purl = _dependency_purl(
+                dependency.type, dependency.name, dependency.version, package.path
+            )
+            if self._repo_purl is None:
+                parent_package_name = get_repo_name(self.request.repo).split("/")[-1]
+                self._repo_purl = to_vcs_purl(
+                    parent_package_name, self.request.repo, self.request.ref
+                )
+            dep_purl = replace_parent_purl_placeholder(dep_purl, self._repo_purl)
 
             icm_dependency = {"purl": dep_purl}
             self._rubygems_data[package]["sources"].append(icm_dependency)
@@ -216,7 +279,7 @@ class ContentManifest:
                 )
 
         for package in self.packages:
-            for dependency in package.dependencies:
+            for dependency in map(DependencyRecord.from_dependency, package.dependencies):
                 if package.type == "go-package":
                     self.process_go_package(package, dependency)
                 elif package.type == "gomod":
@@ -302,19 +365,24 @@ class Package:
         )
 
     @classmethod
-    def from_json(cls, package):
+    def from_json(cls, package, shallow=False):
         """
         Create a Package object from JSON.
 
-        All dependencies will also be converted to Package objects.
+        All dependencies will also be converted to Package objects, unless ``shallow`` is set.
 
         :param dict package: the dictionary representing the package
+        :param bool shallow: keep the dependencies as the dictionaries representing them, which
+            is enough to generate a content manifest and is a lot cheaper for large requests
         :return: the Package object
         :rtype: Package
         """
-        dependencies = [
-            Package.from_json(dependency) for dependency in package.get("dependencies", [])
-        ]
+        if shallow:
+            dependencies = package.get("dependencies", [])
+        else:
+            dependencies = [
+                Package.from_json(dependency) for dependency in package.get("dependencies", [])
+            ]
 
         return cls(
             name=package["name"],
@@ -324,3 +392,116 @@ class Package:
             dependencies=dependencies,
             path=package.get("path"),
         )
+
+
+def store_content_manifest(request) -> str:
+    """
+    Generate the content manifest of a complete request and store it next to its bundle.
+
+    The content manifest is written along with a metadata file holding its SHA-256 checksum and
+    the ICM version it was generated with. Both files are replaced atomically, so concurrent
+    readers never see a partially written content manifest.
+
+    :param Request request: the complete request to generate the content manifest for
+    :return: the SHA-256 checksum of the stored content manifest
+    :rtype: str
+    """
+    bundle_dir = RequestBundleDir(request.id, root=flask.current_app.config["CACHITO_BUNDLES_DIR"])
+    content = _dump_content_manifest(request.content_manifest.to_json()).encode("utf-8")
+    checksum = hashlib.sha256(content).hexdigest()
+    metadata = {"icm_version": VERSION, "sha256": checksum}
+
+    for path, data in (
+        (bundle_dir.content_manifest, content),
+        (bundle_dir.content_manifest_metadata, json.dumps(metadata).encode("utf-8")),
+    ):
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)
+        try:
+            with open(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    flask.current_app.logger.debug(
+        "Stored the content manifest of request %d at %s", request.id, bundle_dir.content_manifest
+    )
+    return checksum
+
+
+# The first line of stored content manifests whose image contents are on separate lines
+_IMAGE_CONTENTS_START = '{"image_contents": [\n'
+
+
+def _dump_content_manifest(icm: Dict[str, Any]) -> str:
+    """
+    Serialize a content manifest with sorted keys and each of its image contents on a line.
+
+    The image contents can then be read one at a time, see ``iter_stored_image_contents``.
+
+    :param dict icm: the content manifest
+    :return: the JSON document
+    :rtype: str
+    """
+    image_contents = icm["image_contents"]
+    if not image_contents:
+        return json.dumps(icm, sort_keys=True)
+
+    # "image_contents" is the first of the sorted keys
+    others = {key: value for key, value in icm.items() if key != "image_contents"}
+    items = ",\n".join(json.dumps(item, sort_keys=True) for item in image_contents)
+    return f"{_IMAGE_CONTENTS_START}{items}\n], {json.dumps(others, sort_keys=True)[1:]}"
+
+
+def iter_stored_image_contents(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Read the image contents of a stored content manifest one at a time.
+
+    The file is opened right away, so the image contents can still be read if the content manifest
+    is deleted in the meantime.
+
+    :param Path path: the path to the stored content manifest
+    :return: an iterator of the image contents
+    :rtype: Iterator[dict]
+    """
+    return _iter_image_contents(open(path, encoding="utf-8"))
+
+
+def _iter_image_contents(f: TextIO) -> Iterator[Dict[str, Any]]:
+    with f:
+        first_line = f.readline()
+        if first_line != _IMAGE_CONTENTS_START:
+            # The image contents are empty or the content manifest was stored on a single line
+            yield from json.loads(first_line + f.read())["image_contents"]
+            return
+
+        for line in f:
+            if line.startswith("]"):
+                return
+            yield json.loads(line.rstrip().rstrip(","))
+
+
+def get_stored_content_manifest(request) -> Tuple[Path, str]:
+    """
+    Get the stored content manifest of a complete request.
+
+    The content manifest is (re)generated if it is missing or if it was generated with a
+    different ICM version.
+
+    :param Request request: the complete request to get the content manifest for
+    :return: the path to the content manifest and its SHA-256 checksum
+    :rtype: tuple[Path, str]
+    """
+    bundle_dir = RequestBundleDir(request.id, root=flask.current_app.config["CACHITO_BUNDLES_DIR"])
+    try:
+        metadata = json.loads(bundle_dir.content_manifest_metadata.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        metadata = {}
+
+    if metadata.get("icm_version") == VERSION and bundle_dir.content_manifest.exists():
+        checksum = metadata["sha256"]
+    else:
+        checksum = store_content_manifest(request)
+
+    return bundle_dir.content_manifest, checksum
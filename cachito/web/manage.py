@@ -1,12 +1,16 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import time
+from datetime import datetime, timedelta
 
 import click
+import flask
 from flask.cli import FlaskGroup
 from sqlalchemy.exc import OperationalError
 
+from cachito.common.packages_data import PackagesData
+from cachito.common.paths import RequestBundleDir
 from cachito.web.app import create_cli_app
-from cachito.web.models import db
+from cachito.web.models import IndexedDependency, Request, RequestStateMapping, db
 
 
 @click.group(cls=FlaskGroup, create_app=create_cli_app)
@@ -31,5 +35,85 @@ def wait_for_db():
             break
 
 
+@cli.command(name="index-dependencies")
+def index_dependencies():
+    """Add the complete requests which are missing from the dependency search."""
+    bundles_dir = flask.current_app.config["CACHITO_BUNDLES_DIR"]
+    request_ids = [
+        request_id
+        for request_id, in db.session.query(Request.id)
+        .filter(Request.current_state == RequestStateMapping.complete.value)
+        .order_by(Request.id)
+    ]
+    failed_request_ids = []
+    for request_id in request_ids:
+        packages_data_file = RequestBundleDir(request_id, root=bundles_dir).packages_data
+        if not packages_data_file.exists():
+            continue
+        # A request which can't be indexed doesn't prevent indexing the following ones
+        try:
+            packages_data = PackagesData()
+            packages_data.load(packages_data_file)
+            mapped = IndexedDependency.index_request(
+                request_id, packages_data.iter_all_dependencies()
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Failed to index the dependencies of request {request_id}: {e}", err=True)
+            failed_request_ids.append(request_id)
+            continue
+        if mapped:
+            click.echo(f"Indexed {mapped} dependencies of request {request_id}")
+
+    if failed_request_ids:
+        raise click.ClickException(
+            f"Failed to index the dependencies of {len(failed_request_ids)} requests: "
+            + ", ".join(str(request_id) for request_id in failed_request_ids)
+        )
+
+
+@cli.command(name="compact-request-states")
+@click.option(
+    "--older-than",
+    type=click.IntRange(min=0),
+    default=30,
+    show_default=True,
+    help="The number of days since the requests became stale.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="The number of requests to compact in each transaction.",
+)
+def compact_request_states(older_than, batch_size):
+    """Archive the state history of old stale requests and collapse it."""
+    stale_before = datetime.utcnow() - timedelta(days=older_than)
+    request_ids = [
+        request_id
+        for request_id, in db.session.query(Request.id)
+        .filter(
+            Request.current_state == RequestStateMapping.stale.value,
+            Request.updated < stale_before,
+        )
+        .order_by(Request.id)
+    ]
+    compacted_requests = 0
+    removed_states = 0
+    for start in range(0, len(request_ids), batch_size):
+        batch = request_ids[start : start + batch_size]
+        for request in Request.query.filter(Request.id.in_(batch)):
+            removed = request.compact_states()
+            if removed:
+                compacted_requests += 1
+                removed_states += removed
+        db.session.commit()
+
+    click.echo(f"Compacted the state history of {compacted_requests} requests")
+    click.echo(f"Removed {removed_states} states, which were moved to request_state_archive")
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,55 @@
+"""Add the tables of the dependency search index
+Revision ID: 3a1f0c7d9e52
+Revises: e16de598d00d
+Create Date: 2022-08-22 10:31:07.215934
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3a1f0c7d9e52"
+down_revision = "e16de598d00d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "indexed_dependency",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("version", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Dependencies without a version are unique too
+    op.create_index(
+        "ix_indexed_dependency_name_version_type",
+        "indexed_dependency",
+        ["name", sa.text("coalesce(version, '')"), "type"],
+        unique=True,
+    )
+    op.create_table(
+        "request_indexed_dependency",
+        sa.Column("request_id", sa.Integer(), nullable=False),
+        sa.Column("indexed_dependency_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["indexed_dependency_id"], ["indexed_dependency.id"]),
+        sa.ForeignKeyConstraint(["request_id"], ["request.id"]),
+        sa.PrimaryKeyConstraint("request_id", "indexed_dependency_id"),
+    )
+    with op.batch_alter_table("request_indexed_dependency", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_request_indexed_dependency_indexed_dependency_id"),
+            ["indexed_dependency_id"],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("request_indexed_dependency", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_request_indexed_dependency_indexed_dependency_id"))
+
+    op.drop_table("request_indexed_dependency")
+    op.drop_index("ix_indexed_dependency_name_version_type", table_name="indexed_dependency")
+    op.drop_table("indexed_dependency")
@@ -0,0 +1,105 @@
+"""Add the request_metric table
+Revision ID: 5b7e2d4c8f13
+Revises: 3a1f0c7d9e52
+Create Date: 2022-08-29 14:07:42.918253
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b7e2d4c8f13"
+down_revision = "3a1f0c7d9e52"
+branch_labels = None
+depends_on = None
+
+# The values of RequestStateMapping.complete and RequestStateMapping.failed
+FINAL_STATES = (2, 3)
+
+request_state_table = sa.Table(
+    "request_state",
+    sa.MetaData(),
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("state", sa.Integer()),
+    sa.Column("updated", sa.DateTime()),
+    sa.Column("request_id", sa.Integer()),
+)
+
+request_metric_table = sa.Table(
+    "request_metric",
+    sa.MetaData(),
+    sa.Column("request_id", sa.Integer(), primary_key=True),
+    sa.Column("state", sa.Integer()),
+    sa.Column("finished", sa.DateTime()),
+    sa.Column("duration", sa.Float()),
+    sa.Column("time_in_queue", sa.Float()),
+)
+
+
+def upgrade():
+    op.create_table(
+        "request_metric",
+        sa.Column("request_id", sa.Integer(), nullable=False),
+        sa.Column("state", sa.Integer(), nullable=False),
+        sa.Column("finished", sa.DateTime(), nullable=False),
+        sa.Column("duration", sa.Float(), nullable=False),
+        sa.Column("time_in_queue", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["request_id"], ["request.id"]),
+        sa.PrimaryKeyConstraint("request_id"),
+    )
+    with op.batch_alter_table("request_metric", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_request_metric_finished"), ["finished"], unique=False)
+        batch_op.create_index(batch_op.f("ix_request_metric_state"), ["state"], unique=False)
+
+    # Store the metrics of the requests which are already finalized, the same way as
+    # RequestState.get_final_states_query computes them
+    final_state = request_state_table.alias("final_state")
+    later_final_state = request_state_table.alias("later_final_state")
+    states = sa.select(
+        request_state_table.c.request_id,
+        request_state_table.c.updated,
+        sa.func.lead(request_state_table.c.updated, 1)
+        .over(partition_by=request_state_table.c.request_id, order_by=request_state_table.c.updated)
+        .label("next_updated"),
+        sa.func.row_number()
+        .over(partition_by=request_state_table.c.request_id, order_by=request_state_table.c.updated)
+        .label("num"),
+    ).subquery()
+    metrics = (
+        sa.select(
+            final_state.c.request_id,
+            final_state.c.state,
+            final_state.c.updated,
+            sa.func.extract(
+                "epoch",
+                final_state.c.updated.cast(sa.TIMESTAMP) - states.c.updated.cast(sa.TIMESTAMP),
+            ),
+            sa.func.extract(
+                "epoch",
+                states.c.next_updated.cast(sa.TIMESTAMP) - states.c.updated.cast(sa.TIMESTAMP),
+            ),
+        )
+        .join(states, states.c.request_id == final_state.c.request_id)
+        .where(final_state.c.state.in_(FINAL_STATES), states.c.num == 1)
+        # Requests are expected to have a single final state, keep the last one otherwise
+        .where(
+            ~sa.exists().where(
+                later_final_state.c.request_id == final_state.c.request_id,
+                later_final_state.c.state.in_(FINAL_STATES),
+                later_final_state.c.id > final_state.c.id,
+            )
+        )
+    )
+    op.execute(
+        request_metric_table.insert().from_select(
+            ["request_id", "state", "finished", "duration", "time_in_queue"], metrics
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("request_metric", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_request_metric_state"))
+        batch_op.drop_index(batch_op.f("ix_request_metric_finished"))
+
+    op.drop_table("request_metric")
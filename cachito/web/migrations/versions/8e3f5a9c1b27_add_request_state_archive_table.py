@@ -0,0 +1,38 @@
+"""Add the request_state_archive table
+Revision ID: 8e3f5a9c1b27
+Revises: c4e91a2b6d08
+Create Date: 2022-09-12 11:20:34.571846
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8e3f5a9c1b27"
+down_revision = "c4e91a2b6d08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "request_state_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("state", sa.Integer(), nullable=False),
+        sa.Column("state_reason", sa.String(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+        sa.Column("request_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["request_id"], ["request.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("request_state_archive", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_request_state_archive_request_id"), ["request_id"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("request_state_archive", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_request_state_archive_request_id"))
+
+    op.drop_table("request_state_archive")
@@ -0,0 +1,94 @@
+"""Add the current state and package managers columns to the request table
+Revision ID: c4e91a2b6d08
+Revises: 5b7e2d4c8f13
+Create Date: 2022-09-05 09:48:16.603271
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c4e91a2b6d08"
+down_revision = "5b7e2d4c8f13"
+branch_labels = None
+depends_on = None
+
+request_table = sa.Table(
+    "request",
+    sa.MetaData(),
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("request_state_id", sa.Integer()),
+    sa.Column("current_state", sa.Integer()),
+    sa.Column("updated", sa.DateTime()),
+    sa.Column("pkg_managers_mask", sa.BigInteger()),
+)
+
+request_state_table = sa.Table(
+    "request_state",
+    sa.MetaData(),
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("state", sa.Integer()),
+    sa.Column("updated", sa.DateTime()),
+)
+
+request_pkg_manager_table = sa.Table(
+    "request_pkg_manager",
+    sa.MetaData(),
+    sa.Column("request_id", sa.Integer()),
+    sa.Column("pkg_manager_id", sa.Integer()),
+)
+
+
+def upgrade():
+    with op.batch_alter_table("request", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("current_state", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("updated", sa.DateTime(), nullable=True))
+        batch_op.add_column(
+            sa.Column("pkg_managers_mask", sa.BigInteger(), server_default="0", nullable=False)
+        )
+        batch_op.create_index("ix_request_current_state_id", ["current_state", "id"], unique=False)
+        batch_op.create_index(
+            "ix_request_current_state_updated", ["current_state", "updated"], unique=False
+        )
+        batch_op.create_index(
+            "ix_request_repo_current_state_id", ["repo", "current_state", "id"], unique=False
+        )
+
+    def last_state_column(column):
+        return (
+            sa.select(column)
+            .where(request_state_table.c.id == request_table.c.request_state_id)
+            .scalar_subquery()
+        )
+
+    pkg_managers_mask = (
+        sa.select(
+            sa.func.coalesce(
+                sa.func.sum(
+                    sa.literal(1, sa.BigInteger()).op("<<")(
+                        request_pkg_manager_table.c.pkg_manager_id
+                    )
+                ),
+                0,
+            ).cast(sa.BigInteger())
+        )
+        .where(request_pkg_manager_table.c.request_id == request_table.c.id)
+        .scalar_subquery()
+    )
+    op.execute(
+        request_table.update().values(
+            current_state=last_state_column(request_state_table.c.state),
+            updated=last_state_column(request_state_table.c.updated),
+            pkg_managers_mask=pkg_managers_mask,
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("request", schema=None) as batch_op:
+        batch_op.drop_index("ix_request_repo_current_state_id")
+        batch_op.drop_index("ix_request_current_state_updated")
+        batch_op.drop_index("ix_request_current_state_id")
+        batch_op.drop_column("pkg_managers_mask")
+        batch_op.drop_column("updated")
+        batch_op.drop_column("current_state")
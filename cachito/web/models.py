@@ -6,11 +6,12 @@ import re
 from collections import OrderedDict
 from copy import deepcopy
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Set, Tuple
 
 import flask
 from flask_login import UserMixin, current_user
 from sqlalchemy import TIMESTAMP, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql import expression
 from sqlalchemy.types import DateTime
@@ -80,6 +81,18 @@ request_config_file_base64_table = db.Table(
     db.UniqueConstraint("request_id", "config_file_base64_id"),
 )
 
+request_indexed_dependency_table = db.Table(
+    "request_indexed_dependency",
+    db.Column("request_id", db.Integer, db.ForeignKey("request.id"), primary_key=True),
+    db.Column(
+        "indexed_dependency_id",
+        db.Integer,
+        db.ForeignKey("indexed_dependency.id"),
+        primary_key=True,
+        index=True,
+    ),
+)
+
 
 class RequestStateMapping(Enum):
     """An Enum that represents the request states."""
@@ -324,6 +337,17 @@ class Request(db.Model):
     )
     packages_count = db.Column(db.Integer)
     dependencies_count = db.Column(db.Integer)
+    # Copies of the state and the package managers of the request, so that the requests can be
+    # filtered without joining other tables. They are kept in sync by add_state and by the
+    # pkg_managers validator.
+    current_state = db.Column(db.Integer)
+    updated = db.Column(db.DateTime())
+    pkg_managers_mask = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    __table_args__ = (
+        db.Index("ix_request_current_state_id", "current_state", "id"),
+        db.Index("ix_request_current_state_updated", "current_state", "updated"),
+        db.Index("ix_request_repo_current_state_id", "repo", "current_state", "id"),
+    )
 
     state = db.relationship("RequestState", foreign_keys=[request_state_id])
     pkg_managers = db.relationship(
@@ -369,7 +393,8 @@ class Request(db.Model):
         """
         packages_data = self._get_packages_data()
         packages = [
-            content_manifest.Package.from_json(package) for package in packages_data.packages
+            content_manifest.Package.from_json(package, shallow=True)
+            for package in packages_data.iter_packages()
         ]
 
         return content_manifest.ContentManifest(self, packages)
@@ -587,6 +612,61 @@ class Request(db.Model):
         request.add_state("in_progress", "The request was initiated")
         return request
 
+    def compact_states(self):
+        """
+        Archive the state history of the request and collapse it, without committing it.
+
+        The intermediate in_progress states are replaced by the first of them, which keeps the
+        timestamps used to compute the duration and the time in queue of the request.
+
+        :return: the number of states which were removed from the state history
+        :rtype: int
+        """
+        states = sorted(self.states, key=lambda state: (state.updated, state.id))
+        intermediate_states = [
+            state for state in states[1:] if state.state == RequestStateMapping.in_progress.value
+        ]
+        if len(intermediate_states) < 2:
+            return 0
+
+        archived_ids = {
+            state_id
+            for state_id, in db.session.query(RequestStateArchive.id).filter_by(request_id=self.id)
+        }
+        db.session.execute(
+            RequestStateArchive.__table__.insert(),
+            [
+                {
+                    "id": state.id,
+                    "request_id": state.request_id,
+                    "state": state.state,
+                    "state_reason": state.state_reason,
+                    "updated": state.updated,
+                }
+                for state in states
+                if state.id not in archived_ids
+            ],
+        )
+
+        summary_state, *removed_states = intermediate_states
+        summary_state.state_reason = (
+            f"{summary_state.state_reason} ({len(removed_states)} following in_progress states "
+            f"were archived, the last one was: {removed_states[-1].state_reason})"
+        )
+        for state in removed_states:
+            self.states.remove(state)
+            db.session.delete(state)
+        return len(removed_states)
+
+    @db.validates("pkg_managers", include_removes=True)
+    def _sync_pkg_managers_mask(self, key, pkg_manager, is_remove):
+        """Keep pkg_managers_mask in sync with the package managers of the request."""
+        if is_remove:
+            self.pkg_managers_mask = (self.pkg_managers_mask or 0) & ~pkg_manager.mask
+        else:
+            self.pkg_managers_mask = (self.pkg_managers_mask or 0) | pkg_manager.mask
+        return pkg_manager
+
     def add_state(self, state, state_reason):
         """
         Add a RequestState associated with the current request.
@@ -619,6 +699,10 @@ class Request(db.Model):
         db.session.add(request_state)
         db.session.flush()
         self.state = request_state
+        self.current_state = request_state.state
+        self.updated = request_state.updated
+        if new_state in (RequestStateMapping.complete, RequestStateMapping.failed):
+            RequestMetric.record(self, request_state)
 
 
 class PackageManager(db.Model):
@@ -627,6 +711,11 @@ class PackageManager(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
 
+    @property
+    def mask(self) -> int:
+        """Get the bit of the package manager in ``Request.pkg_managers_mask``."""
+        return 1 << self.id
+
     def to_json(self):
         """
         Generate the JSON representation of the package manager.
@@ -743,6 +832,61 @@ class RequestState(db.Model):
         )
 
 
+class RequestStateArchive(db.Model):
+    """A state of a request whose state history was compacted, see ``Request.compact_states``."""
+
+    # The ID of the state in the request_state table
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    state = db.Column(db.Integer, nullable=False)
+    state_reason = db.Column(db.String, nullable=False)
+    updated = db.Column(db.DateTime(), nullable=False)
+    request_id = db.Column(db.Integer, db.ForeignKey("request.id"), index=True, nullable=False)
+
+
+class RequestMetric(db.Model):
+    """
+    The metrics of a request which reached a final state.
+
+    They are the same as the columns of ``RequestState.get_final_states_query``, but they are
+    stored when the request is finalized so that they can be aggregated without going through the
+    whole state history.
+    """
+
+    request_id = db.Column(db.Integer, db.ForeignKey("request.id"), primary_key=True)
+    state = db.Column(db.Integer, nullable=False, index=True)
+    finished = db.Column(db.DateTime(), nullable=False, index=True)
+    duration = db.Column(db.Float, nullable=False)
+    time_in_queue = db.Column(db.Float, nullable=False)
+
+    @classmethod
+    def record(cls, request, final_state):
+        """
+        Store the metrics of a request which reached a final state, without committing them.
+
+        :param Request request: the finalized request
+        :param RequestState final_state: the final state of the request, which must be flushed
+        """
+        first_states = (
+            db.session.query(RequestState.updated)
+            .filter(RequestState.request_id == request.id)
+            .order_by(RequestState.updated, RequestState.id)
+            .limit(2)
+            .all()
+        )
+        created = first_states[0].updated
+        # The time in the queue ends with the state which follows the initial state
+        queued_until = first_states[-1].updated
+        db.session.merge(
+            cls(
+                request_id=request.id,
+                state=final_state.state,
+                finished=final_state.updated,
+                duration=(final_state.updated - created).total_seconds(),
+                time_in_queue=(queued_until - created).total_seconds(),
+            )
+        )
+
+
 class RequestError(db.Model):
     """A Cachito request error."""
 
@@ -993,3 +1137,157 @@ class ConfigFileBase64(ConfigFileBase, db.Model):
             raise ValidationError(
                 f'The {cls.type_name} configuration file key of "content" must be a string'
             )
+
+
+class IndexedDependency(db.Model):
+    """A dependency of complete requests, indexed to search the requests by their dependencies."""
+
+    # The number of dependencies to look up or insert at once
+    BATCH_SIZE = 500
+    # The number of times to index a batch of dependencies which are concurrently indexed
+    MAX_ATTEMPTS = 3
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    type = db.Column(db.String, nullable=False)
+    version = db.Column(db.String, nullable=True)
+    # The unique index also indexes the dependencies by name. Unlike a unique constraint, it
+    # doesn't allow duplicate dependencies without a version.
+    __table_args__ = (
+        db.Index(
+            "ix_indexed_dependency_name_version_type",
+            "name",
+            func.coalesce(version, ""),
+            "type",
+            unique=True,
+        ),
+    )
+
+    @classmethod
+    def index_request(cls, request_id: int, dependencies: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index the dependencies of a request, without committing them.
+
+        The dependencies which are already indexed are reused and the request is only added to
+        those it is not mapped to yet, so indexing a request again is harmless.
+
+        :param int request_id: the ID of the request
+        :param dependencies: the dependencies of the request, see
+            ``PackagesData.all_dependencies``
+        :return: the number of dependencies the request was mapped to
+        :rtype: int
+        """
+        # Dependencies without a version are sorted with the empty string, since None can't be
+        # compared to strings
+        keys = sorted(
+            {(dep["name"], dep["version"], dep["type"]) for dep in dependencies},
+            key=lambda key: (key[0], key[1] or "", key[2]),
+        )
+        already_mapped = {
+            row.indexed_dependency_id
+            for row in db.session.query(request_indexed_dependency_table).filter_by(
+                request_id=request_id
+            )
+        }
+        mapped = 0
+        for start in range(0, len(keys), cls.BATCH_SIZE):
+            batch = keys[start : start + cls.BATCH_SIZE]
+            for attempt in itertools.count(1):
+                try:
+                    with db.session.begin_nested():
+                        new_ids = cls._index_batch(request_id, batch, already_mapped)
+                    break
+                except IntegrityError:
+                    # Another request inserted some of the same dependencies in the meantime, they
+                    # are found when trying again
+                    if attempt == cls.MAX_ATTEMPTS:
+                        raise
+                    flask.current_app.logger.info(
+                        "Dependencies of request %d were concurrently indexed, trying again",
+                        request_id,
+                    )
+            already_mapped.update(new_ids)
+            mapped += len(new_ids)
+
+        return mapped
+
+    @classmethod
+    def _index_batch(
+        cls, request_id: int, batch: List[Tuple[str, str, str]], already_mapped: Set[int]
+    ) -> List[int]:
+        ids = cls._get_ids(batch)
+        missing = [key for key in batch if key not in ids]
+        if missing:
+            db.session.execute(
+                cls.__table__.insert(),
+                [
+                    {"name": name, "version": version, "type": type_}
+                    for name, version, type_ in missing
+                ],
+            )
+            ids = cls._get_ids(batch)
+
+        new_ids = [ids[key] for key in batch if ids[key] not in already_mapped]
+        if new_ids:
+            db.session.execute(
+                request_indexed_dependency_table.insert(),
+                [{"request_id": request_id, "indexed_dependency_id": dep_id} for dep_id in new_ids],
+            )
+        return new_ids
+
+    @classmethod
+    def _get_ids(cls, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], int]:
+        names = {name for name, _, _ in keys}
+        rows = db.session.query(cls.id, cls.name, cls.version, cls.type).filter(cls.name.in_(names))
+        wanted = set(keys)
+        return {
+            (row.name, row.version, row.type): row.id
+            for row in rows
+            if (row.name, row.version, row.type) in wanted
+        }
+
+    @classmethod
+    def prune_request(cls, request_id: int) -> None:
+        """
+        Remove a request from the index, without committing it.
+
+        The dependencies which are not mapped to any other request are removed too.
+
+        :param int request_id: the ID of the request
+        """
+        dependency_ids = [
+            row.indexed_dependency_id
+            for row in db.session.query(request_indexed_dependency_table).filter_by(
+                request_id=request_id
+            )
+        ]
+        if not dependency_ids:
+            return
+
+        db.session.execute(
+            request_indexed_dependency_table.delete().where(
+                request_indexed_dependency_table.c.request_id == request_id
+            )
+        )
+        still_mapped = db.session.query(request_indexed_dependency_table.c.indexed_dependency_id)
+        for start in range(0, len(dependency_ids), cls.BATCH_SIZE):
+            batch = dependency_ids[start : start + cls.BATCH_SIZE]
+            db.session.execute(
+                cls.__table__.delete().where(
+                    cls.id.in_(batch),
+                    cls.id.not_in(
+                        still_mapped.filter(
+                            request_indexed_dependency_table.c.indexed_dependency_id.in_(batch)
+                        )
+                    ),
+                )
+            )
+
+    def to_json(self):
+        """
+        Generate the JSON representation of the indexed dependency.
+
+        :return: the JSON representation of the indexed dependency.
+        :rtype: dict
+        """
+        return {"name": self.name, "type": self.type, "version": self.version}
@@ -1,13 +1,24 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import functools
+import json
+import os
+import tarfile
+from collections.abc import Iterator
 from datetime import date, datetime, time
 from operator import itemgetter
-from typing import Union
+from typing import Any, Iterable, List, Union
 
-from flask import request, url_for
+from flask import Response, request, url_for
+
+from cachito.common.checksum import hash_file
 
 CONTAINER_TYPES = (dict, list)
 SORT_KEY_BY_PURL = itemgetter("purl")
+# The size, in characters, of the chunks sent back by streaming JSON responses
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+# The size of the chunks read when hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
 
 
 def deep_sort_icm(orig_item):
@@ -114,3 +125,130 @@ def normalize_end_date(value: Union[datetime, date, None]):
     if isinstance(value, date) and not isinstance(value, datetime):
         return datetime.combine(value, time.max)
     return value
+
+
+def iter_json(obj: Any, sort_keys: bool = False, depth: int = 3) -> Iterable[str]:
+    """
+    Serialize an object to JSON incrementally.
+
+    Dictionaries, lists and iterators up to ``depth`` levels deep are serialized item by item,
+    anything deeper is serialized at once by the (C accelerated) ``json.dumps``. This keeps the
+    serialized form of large documents out of memory without paying for the pure Python encoder
+    on every value. Iterators are serialized as arrays, which allows generating the items lazily,
+    but they must be within ``depth`` levels. The output is otherwise identical to ``json.dumps``.
+
+    :param obj: the object to serialize
+    :param bool sort_keys: sort the keys of dictionaries
+    :param int depth: the number of levels to serialize item by item
+    :return: an iterator of JSON fragments
+    :rtype: Iterable[str]
+    """
+    if depth > 0 and isinstance(obj, dict) and all(isinstance(key, str) for key in obj):
+        items = sorted(obj.items()) if sort_keys else obj.items()
+        separator = "{"
+        for key, value in items:
+            yield f"{separator}{json.dumps(key)}: "
+            yield from iter_json(value, sort_keys, depth - 1)
+            separator = ", "
+        yield "}" if separator == ", " else "{}"
+    elif depth > 0 and isinstance(obj, (list, tuple, Iterator)):
+        separator = "["
+        for item in obj:
+            yield separator
+            yield from iter_json(item, sort_keys, depth - 1)
+            separator = ", "
+        yield "]" if separator == ", " else "[]"
+    elif isinstance(obj, Iterator):
+        yield json.dumps(list(obj), sort_keys=sort_keys)
+    else:
+        yield json.dumps(obj, sort_keys=sort_keys)
+
+
+def json_stream_response(obj: Any, sort_keys: bool = False) -> Response:
+    """
+    Create a response that streams an object serialized to JSON.
+
+    The JSON fragments are grouped in chunks of about ``JSON_STREAM_CHUNK_SIZE`` characters.
+
+    :param obj: the object to serialize, see ``iter_json``
+    :param bool sort_keys: sort the keys of dictionaries
+    :return: a Flask response streaming the JSON document
+    :rtype: flask.Response
+    """
+
+    def generate():
+        chunk = []
+        chunk_size = 0
+        for fragment in iter_json(obj, sort_keys=sort_keys):
+            chunk.append(fragment)
+            chunk_size += len(fragment)
+            if chunk_size >= JSON_STREAM_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            yield "".join(chunk)
+
+    return Response(generate(), mimetype="application/json")
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_file_sha256(path: str, size: int, mtime_ns: int, inode: int) -> str:
+    return hash_file(path, chunk_size=HASH_CHUNK_SIZE).hexdigest()
+
+
+def get_file_sha256(path: Union[str, os.PathLike]) -> str:
+    """
+    Get the SHA-256 digest of a file.
+
+    The digest is cached for as long as the size, modification time and inode of the file stay
+    the same, so large files are only read once per process.
+
+    :param path: the path to the file
+    :return: the hex encoded SHA-256 digest of the file
+    :rtype: str
+    :raise OSError: if the file can't be read
+    """
+    stat = os.stat(path)
+    return _get_file_sha256(str(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class _ChunkWriter:
+    """A write-only file object which collects the written data until it's taken."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_merged_tar_gz(paths: Iterable[Union[str, os.PathLike]]) -> Iterable[bytes]:
+    """
+    Merge gzipped tar archives into a single gzipped tar archive incrementally.
+
+    The members of the archives are copied in order, and the merged archive is generated as the
+    members are read, so neither the archives nor the merged archive are kept in memory.
+
+    :param paths: the paths to the gzipped tar archives to merge
+    :return: an iterator of the chunks of the merged archive
+    :rtype: Iterable[bytes]
+    """
+    writer = _ChunkWriter()
+    with tarfile.open(fileobj=writer, mode="w|gz") as merged_archive:
+        for path in paths:
+            with tarfile.open(path, mode="r|gz") as archive:
+                for member in archive:
+                    # Only regular files have contents, links can't even be extracted from a stream
+                    fileobj = archive.extractfile(member) if member.isreg() else None
+                    merged_archive.addfile(member, fileobj)
+                    data = writer.take()
+                    if data:
+                        yield data
+    yield writer.take()
@@ -22,6 +22,7 @@ class Config(object):
     # Refer to README.md for information on all the Cachito configuration options
     cachito_api_timeout = 60
     cachito_auth_type: Optional[str] = None
+    cachito_bundle_component_archives = False
     cachito_default_environment_variables = {
         "gomod": {"GOSUMDB": {"value": "off", "kind": "literal"}},
         "npm": {
@@ -32,6 +33,7 @@ class Config(object):
         },
     }
     cachito_deps_patch_batch_size = 50
+    cachito_download_concurrency = 4
     cachito_gomod_download_max_tries = 5
     cachito_gomod_ignore_missing_gomod_file = True
     cachito_gomod_strict_vendor = False
@@ -48,12 +50,16 @@ class Config(object):
     cachito_nexus_rubygems_raw_repo_name = "cachito-rubygems-raw"
     cachito_nexus_proxy_password: Optional[str] = None
     cachito_nexus_proxy_username: Optional[str] = None
+    cachito_nexus_raw_component_cache_hit_ttl = 86400  # 1 day
+    cachito_nexus_raw_component_cache_miss_ttl = 300  # 5 minutes
     cachito_nexus_request_repo_prefix = "cachito-"
     cachito_nexus_timeout = 60
+    cachito_nexus_upload_concurrency = 4
     cachito_nexus_username = "cachito"
     cachito_npm_file_deps_allowlist: Dict[str, List[str]] = {}
     cachito_yarn_file_deps_allowlist: Dict[str, List[str]] = {}
     cachito_gomod_file_deps_allowlist: Dict[str, List[str]] = {}
+    cachito_pip_index_cache_dir: Optional[str] = None
     cachito_request_file_logs_dir: Optional[str] = None
     cachito_request_file_logs_format = (
         "[%(asctime)s %(name)s %(levelname)s %(module)s.%(funcName)s] %(message)s"
@@ -144,6 +150,9 @@ class TestingConfig(DevelopmentConfig):
             "SKIP_SASS_BINARY_DOWNLOAD_FOR_CI": {"value": "true", "kind": "literal"},
         },
     }
+    # Results of Nexus searches must not leak from one test to another
+    cachito_nexus_raw_component_cache_hit_ttl = 0
+    cachito_nexus_raw_component_cache_miss_ttl = 0
     cachito_npm_file_deps_allowlist = {"han_solo": ["millennium-falcon"]}
     cachito_request_file_logs_dir = None
 
@@ -242,6 +251,11 @@ def validate_celery_config(conf, **kwargs):
             f"following environment variables: {', '.join(invalid_gomod_env_vars)}"
         )
 
+    for concurrency_conf in ("cachito_download_concurrency", "cachito_nexus_upload_concurrency"):
+        concurrency = conf.get(concurrency_conf)
+        if concurrency is not None and (not isinstance(concurrency, int) or concurrency < 1):
+            raise ConfigError(f'The configuration "{concurrency_conf}" must be a positive integer')
+
     cachito_request_file_logs_dir = conf.get("cachito_request_file_logs_dir")
     if cachito_request_file_logs_dir:
         if not os.path.isdir(cachito_request_file_logs_dir):
@@ -304,6 +318,12 @@ def validate_pip_config():
                 f'The configuration "{pip_config}" must be set for this package manager'
             )
 
+    index_cache_dir = conf.get("cachito_pip_index_cache_dir")
+    if index_cache_dir and not os.path.isdir(index_cache_dir):
+        raise ConfigError(
+            'The configuration "cachito_pip_index_cache_dir" must be set to an existing directory'
+        )
+
 
 def validate_rubygems_config():
     """
@@ -2,6 +2,7 @@
 import copy
 import logging
 import os
+import threading
 import time
 
 import requests.auth
@@ -361,6 +362,129 @@ def search_components(in_nexus_hoster=True, **query_params):
     return items
 
 
+class RawComponentCache:
+    """
+    Worker-local cache of the download URLs of raw components, keyed by the component name.
+
+    Both found and missing components are cached; found components are cached for
+    ``cachito_nexus_raw_component_cache_hit_ttl`` seconds and missing ones for
+    ``cachito_nexus_raw_component_cache_miss_ttl`` seconds. A raw repository can also be listed
+    in bulk with ``fill``; until the listing expires (after the miss TTL), components that were
+    not listed are considered missing without searching Nexus for them.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._lock = threading.Lock()
+        # (repository, name) -> (download URL or None, expiration time)
+        self._entries = {}
+        # repository -> expiration time of the listing
+        self._listings = {}
+
+    def get_asset_url(self, repository, name):
+        """
+        Get the download URL for the asset of a raw component, see get_raw_component_asset_url.
+
+        :param str repository: the name of the raw repository in the Nexus hoster instance
+        :param str name: the name of the component (directory + filename)
+        :return: download URL for the asset, or None if component was not found
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((repository, name))
+            listed = self._listings.get(repository, 0) > now
+        if entry is not None:
+            url, expires_at = entry
+            if expires_at > now:
+                log.debug("Using the cached lookup of the raw component %r", name)
+                return url
+        elif listed:
+            log.debug("The raw component %r was not listed in the %r repo", name, repository)
+            return None
+
+        url = get_raw_component_asset_url(repository, name)
+        self._store(repository, name, url)
+        return url
+
+    def fill(self, repository):
+        """
+        List all the components of a raw repository and cache them, unless recently done.
+
+        Failing to list the repository is not fatal, the components are then looked up one by one.
+
+        :param str repository: the name of the raw repository in the Nexus hoster instance
+        """
+        config = get_worker_config()
+        if config.cachito_nexus_raw_component_cache_miss_ttl <= 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._listings.get(repository, 0) > now:
+                return
+
+        log.debug("Listing the components of the %r raw repo", repository)
+        try:
+            components = search_components(format="raw", repository=repository)
+        except (NetworkError, NexusError):
+            log.warning(
+                "Failed to list the %r raw repo, will search for each component", repository
+            )
+            return
+
+        with self._lock:
+            # Drop the expired lookups so that the cache does not grow forever
+            self._entries = {key: entry for key, entry in self._entries.items() if entry[1] > now}
+            for component in components:
+                if len(component["assets"]) == 1:
+                    self._store_locked(
+                        repository, component["name"], component["assets"][0]["downloadUrl"], now
+                    )
+                else:
+                    # Let get_raw_component_asset_url report the unexpected assets
+                    self._entries[(repository, component["name"])] = (None, 0)
+            self._listings[repository] = now + config.cachito_nexus_raw_component_cache_miss_ttl
+
+    def invalidate(self, repository, name):
+        """
+        Forget what is known about a raw component, e.g. after it was uploaded.
+
+        The next lookup of the component searches Nexus, even if the repository was listed.
+
+        :param str repository: the name of the raw repository in the Nexus hoster instance
+        :param str name: the name of the component (directory + filename)
+        """
+        with self._lock:
+            self._entries[(repository, name)] = (None, 0)
+
+    def clear(self):
+        """Forget all the cached components and listings."""
+        with self._lock:
+            self._entries.clear()
+            self._listings.clear()
+
+    def _store(self, repository, name, url):
+        """Cache the result of looking up a raw component."""
+        with self._lock:
+            self._store_locked(repository, name, url, time.monotonic())
+
+    def _store_locked(self, repository, name, url, now):
+        """Cache the result of looking up a raw component, the lock must be held."""
+        config = get_worker_config()
+        if url is None:
+            ttl = config.cachito_nexus_raw_component_cache_miss_ttl
+        else:
+            ttl = config.cachito_nexus_raw_component_cache_hit_ttl
+        if ttl > 0 or config.cachito_nexus_raw_component_cache_miss_ttl > 0:
+            # An expired entry still prevents the listing from marking the component as missing
+            self._entries[(repository, name)] = (url, now + ttl)
+        else:
+            self._entries.pop((repository, name), None)
+
+
+raw_component_cache = RawComponentCache()
+
+
 def upload_asset_only_component(repo_name, repo_type, component_path, to_nexus_hoster=True):
     """
     Upload an asset only component to a Nexus hosted repository.
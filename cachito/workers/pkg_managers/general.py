@@ -1,9 +1,13 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import collections
+import hashlib
 import logging
 import os
+import secrets
+import shutil
 import urllib
-from typing import Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 
@@ -21,13 +25,103 @@ __all__ = [
     "update_request_with_config_files",
     "verify_checksum",
     "ChecksumInfo",
+    "ConcurrentJobs",
 ]
 
 log = logging.getLogger(__name__)
 
 ChecksumInfo = collections.namedtuple("ChecksumInfo", "algorithm hexdigest")
 
-pkg_requests_session = get_requests_session(retry_options={"allowed_methods": SAFE_REQUEST_METHODS})
+# Bounds of the buffer used when streaming downloads to disk, see _get_download_chunk_size
+MIN_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Dependencies may be downloaded from several threads at once, keep enough connections per host
+pkg_requests_session = get_requests_session(
+    retry_options={"allowed_methods": SAFE_REQUEST_METHODS},
+    pool_maxsize=max(
+        requests.adapters.DEFAULT_POOLSIZE, get_worker_config().cachito_download_concurrency
+    ),
+)
+
+
+class ConcurrentJobs:
+    """
+    Run jobs on a bounded thread pool and collect their results in submission order.
+
+    This is used to overlap slow network round trips (e.g. Nexus uploads) with the rest of the
+    processing. Failures are still reported per job: ``wait`` waits for every submitted job and
+    then re-raises the exception of the first job (in submission order) that failed, which is the
+    same error that processing the jobs one by one would have surfaced.
+
+    When used as a context manager, leaving the block waits for all the jobs. If the block is left
+    because of an exception, the jobs that have not started yet are cancelled.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, thread_name_prefix: str = "cachito"):
+        """
+        Initialize the thread pool.
+
+        :param int max_workers: the maximum number of jobs to run at once. If not set, the
+            ``cachito_nexus_upload_concurrency`` configuration is used.
+        :param str thread_name_prefix: the prefix of the names of the worker threads
+        """
+        if max_workers is None:
+            max_workers = get_worker_config().cachito_nexus_upload_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix=thread_name_prefix
+        )
+        self._jobs: List[Tuple[str, Future]] = []
+
+    def __enter__(self) -> "ConcurrentJobs":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            try:
+                self.wait()
+            finally:
+                self._executor.shutdown(wait=True)
+        else:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, description: str, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedule a job on the thread pool.
+
+        :param str description: a human readable description of the job used for error reporting
+        :param fn: the callable to run
+        :param args: the positional arguments for the callable
+        :param kwargs: the keyword arguments for the callable
+        :return: the future representing the result of the job
+        :rtype: concurrent.futures.Future
+        """
+        future = self._executor.submit(fn, *args, **kwargs)
+        self._jobs.append((description, future))
+        return future
+
+    def wait(self) -> List[Any]:
+        """
+        Wait for all the submitted jobs to finish.
+
+        :return: the results of the jobs in submission order
+        :rtype: list
+        :raises Exception: the exception of the first job that failed, if any
+        """
+        first_error = None
+        for description, future in self._jobs:
+            error = future.exception()
+            if error is None:
+                continue
+            if first_error is None:
+                first_error = error
+            else:
+                log.error("The %s also failed: %s", description, error)
+
+        if first_error is not None:
+            raise first_error
+
+        return [future.result() for _, future in self._jobs]
 
 
 def _get_request_url(request_id):
@@ -108,24 +202,34 @@ def update_request_env_vars(request_id: int, env_vars: Dict[str, Dict[str, str]]
         raise InvalidRequestData(f"Updating environment variables on request {request_id} failed")
 
 
-def verify_checksum(file_path: str, checksum_info: ChecksumInfo, chunk_size: int = 10240):
+def verify_checksum(
+    file_path: str,
+    checksum_info: ChecksumInfo,
+    chunk_size: int = 10240,
+    digests: Optional[Dict[str, str]] = None,
+):
     """
     Verify the checksum of the file at the given path matches the expected checksum info.
 
     :param str file_path: the path to the file to be verified
     :param ChecksumInfo checksum_info: the expected checksum information
     :param int chunk_size: the amount of bytes to read at a time
+    :param dict digests: the hex digests already computed for the file, keyed by the algorithm
+        (see download_binary_file). The file is only read if the algorithm is not in there.
     :raise InvalidChecksum: if the checksum is not as expected
     """
     filename = os.path.basename(file_path)
 
-    try:
-        hasher = hash_file(file_path, chunk_size, checksum_info.algorithm)
-    except UnknownHashAlgorithm as exc:
-        msg = f"Cannot perform checksum on the file {filename}, {exc}"
-        raise InvalidChecksum(msg)
+    if digests and checksum_info.algorithm in digests:
+        computed_hexdigest = digests[checksum_info.algorithm]
+    else:
+        try:
+            hasher = hash_file(file_path, chunk_size, checksum_info.algorithm)
+        except UnknownHashAlgorithm as exc:
+            msg = f"Cannot perform checksum on the file {filename}, {exc}"
+            raise InvalidChecksum(msg)
 
-    computed_hexdigest = hasher.hexdigest()
+        computed_hexdigest = hasher.hexdigest()
 
     if computed_hexdigest != checksum_info.hexdigest:
         msg = (
@@ -135,43 +239,133 @@ def verify_checksum(file_path: str, checksum_info: ChecksumInfo, chunk_size: int
         raise InvalidChecksum(msg)
 
 
-def download_binary_file(url, download_path, auth=None, insecure=False, chunk_size=8192):
+def _get_download_chunk_size(resp: requests.Response) -> int:
+    """
+    Pick the size of the buffer used to stream a response to disk.
+
+    Small files are written with a small buffer, large files with a large one so that the number
+    of writes and hash updates stays low. The size is within the MIN/MAX_DOWNLOAD_CHUNK_SIZE bounds.
+
+    :param requests.Response resp: the streamed response
+    :return: the chunk size in bytes
+    """
+    try:
+        content_length = int(resp.headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        return MIN_DOWNLOAD_CHUNK_SIZE
+    return min(max(content_length // 16, MIN_DOWNLOAD_CHUNK_SIZE), MAX_DOWNLOAD_CHUNK_SIZE)
+
+
+def download_binary_file(
+    url, download_path, auth=None, insecure=False, chunk_size=None, hash_algorithms=()
+):
     """
     Download a binary file (such as a TAR archive) from a URL.
 
+    The requested digests are computed while the file is being written, so callers that need to
+    verify the file do not have to read it again.
+
     :param str url: URL for file download
     :param (str | Path) download_path: Path to download file to
     :param requests.auth.AuthBase auth: Authentication for the URL
     :param bool insecure: Do not verify SSL for the URL
-    :param int chunk_size: Chunk size param for Response.iter_content()
+    :param int chunk_size: Chunk size param for Response.iter_content(), picked based on the size
+        of the file if not set
+    :param Iterable[str] hash_algorithms: names of the hash algorithms (as accepted by
+        hashlib.new) to compute the digests of the file with
+    :return: the hex digests of the file, keyed by the algorithm
+    :rtype: dict[str, str]
     :raise NetworkError: If download failed
+    :raise InvalidChecksum: If one of the hash algorithms is unknown
     """
+    hashers = {}
+    for algorithm in hash_algorithms:
+        try:
+            hashers[algorithm] = hashlib.new(algorithm)
+        except ValueError:
+            # Fail before downloading anything, the file could not be verified anyway
+            raise InvalidChecksum(
+                f"Cannot perform checksum on the file downloaded from {url}, "
+                f"hash algorithm {algorithm} is unknown."
+            )
+
     try:
         resp = pkg_requests_session.get(url, stream=True, verify=not insecure, auth=auth)
         resp.raise_for_status()
     except requests.RequestException as e:
         raise NetworkError(f"Could not download {url}: {e}")
 
+    if chunk_size is None:
+        chunk_size = _get_download_chunk_size(resp)
+
     with open(download_path, "wb") as f:
         for chunk in resp.iter_content(chunk_size=chunk_size):
             f.write(chunk)
+            for hasher in hashers.values():
+                hasher.update(chunk)
 
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
 
-def download_raw_component(raw_component_name, raw_repo_name, download_path, nexus_auth):
+
+def download_raw_component(
+    raw_component_name, raw_repo_name, download_path, nexus_auth, hash_algorithms=()
+):
     """
     Download raw component if present in raw repo.
 
-    :return: True if component was downloaded, False otherwise
+    The lookup goes through nexus.raw_component_cache. If downloading from a cached URL fails,
+    the component is looked up again in case it was removed from Nexus in the meantime.
+
+    :param Iterable[str] hash_algorithms: names of the hash algorithms to compute the digests of
+        the component with, see download_binary_file
+    :return: the hex digests of the component if it was downloaded, None otherwise
+    :rtype: dict[str, str] or None
     """
     log.debug("Looking for raw component %r in %r repo", raw_component_name, raw_repo_name)
-    download_url = nexus.get_raw_component_asset_url(raw_repo_name, raw_component_name)
+    download_url = nexus.raw_component_cache.get_asset_url(raw_repo_name, raw_component_name)
+    if download_url is None:
+        return None
 
-    if download_url is not None:
-        log.debug("Found raw component, will download from %r", download_url)
-        download_binary_file(download_url, download_path, auth=nexus_auth)
-        return True
+    log.debug("Found raw component, will download from %r", download_url)
+    try:
+        return download_binary_file(
+            download_url, download_path, auth=nexus_auth, hash_algorithms=hash_algorithms
+        )
+    except NetworkError:
+        nexus.raw_component_cache.invalidate(raw_repo_name, raw_component_name)
+        current_url = nexus.raw_component_cache.get_asset_url(raw_repo_name, raw_component_name)
+        if current_url == download_url:
+            raise
 
-    return False
+    if current_url is None:
+        log.debug("The raw component is no longer in the %r repo", raw_repo_name)
+        return None
+
+    log.debug("The raw component was moved, will download from %r", current_url)
+    return download_binary_file(
+        current_url, download_path, auth=nexus_auth, hash_algorithms=hash_algorithms
+    )
+
+
+def link_or_copy(src_path, dest_path):
+    """
+    Make the file available at the destination path, without copying it if possible.
+
+    The destination is a hardlink to the source file if both are in the same filesystem, which
+    avoids copying large archives (e.g. the archives in ``cachito_sources_dir``). Otherwise, the
+    file is copied. An existing destination file is replaced atomically.
+
+    :param (str | Path) src_path: the path to the existing file
+    :param (str | Path) dest_path: the path to make the file available at
+    """
+    tmp_path = f"{dest_path}.{secrets.token_hex(8)}.tmp"
+    try:
+        os.link(src_path, tmp_path)
+    except OSError as e:
+        # e.g. a different filesystem or a filesystem without hardlinks
+        log.debug("Could not hardlink %s, will copy it instead: %s", src_path, e)
+        shutil.copy(src_path, tmp_path)
+    os.replace(tmp_path, dest_path)
 
 
 def upload_raw_package(repo_name, artifact_path, dest_dir, filename, is_request_repository):
@@ -190,6 +384,9 @@ def upload_raw_package(repo_name, artifact_path, dest_dir, filename, is_request_
     to_nexus_hoster = not is_request_repository
     log.debug("Uploading %r as a raw package to the %r Nexus repository", artifact_path, repo_name)
     nexus.upload_raw_component(repo_name, dest_dir, components, to_nexus_hoster)
+    if to_nexus_hoster:
+        # The component was probably cached as missing, look it up next time it is needed
+        nexus.raw_component_cache.invalidate(repo_name, f"{dest_dir}/{filename}")
 
 
 def extract_git_info(vcs_url):
@@ -9,7 +9,7 @@ import shutil
 import tempfile
 from datetime import datetime
 from pathlib import Path, PureWindowsPath
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import backoff
 import git
@@ -34,6 +34,7 @@ __all__ = [
     "contains_package",
     "path_to_subpackage",
     "match_parent_module",
+    "ModuleTrie",
 ]
 
 log = logging.getLogger(__name__)
@@ -146,6 +147,53 @@ def match_parent_module(package_name: str, module_names: Iterable[str]) -> Optio
     )
 
 
+class ModuleTrie:
+    """
+    A trie of Go module names keyed by their path segments.
+
+    Finding the parent module of a package takes time proportional to the number of segments in
+    the package name rather than to the number of modules, see ``match_parent_module``.
+    """
+
+    def __init__(self, module_names: Iterable[str] = ()):
+        """
+        Initialize the ModuleTrie.
+
+        :param module_names: iterable of module names to add to the trie
+        """
+        self._root: Dict[Optional[str], Any] = {}
+        for module_name in module_names:
+            self.add(module_name)
+
+    def add(self, module_name: str) -> None:
+        """
+        Add a module name to the trie.
+
+        :param module_name: name of module
+        """
+        node = self._root
+        for segment in module_name.split("/"):
+            node = node.setdefault(segment, {})
+        # None can't be a path segment, so it marks the end of a module name
+        node[None] = module_name
+
+    def match_parent_module(self, package_name: str) -> Optional[str]:
+        """
+        Find the parent module of a package.
+
+        :param package_name: name of package
+        :return: longest matching module name or None (no module matches)
+        """
+        node = self._root
+        parent_module = None
+        for segment in package_name.split("/"):
+            node = node.get(segment)
+            if node is None:
+                break
+            parent_module = node.get(None, parent_module)
+        return parent_module
+
+
 def resolve_gomod(app_source_path, request, dep_replacements=None, git_dir_path=None):
     """
     Resolve and fetch gomod dependencies for given app source archive.
@@ -580,9 +628,9 @@ def _set_full_local_dep_relpaths(pkg_deps: List[dict], main_module_deps: List[di
     to the package (based on the package name relative to the module name) and join it with the
     module path.
     """
-    locally_replaced_mod_names = [
+    locally_replaced_modules = ModuleTrie(
         module["name"] for module in main_module_deps if module["version"].startswith(".")
-    ]
+    )
 
     for dep in pkg_deps:
         dep_name = dep["name"]
@@ -592,7 +640,7 @@ def _set_full_local_dep_relpaths(pkg_deps: List[dict], main_module_deps: List[di
             continue
 
         # The gomod module that contains this go-package dependency
-        dep_module_name = match_parent_module(dep_name, locally_replaced_mod_names)
+        dep_module_name = locally_replaced_modules.match_parent_module(dep_name)
         if dep_module_name is None:
             # This should be impossible
             raise RuntimeError(f"Could not find parent Go module for local dependency: {dep_name}")
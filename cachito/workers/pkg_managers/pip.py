@@ -1,13 +1,15 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import ast
 import configparser
+import hashlib
+import json
 import logging
 import os.path
 import random
 import re
 import secrets
-import shutil
 import tarfile
+import tempfile
 import urllib
 import zipfile
 from abc import ABC, abstractmethod
@@ -35,8 +37,10 @@ from cachito.workers.paths import RequestBundleDir
 from cachito.workers.pkg_managers import general
 from cachito.workers.pkg_managers.general import (
     ChecksumInfo,
+    ConcurrentJobs,
     download_raw_component,
     extract_git_info,
+    link_or_copy,
     pkg_requests_session,
     upload_raw_package,
     verify_checksum,
@@ -59,6 +63,12 @@ COMPRESSED_TAR_EXT = ".tar.Z"
 SDIST_FILE_EXTENSIONS = [ZIP_FILE_EXT, ".tar.gz", ".tar.bz2", ".tar.xz", COMPRESSED_TAR_EXT, ".tar"]
 SDIST_EXT_PATTERN = r"|".join(map(re.escape, SDIST_FILE_EXTENSIONS))
 
+# Ask for the JSON form of the simple API (PEP 691) and fall back to the HTML form (PEP 503)
+PYPI_SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+PYPI_SIMPLE_ACCEPT = (
+    f"{PYPI_SIMPLE_JSON_CONTENT_TYPE}, application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.01"
+)
+
 
 def get_pip_metadata(package_dir):
     """
@@ -1264,7 +1274,7 @@ def finalize_nexus_for_pip_request(pip_repo_name, raw_repo_name, username):
     return password
 
 
-def download_dependencies(request_id, requirements_file):
+def download_dependencies(request_id, requirements_file, upload_jobs=None):
     """
     Download sdists (source distributions) of all dependencies in a requirements.txt file.
 
@@ -1272,12 +1282,22 @@ def download_dependencies(request_id, requirements_file):
     were not already present. PyPI dependencies get cached automatically just by being
     downloaded from the right URL, see _download_pypi_package().
 
+    The requirements are downloaded concurrently (see the ``cachito_download_concurrency``
+    configuration). Each download is verified (hashes and sdist metadata) as soon as it finishes
+    and the uploads run in the background while the remaining dependencies are downloaded.
+
     :param int request_id: ID of the request these dependencies are being downloaded for
     :param PipRequirementsFile requirements_file: A requirements.txt file
+    :param ConcurrentJobs upload_jobs: the thread pool to schedule the uploads on. If not
+        provided, a new one is created and all the uploads are finished before returning.
     :return: Info about downloaded packages; all items will contain "kind" and "path" keys
         (and more based on kind, see _download_*_package functions for more details)
     :rtype: list[dict]
     """
+    if upload_jobs is None:
+        with ConcurrentJobs() as upload_jobs:
+            return download_dependencies(request_id, requirements_file, upload_jobs)
+
     options = _process_options(requirements_file.options)
     trusted_hosts = set(options["trusted_hosts"])
 
@@ -1308,9 +1328,12 @@ def download_dependencies(request_id, requirements_file):
     nexus_auth = requests.auth.HTTPBasicAuth(nexus_username, nexus_password)
     pypi_proxy_auth = nexus_auth
 
-    downloads = []
+    if any(req.kind in ("vcs", "url") for req in requirements_file.requirements):
+        # Find the raw components that are already in Nexus with one listing, not a search each
+        nexus.raw_component_cache.fill(pip_raw_repo_name)
 
-    for req in requirements_file.requirements:
+    def download(req):
+        """Download, verify and (if needed) upload a single requirement."""
         log.info("Downloading %s", req.download_line)
 
         if req.kind == "pypi":
@@ -1338,7 +1361,7 @@ def download_dependencies(request_id, requirements_file):
 
         if require_hashes or req.kind == "url":
             hashes = req.hashes or [req.qualifiers["cachito_hash"]]
-            _verify_hash(download_info["path"], hashes)
+            _verify_hash(download_info["path"], hashes, download_info.get("digests"))
 
         # If the raw component is not in the Nexus hoster instance, upload it there
         if req.kind in ("vcs", "url") and not download_info["have_raw_component"]:
@@ -1349,7 +1372,9 @@ def download_dependencies(request_id, requirements_file):
                 download_info["raw_component_name"],
             )
             dest_dir, filename = download_info["raw_component_name"].rsplit("/", 1)
-            upload_raw_package(
+            upload_jobs.submit(
+                f"upload of {req.download_line} to {pip_raw_repo_name}",
+                upload_raw_package,
                 pip_raw_repo_name,
                 download_info["path"],
                 dest_dir,
@@ -1358,9 +1383,17 @@ def download_dependencies(request_id, requirements_file):
             )
 
         download_info["kind"] = req.kind
-        downloads.append(download_info)
+        return download_info
 
-    return downloads
+    # The results are collected in the order of the requirements file, no matter in which order
+    # the downloads finish
+    with ConcurrentJobs(
+        config.cachito_download_concurrency, thread_name_prefix="cachito-pip-download"
+    ) as download_jobs:
+        for req in requirements_file.requirements:
+            download_jobs.submit(f"download of {req.download_line}", download, req)
+
+    return download_jobs.wait()
 
 
 def _process_options(options):
@@ -1536,7 +1569,8 @@ def _download_pypi_package(requirement, pip_deps_dir, pypi_proxy_url, pypi_proxy
     :param str pypi_proxy_url: URL of Nexus PyPI proxy
     :param requests.auth.AuthBase pypi_proxy_auth: Authorization for the PyPI proxy
 
-    :return: Dict with package name, version and download path
+    :return: Dict with package name, version, download path and the digests computed while
+        downloading
     :raises NetworkError: if PyPI query failed
     :raises InvalidRequestData: if sdists for the package is not found or yanked
     """
@@ -1545,17 +1579,9 @@ def _download_pypi_package(requirement, pip_deps_dir, pypi_proxy_url, pypi_proxy
 
     # See https://www.python.org/dev/peps/pep-0503/
     package_url = f"{pypi_proxy_url.rstrip('/')}/simple/{canonicalize_name(package)}/"
-    try:
-        pypi_resp = pkg_requests_session.get(package_url, auth=pypi_proxy_auth)
-        pypi_resp.raise_for_status()
-    except requests.RequestException as e:
-        raise NetworkError(f"PyPI query failed: {e}")
-
-    html = defusedxml.ElementTree.fromstring(pypi_resp.text)
-    # Find all anchors anywhere in the doc, the PEP does not specify where they should be
-    links = html.iter("a")
-
-    sdists = _process_package_links(links, package, version)
+    sdists = _get_package_sdists(package_url, package, pypi_proxy_auth).get(
+        canonicalize_version(version)
+    )
     if not sdists:
         raise InvalidRequestData(f"No sdists found for package {package}=={version}")
 
@@ -1568,17 +1594,169 @@ def _download_pypi_package(requirement, pip_deps_dir, pypi_proxy_url, pypi_proxy
     package_dir.mkdir(exist_ok=True)
     download_path = package_dir / sdist["filename"]
 
-    # Nexus turns package URLs into relative URLs
-    proxied_url = f"{package_url.rstrip('/')}/{sdist['url']}"
-    general.download_binary_file(proxied_url, download_path, auth=pypi_proxy_auth)
+    if urllib.parse.urlparse(sdist["url"]).scheme:
+        proxied_url = sdist["url"]
+    else:
+        # Nexus turns package URLs into relative URLs
+        proxied_url = f"{package_url.rstrip('/')}/{sdist['url']}"
+    digests = general.download_binary_file(
+        proxied_url,
+        download_path,
+        auth=pypi_proxy_auth,
+        hash_algorithms=_get_hash_algorithms(requirement),
+    )
 
     return {
         "package": sdist["name"],
         "version": sdist["version"],
         "path": download_path,
+        "digests": digests,
     }
 
 
+def _get_package_sdists(package_url, name, auth):
+    """
+    Get the sdists of a package from the PyPI proxy, grouped by version.
+
+    The index page is requested in the JSON form (PEP 691) if the proxy supports it, otherwise
+    the HTML form (PEP 503) is used. If ``cachito_pip_index_cache_dir`` is configured, the
+    processed index is cached there and revalidated with the ETag/Last-Modified validators of
+    the previous response, so unchanged index pages are neither transferred nor parsed again.
+
+    :param str package_url: URL of the package page in the simple API of the PyPI proxy
+    :param str name: Package name
+    :param requests.auth.AuthBase auth: Authorization for the PyPI proxy
+    :return: Mapping of canonical versions to lists of sdists, see _process_package_links
+    :rtype: dict[str, list[dict]]
+    :raises NetworkError: if PyPI query failed
+    """
+    cache_path = _get_index_cache_path(package_url)
+    cached = _load_index_cache(cache_path) if cache_path else None
+
+    headers = {"Accept": PYPI_SIMPLE_ACCEPT}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        pypi_resp = pkg_requests_session.get(package_url, auth=auth, headers=headers)
+        pypi_resp.raise_for_status()
+    except requests.RequestException as e:
+        raise NetworkError(f"PyPI query failed: {e}")
+
+    if cached and pypi_resp.status_code == 304:
+        log.debug("The cached index of %s is up to date", package_url)
+        return cached["sdists"]
+
+    sdists = _group_sdists_by_version(_parse_package_index(pypi_resp), name)
+
+    if cache_path:
+        validators = {
+            "etag": pypi_resp.headers.get("ETag"),
+            "last_modified": pypi_resp.headers.get("Last-Modified"),
+        }
+        if any(validators.values()):
+            _store_index_cache(cache_path, {**validators, "sdists": sdists})
+
+    return sdists
+
+
+def _parse_package_index(pypi_resp):
+    """
+    Parse the files listed in a response from the simple API.
+
+    :param requests.Response pypi_resp: Response for a package page in either the JSON (PEP 691)
+        or the HTML (PEP 503) form
+    :return: Iterable of dicts with the filename, url and yanked keys
+    """
+    content_type = pypi_resp.headers.get("Content-Type", "")
+    if content_type.startswith(PYPI_SIMPLE_JSON_CONTENT_TYPE):
+        return (
+            {
+                "filename": file["filename"],
+                "url": file["url"],
+                # The value is either a boolean or the reason why the file was yanked
+                "yanked": bool(file.get("yanked", False)),
+            }
+            for file in pypi_resp.json()["files"]
+        )
+
+    html = defusedxml.ElementTree.fromstring(pypi_resp.text)
+    # Find all anchors anywhere in the doc, the PEP does not specify where they should be
+    return _iter_link_files(html.iter("a"))
+
+
+def _iter_link_files(links):
+    """
+    Get the file information from html anchor elements.
+
+    :param Iterable links: Iterable of html anchor elements
+    :return: Iterable of dicts with the filename, url and yanked keys
+    """
+    for link in links:
+        yield {
+            "filename": link.text or "",
+            "url": link.get("href"),
+            # https://www.python.org/dev/peps/pep-0592/
+            "yanked": link.get("data-yanked") is not None,
+        }
+
+
+def _get_index_cache_path(package_url):
+    """
+    Get the path of the cached index of a package.
+
+    :param str package_url: URL of the package page in the simple API of the PyPI proxy
+    :return: the path to the cache file or None if the cache is disabled
+    :rtype: Path or None
+    """
+    cache_dir = get_worker_config().cachito_pip_index_cache_dir
+    if not cache_dir:
+        return None
+    key = hashlib.sha256(package_url.encode("utf-8")).hexdigest()
+    return Path(cache_dir, f"{key}.json")
+
+
+def _load_index_cache(cache_path):
+    """
+    Load a cached index of a package.
+
+    :param Path cache_path: the path to the cache file
+    :return: the cached data or None if there is no usable cache entry
+    :rtype: dict or None
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring the unreadable PyPI index cache %s: %s", cache_path, e)
+        return None
+
+
+def _store_index_cache(cache_path, data):
+    """
+    Atomically store the cached index of a package.
+
+    The cache directory may be shared by several workers. The data is written to a temporary file
+    first so that readers never see a partially written cache file.
+
+    :param Path cache_path: the path to the cache file
+    :param dict data: the data to cache
+    """
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=cache_path.parent, prefix=".tmp-", suffix=".json", delete=False
+        ) as f:
+            json.dump(data, f)
+        os.replace(f.name, cache_path)
+    except OSError as e:
+        log.warning("Failed to store the PyPI index cache %s: %s", cache_path, e)
+
+
 def _process_package_links(links, name, version):
     """
     Process links to Python packages.
@@ -1590,8 +1768,20 @@ def _process_package_links(links, name, version):
     :param str version: Package version
     :return: List of dicts with processed metadata
     """
+    sdists = _group_sdists_by_version(_iter_link_files(links), name)
+    return sdists.get(canonicalize_version(version), [])
+
+
+def _group_sdists_by_version(files, name):
+    """
+    Pick out the sdists of a package and group them by their canonical version.
+
+    :param Iterable files: Iterable of dicts with the filename, url and yanked keys
+    :param str name: Package name
+    :return: Mapping of canonical versions to lists of dicts with processed metadata
+    :rtype: dict[str, list[dict]]
+    """
     canonical_name = canonicalize_name(name)
-    canonical_version = canonicalize_version(version)
 
     # When matching package name, use a regex that will match any non-canonical
     # variation of the canonical name (it also needs to be case-insensitive).
@@ -1603,25 +1793,21 @@ def _process_package_links(links, name, version):
         re.IGNORECASE,
     )
 
-    sdists = []
+    sdists = {}
 
-    for link in links:
-        match = sdist_re.match(link.text)
+    for file in files:
+        match = sdist_re.match(file["filename"])
         if not match:
             continue
 
         name, version = match.groups()
-        if canonical_version != canonicalize_version(version):
-            continue
-
-        sdists.append(
+        sdists.setdefault(canonicalize_version(version), []).append(
             {
                 "name": name,
                 "version": version,
-                "filename": link.text,
-                "url": link.get("href"),
-                # https://www.python.org/dev/peps/pep-0592/
-                "yanked": link.get("data-yanked") is not None,
+                "filename": file["filename"],
+                "url": file["url"],
+                "yanked": file["yanked"],
             }
         )
 
@@ -1682,16 +1868,17 @@ def _download_vcs_package(requirement, pip_deps_dir, pip_raw_repo_name, nexus_au
     download_path = package_dir / filename
 
     # Download raw component if we already have it
-    have_raw_component = download_raw_component(
-        raw_component_name, pip_raw_repo_name, download_path, nexus_auth
+    have_raw_component = (
+        download_raw_component(raw_component_name, pip_raw_repo_name, download_path, nexus_auth)
+        is not None
     )
 
     if not have_raw_component:
         log.debug("Raw component not found, will fetch from git")
         repo = Git(git_info["url"], ref)
         repo.fetch_source(gitsubmodule=False)
-        # Copy downloaded archive to expected download path
-        shutil.copy(repo.sources_dir.archive_path, download_path)
+        # Link (or copy) the downloaded archive to the expected download path
+        link_or_copy(repo.sources_dir.archive_path, download_path)
 
     return {
         "package": requirement.package,
@@ -1716,7 +1903,8 @@ def _download_url_package(requirement, pip_deps_dir, pip_raw_repo_name, nexus_au
     :param set[str] trusted_hosts: If host (or host:port) is trusted, do not verify SSL
 
     :return: Dict with package name, download path, original URL, URL with hash, name of raw
-        component in Nexus and boolean whether we already have the raw component in Nexus
+        component in Nexus, boolean whether we already have the raw component in Nexus and
+        the digests computed while downloading
     """
     package = requirement.package
 
@@ -1732,10 +1920,13 @@ def _download_url_package(requirement, pip_deps_dir, pip_raw_repo_name, nexus_au
     package_dir.mkdir(exist_ok=True)
     download_path = package_dir / filename
 
+    hash_algorithms = _get_hash_algorithms(requirement)
+
     # Download raw component if we already have it
-    have_raw_component = download_raw_component(
-        raw_component_name, pip_raw_repo_name, download_path, nexus_auth
+    digests = download_raw_component(
+        raw_component_name, pip_raw_repo_name, download_path, nexus_auth, hash_algorithms
     )
+    have_raw_component = digests is not None
 
     if not have_raw_component:
         log.debug("Raw component not found, will download from %r", requirement.url)
@@ -1751,7 +1942,9 @@ def _download_url_package(requirement, pip_deps_dir, pip_raw_repo_name, nexus_au
         else:
             insecure = False
 
-        general.download_binary_file(requirement.url, download_path, insecure=insecure)
+        digests = general.download_binary_file(
+            requirement.url, download_path, insecure=insecure, hash_algorithms=hash_algorithms
+        )
 
     if "cachito_hash" in requirement.qualifiers:
         url_with_hash = requirement.url
@@ -1765,6 +1958,7 @@ def _download_url_package(requirement, pip_deps_dir, pip_raw_repo_name, nexus_au
         "url_with_hash": url_with_hash,
         "raw_component_name": raw_component_name,
         "have_raw_component": have_raw_component,
+        "digests": digests,
     }
 
 
@@ -1783,12 +1977,32 @@ def _add_cachito_hash_to_url(parsed_url, hash_spec):
     return parsed_url._replace(fragment=new_fragment).geturl()
 
 
-def _verify_hash(download_path, hashes):
+def _get_hash_algorithms(requirement):
+    """
+    Get the hash algorithms used by the hashes of a requirement.
+
+    Unknown algorithms are left out, _verify_hash reports them when verifying the file.
+
+    :param PipRequirement requirement: requirement from a requirements.txt file
+    :return: names of the hash algorithms, to compute digests with while downloading
+    :rtype: list[str]
+    """
+    hashes = list(requirement.hashes)
+    if "cachito_hash" in requirement.qualifiers:
+        hashes.append(requirement.qualifiers["cachito_hash"])
+
+    algorithms = {hash_spec.partition(":")[0] for hash_spec in hashes}
+    return sorted(algorithms & hashlib.algorithms_guaranteed)
+
+
+def _verify_hash(download_path, hashes, digests=None):
     """
     Check that downloaded archive verifies against at least one of the provided hashes.
 
     :param Path download_path: Path to downloaded file
     :param list[str] hashes: All provided hashes for requirement
+    :param dict[str, str] digests: Digests computed while downloading the file, the file is only
+        read again for algorithms that are not in there
     :raise InvalidChecksum: If computed hash does not match any of the provided hashes
     """
     log.info(f"Verifying checksum of {download_path.name}")
@@ -1797,7 +2011,7 @@ def _verify_hash(download_path, hashes):
         algorithm, _, digest = hash_spec.partition(":")
         checksum_info = ChecksumInfo(algorithm, digest)
         try:
-            verify_checksum(str(download_path), checksum_info)
+            verify_checksum(str(download_path), checksum_info, digests=digests)
             log.info(f"Checksum of {download_path.name} matches: {algorithm}:{digest}")
             return
         except InvalidChecksum as e:
@@ -2055,24 +2269,35 @@ def resolve_pip(path, request, requirement_files=None, build_requirement_files=N
     else:
         build_requirement_files = _get_absolute_pkg_file_paths(path, build_requirement_files)
 
-    requires = _download_from_requirement_files(request["id"], requirement_files)
-    buildrequires = _download_from_requirement_files(request["id"], build_requirement_files)
-
-    # Mark all build dependencies as Cachito dev dependencies
-    for dependency in buildrequires:
-        dependency["dev"] = True
-
-    # Upload dependencies and prepare return value
-    dependencies = []
     pip_repo_name = get_pypi_hosted_repo_name(request["id"])
     raw_repo_name = get_raw_hosted_repo_name(request["id"])
-    for requirement in requires + buildrequires:
-        dep = _push_downloaded_requirement(requirement, pip_repo_name, raw_repo_name)
-        dependencies.append(dep)
+
+    # Download all the dependencies before uploading any of them. The same file can be listed in
+    # both the requirements and the build requirements, and downloading it again would truncate
+    # it while it is being uploaded.
+    downloaded = []
+    for is_dev, files in ((False, requirement_files), (True, build_requirement_files)):
+        for requirement in _download_from_requirement_files(request["id"], files):
+            # Mark all build dependencies as Cachito dev dependencies
+            if is_dev:
+                requirement["dev"] = True
+            downloaded.append(requirement)
+
+    with ConcurrentJobs() as upload_jobs:
+        pushed = [
+            upload_jobs.submit(
+                f"upload of {requirement['path']} to the request repositories",
+                _push_downloaded_requirement,
+                requirement,
+                pip_repo_name,
+                raw_repo_name,
+            )
+            for requirement in downloaded
+        ]
 
     return {
         "package": {"name": pkg_name, "version": pkg_version, "type": "pip"},
-        "dependencies": dependencies,
+        "dependencies": [job.result() for job in pushed],
         "requirements": [*requirement_files, *build_requirement_files],
     }
 
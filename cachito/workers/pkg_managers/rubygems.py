@@ -1,4 +1,5 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
+import itertools
 import logging
 import os
 import random
@@ -18,9 +19,11 @@ from cachito.workers import get_worker_config, nexus
 from cachito.workers.errors import NexusScriptError, UploadError
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.pkg_managers.general import (
+    ConcurrentJobs,
     download_binary_file,
     download_raw_component,
     extract_git_info,
+    link_or_copy,
     upload_raw_package,
 )
 from cachito.workers.scm import Git
@@ -182,7 +185,7 @@ def finalize_nexus_for_rubygems_request(rubygems_repo_name, username):
     return password
 
 
-def download_dependencies(request_id, dependencies, package_root):
+def download_dependencies(request_id, dependencies, package_root, upload_jobs=None):
     """
     Download all dependencies from Gemfile.lock with its sources.
 
@@ -190,13 +193,23 @@ def download_dependencies(request_id, dependencies, package_root):
     present. Dependencies from rubygems.org get cached automatically just by being downloaded
     from the right URL, see _download_rubygems_package().
 
+    Up to ``cachito_download_concurrency`` dependencies are downloaded at the same time. The
+    uploads run in the background while the remaining dependencies are downloaded. If any download
+    fails, the error of the first failed dependency (in the order of the list) is raised.
+
     :param int request_id: ID of the request these dependencies are being downloaded for
     :param list[GemMetadata] dependencies: List of dependencies
     :param package_root: path to the root of the processed package
+    :param ConcurrentJobs upload_jobs: the thread pool to schedule the uploads on. If not
+        provided, a new one is created and all the uploads are finished before returning.
     :return: Info about downloaded packages; all items will contain "kind" and "path" keys
         (and more based on kind, see _download_*_package functions for more details)
     :rtype: list[dict]
     """
+    if upload_jobs is None:
+        with ConcurrentJobs() as upload_jobs:
+            return download_dependencies(request_id, dependencies, package_root, upload_jobs)
+
     bundle_dir = RequestBundleDir(request_id)
     bundle_dir.rubygems_deps_dir.mkdir(parents=True, exist_ok=True)
 
@@ -207,9 +220,28 @@ def download_dependencies(request_id, dependencies, package_root):
     nexus_username, nexus_password = nexus.get_nexus_hoster_credentials()
     nexus_auth = requests.auth.HTTPBasicAuth(nexus_username, nexus_password)
 
-    downloads = []
-
-    for dep in dependencies:
+    if any(dep.type == "GIT" for dep in dependencies):
+        # Find the raw components that are already in Nexus with one listing, not a search each
+        nexus.raw_component_cache.fill(rubygems_raw_repo_name)
+
+    # GIT gems from the same repository and revision share the same archive, which is downloaded
+    # and uploaded only once. Otherwise, concurrent downloads would write the same file and the
+    # second upload of the same raw component would fail.
+    keys = [
+        ("GIT", dep.source, dep.version) if dep.type == "GIT" else i
+        for i, dep in enumerate(dependencies)
+    ]
+    unique_deps = {}
+    for key, dep in zip(keys, dependencies):
+        unique_deps.setdefault(key, dep)
+
+    # Shared by the download threads, next() on itertools.count is atomic
+    progress = itertools.count(1)
+    # PATH dependencies are part of the source, so they are not downloaded
+    downloads_count = sum(1 for dep in unique_deps.values() if dep.type != "PATH")
+
+    def download(dep):
+        """Download and (if needed) upload a single dependency."""
         log.info("Downloading %s (%s)", dep.name, dep.version)
 
         if dep.type == "GEM":
@@ -228,10 +260,12 @@ def download_dependencies(request_id, dependencies, package_root):
 
         if dep.type != "PATH":
             log.info(
-                "Successfully downloaded gem %s (%s) to %s",
+                "Successfully downloaded gem %s (%s) to %s (%d/%d)",
                 dep.name,
                 dep.version,
                 download_info["path"].relative_to(bundle_dir),
+                next(progress),
+                downloads_count,
             )
 
         # If the raw component is not in the Nexus hoster instance, upload it there
@@ -243,7 +277,9 @@ def download_dependencies(request_id, dependencies, package_root):
                 download_info["raw_component_name"],
             )
             dest_dir, filename = download_info["raw_component_name"].rsplit("/", 1)
-            upload_raw_package(
+            upload_jobs.submit(
+                f"upload of gem {dep.name} ({dep.version}) to {rubygems_raw_repo_name}",
+                upload_raw_package,
                 rubygems_raw_repo_name,
                 download_info["path"],
                 dest_dir,
@@ -253,9 +289,18 @@ def download_dependencies(request_id, dependencies, package_root):
 
         download_info["kind"] = dep.type
         download_info["type"] = "rubygems"
-        downloads.append(download_info)
+        return download_info
+
+    # The results are collected in the order of the Gemfile.lock, no matter in which order the
+    # downloads finish
+    with ConcurrentJobs(
+        config.cachito_download_concurrency, thread_name_prefix="cachito-rubygems-download"
+    ) as download_jobs:
+        for dep in unique_deps.values():
+            download_jobs.submit(f"download of gem {dep.name} ({dep.version})", download, dep)
 
-    return downloads
+    downloads = dict(zip(unique_deps, download_jobs.wait()))
+    return [{**downloads[key], "name": dep.name} for key, dep in zip(keys, dependencies)]
 
 
 def _download_rubygems_package(gem, deps_dir, proxy_url, proxy_auth):
@@ -311,16 +356,19 @@ def _download_git_package(gem, rubygems_deps_dir, rubygems_raw_repo_name, nexus_
     raw_component_name = f"{git_info['repo']}/{filename}"
 
     # Download raw component if we already have it
-    have_raw_component = download_raw_component(
-        raw_component_name, rubygems_raw_repo_name, download_path, nexus_auth
+    have_raw_component = (
+        download_raw_component(
+            raw_component_name, rubygems_raw_repo_name, download_path, nexus_auth
+        )
+        is not None
     )
 
     if not have_raw_component:
         log.debug("Raw component not found, will fetch from git")
         repo_name = Git(gem.source, gem.version)
         repo_name.fetch_source(gitsubmodule=False)
-        # Copy downloaded archive to expected download path
-        shutil.copy(repo_name.sources_dir.archive_path, download_path)
+        # Link (or copy) the downloaded archive to the expected download path
+        link_or_copy(repo_name.sources_dir.archive_path, download_path)
 
     url = gem.source
     ref = gem.version.lower()
@@ -366,12 +414,18 @@ def resolve_rubygems(package_root, request):
 
     gemlock_path = package_root / GEMFILE_LOCK
     dependencies = parse_gemlock(package_root, gemlock_path)
-    dependencies = download_dependencies(request["id"], dependencies, package_root)
 
     rubygems_repo_name = get_rubygems_hosted_repo_name(request["id"])
-    for dependency in dependencies:
-        if dependency["kind"] == "GEM":
-            _push_downloaded_gem(dependency, rubygems_repo_name)
+    with ConcurrentJobs() as upload_jobs:
+        dependencies = download_dependencies(request["id"], dependencies, package_root, upload_jobs)
+        for dependency in dependencies:
+            if dependency["kind"] == "GEM":
+                upload_jobs.submit(
+                    f"upload of {dependency['path']} to {rubygems_repo_name}",
+                    _push_downloaded_gem,
+                    dependency,
+                    rubygems_repo_name,
+                )
 
     for dep in dependencies:
         if dep["kind"] == "GIT":
@@ -25,12 +25,16 @@ DEFAULT_RETRY_OPTIONS = {
 }
 
 
-def get_requests_session(auth=False, retry_options={}):
+def get_requests_session(
+    auth=False, retry_options={}, pool_maxsize=requests.adapters.DEFAULT_POOLSIZE
+):
     """
     Create a requests session with authentication (when enabled).
 
     :param bool auth: configure authentication on the session
     :param dict retry_options: overwrite options for initialization of Retry instance
+    :param int pool_maxsize: the maximum number of connections kept open to a single host; this
+        should be at least the number of threads sharing the session
     :return: the configured requests session
     :rtype: requests.Session
     """
@@ -45,7 +49,9 @@ def get_requests_session(auth=False, retry_options={}):
             session.cert = config.cachito_auth_cert
 
     retry_options = {**DEFAULT_RETRY_OPTIONS, **retry_options}
-    adapter = requests.adapters.HTTPAdapter(max_retries=Retry(**retry_options))
+    adapter = requests.adapters.HTTPAdapter(
+        max_retries=Retry(**retry_options), pool_maxsize=pool_maxsize
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
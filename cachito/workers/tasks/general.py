@@ -3,13 +3,15 @@ import logging
 import os
 import shutil
 import tarfile
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Callable, List, Optional
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 
 import requests
 
 from cachito.common.checksum import hash_file
-from cachito.common.packages_data import PackagesData
+from cachito.common.packages_data import merge_packages_data_files
 from cachito.errors import (
     CachitoError,
     ClientError,
@@ -21,20 +23,22 @@ from cachito.errors import (
     SubprocessCallError,
     ValidationError,
 )
+from cachito.workers.config import get_worker_config
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.scm import Git
 from cachito.workers.tasks.celery import app
 from cachito.workers.tasks.utils import (
     get_request,
-    get_request_packages_and_dependencies,
     runs_if_request_in_progress,
     set_packages_and_deps_counts,
     set_request_state,
+    verify_request_packages_data,
 )
 
 __all__ = [
     "aggregate_packages_data",
     "create_bundle_archive",
+    "create_bundle_component_archives",
     "failed_request_callback",
     "fetch_app_source",
     "finalize_request",
@@ -165,33 +169,107 @@ def create_bundle_archive(request_id: int, flags: List[str]) -> None:
         tar_filter = None
 
     with tarfile.open(bundle_dir.bundle_archive_file, mode="w:gz") as bundle_archive:
-        # Add the source to the bundle. This is done one file/directory at a time in the parent
-        # directory in order to exclude the app/.git folder.
-        for item in bundle_dir.source_dir.iterdir():
-            arc_name = os.path.join("app", item.name)
-            bundle_archive.add(str(item), arc_name, filter=tar_filter)
+        _add_app_source_to_archive(bundle_archive, bundle_dir, tar_filter)
         # Add the dependencies to the bundle
         bundle_archive.add(str(bundle_dir.deps_dir), "deps")
 
+    if get_worker_config().cachito_bundle_component_archives:
+        create_bundle_component_archives(bundle_dir, tar_filter)
 
-def aggregate_packages_data(request_id: int, pkg_managers: List[str]) -> PackagesData:
+
+def _add_app_source_to_archive(
+    archive: tarfile.TarFile,
+    bundle_dir: RequestBundleDir,
+    tar_filter: Optional[Callable[[Any], Any]],
+) -> None:
+    # Add the source to the archive. This is done one file/directory at a time in the parent
+    # directory in order to exclude the app/.git folder.
+    for item in bundle_dir.source_dir.iterdir():
+        arc_name = os.path.join("app", item.name)
+        archive.add(str(item), arc_name, filter=tar_filter)
+
+
+def create_bundle_component_archives(
+    bundle_dir: RequestBundleDir, tar_filter: Optional[Callable[[Any], Any]] = None
+) -> None:
+    """
+    Create an archive for each component of the bundle so that it can be downloaded separately.
+
+    The components are the application source, ``app``, and the dependencies of each package
+    manager, such as ``deps/npm``. The members of the component archives have the same paths as
+    in the bundle archive.
+
+    The archives may be downloaded while they are created, so each archive is written to a
+    temporary file which then replaces the archive.
+
+    :param RequestBundleDir bundle_dir: the bundle directory of the request
+    :param callable tar_filter: the filter to apply to the application source members
+    """
+    components_dir = bundle_dir.bundle_components_dir
+    components_dir.joinpath("deps").mkdir(parents=True, exist_ok=True)
+
+    log.info("Creating the bundle component archives in %s", components_dir)
+
+    app_archive_file = bundle_dir.component_archive_file("app")
+    with _replace_on_success(app_archive_file) as tmp_path:
+        with tarfile.open(tmp_path, mode="w:gz") as app_archive:
+            _add_app_source_to_archive(app_archive, bundle_dir, tar_filter)
+
+    archive_files = {app_archive_file}
+    for deps_dir in sorted(bundle_dir.deps_dir.iterdir()):
+        if not deps_dir.is_dir():
+            continue
+        component = f"deps/{deps_dir.name}"
+        archive_file = bundle_dir.component_archive_file(component)
+        with _replace_on_success(archive_file) as tmp_path:
+            with tarfile.open(tmp_path, mode="w:gz") as archive:
+                archive.add(str(deps_dir), component)
+        archive_files.add(archive_file)
+
+    # Remove the archives of the package managers which are no longer used when the bundle is
+    # created again
+    for path in components_dir.joinpath("deps").glob("*.tar.gz"):
+        if path not in archive_files:
+            path.unlink()
+
+
+@contextmanager
+def _replace_on_success(path: Path) -> Iterator[str]:
+    """
+    Get a temporary file which replaces the file at the given path if no exception is raised.
+
+    :param Path path: the path to the file to replace
+    :return: the path to the temporary file, in the same directory
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def aggregate_packages_data(request_id: int, pkg_managers: List[str]) -> Tuple[int, int]:
     """Aggregate packages data generated for each package manager into one unified data file.
 
     :param int request_id: the request id.
+    :param list[str] pkg_managers: the package managers of the request.
+    :return: the number of packages and of unique dependencies in the aggregated data
+    :rtype: tuple[int, int]
     """
     set_request_state(request_id, "in_progress", "Aggregating packages data")
     bundle_dir = RequestBundleDir(request_id)
 
-    aggregated_data = PackagesData()
-    for pkg_manager in pkg_managers:
-        # Ensure git-submodule -> git_submodule
-        data_file = getattr(bundle_dir, f"{pkg_manager.replace('-', '_')}_packages_data")
-        aggregated_data.load(data_file)
+    # Ensure git-submodule -> git_submodule
+    data_files = [
+        getattr(bundle_dir, f"{pkg_manager.replace('-', '_')}_packages_data")
+        for pkg_manager in pkg_managers
+    ]
 
     log.debug("Write request %s packages data into %s", request_id, bundle_dir.packages_data)
-    aggregated_data.write_to_file(str(bundle_dir.packages_data))
-
-    return aggregated_data
+    return merge_packages_data_files(data_files, bundle_dir.packages_data)
 
 
 def save_bundle_archive_checksum(request_id: int) -> None:
@@ -211,34 +289,39 @@ def save_bundle_archive_checksum(request_id: int) -> None:
 @app.task
 @runs_if_request_in_progress
 def process_fetched_sources(request_id):
-    """Generate files for request and updates the request with packages/dependencies counts."""
+    """
+    Generate files for request and updates the request with packages/dependencies counts.
+
+    :return: the packages and dependencies counts, and the checksum of the packages file
+    :rtype: tuple[int, int, str]
+    """
     request = get_request(request_id)
     create_bundle_archive(request_id, request.get("flags", []))
     save_bundle_archive_checksum(request_id)
-    data = aggregate_packages_data(request_id, request["pkg_managers"])
-
-    packages_count = len(data.packages)
-    dependencies_count = len(data.all_dependencies)
+    packages_count, dependencies_count = aggregate_packages_data(
+        request_id, request["pkg_managers"]
+    )
+    packages_data_checksum = hash_file(RequestBundleDir(request_id).packages_data).hexdigest()
 
     set_packages_and_deps_counts(request_id, packages_count, dependencies_count)
 
-    return packages_count, dependencies_count
+    return packages_count, dependencies_count, packages_data_checksum
 
 
 def _check_packages_data_on_api(
-    request_id: int, packages_count: int, dependencies_count: int
+    request_id: int, packages_count: int, dependencies_count: int, packages_data_checksum: str
 ) -> None:
-    request = get_request_packages_and_dependencies(request_id)
-    actual_packages_count = len(request.get("packages", []))
-    actual_dependencies_count = len(request.get("dependencies", []))
+    result = verify_request_packages_data(
+        request_id, packages_data_checksum, packages_count, dependencies_count
+    )
 
     log.info(
         f"Checking the packages file contents for request {request_id}. "
-        f"Expected {packages_count} packages, got {actual_packages_count}. "
-        f"Expected {dependencies_count} dependencies, got {actual_dependencies_count}."
+        f"Expected {packages_count} packages, {dependencies_count} dependencies and the checksum "
+        f"{packages_data_checksum}. Errors: {'; '.join(result['errors']) or 'none'}."
     )
 
-    if actual_packages_count == packages_count and actual_dependencies_count == dependencies_count:
+    if result["verified"]:
         return
 
     raise InvalidRequestData(f"Error checking packages data for request {request_id}.")
@@ -250,6 +333,13 @@ def finalize_request(counts, request_id):
     """Check if the packages file can be read by the API and set the request state to complete."""
     packages_count = counts[0]
     dependencies_count = counts[1]
+    if len(counts) > 2:
+        packages_data_checksum = counts[2]
+    else:
+        # The counts come from a worker which didn't send the checksum yet
+        packages_data_checksum = hash_file(RequestBundleDir(request_id).packages_data).hexdigest()
 
-    _check_packages_data_on_api(request_id, packages_count, dependencies_count)
+    _check_packages_data_on_api(
+        request_id, packages_count, dependencies_count, packages_data_checksum
+    )
     set_request_state(request_id, "complete", "Completed successfully")
@@ -7,10 +7,14 @@ from cachito.errors import FileAccessError, GoModError, UnsupportedFeature
 from cachito.workers import run_cmd
 from cachito.workers.config import get_worker_config
 from cachito.workers.paths import RequestBundleDir
-from cachito.workers.pkg_managers.general import update_request_env_vars
 from cachito.workers.pkg_managers.gomod import path_to_subpackage, resolve_gomod
 from cachito.workers.tasks.celery import app
-from cachito.workers.tasks.utils import get_request, runs_if_request_in_progress, set_request_state
+from cachito.workers.tasks.utils import (
+    get_request,
+    runs_if_request_in_progress,
+    set_request_state,
+    update_request_env_vars,
+)
 
 __all__ = ["fetch_gomod_source"]
 log = logging.getLogger(__name__)
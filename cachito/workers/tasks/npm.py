@@ -9,10 +9,6 @@ from cachito.errors import FileAccessError, InvalidRepoStructure, ValidationErro
 from cachito.workers import nexus, run_cmd
 from cachito.workers.config import get_worker_config, validate_npm_config
 from cachito.workers.paths import RequestBundleDir
-from cachito.workers.pkg_managers.general import (
-    update_request_env_vars,
-    update_request_with_config_files,
-)
 from cachito.workers.pkg_managers.general_js import (
     finalize_nexus_for_js_request,
     generate_npmrc_content,
@@ -30,6 +26,8 @@ from cachito.workers.tasks.utils import (
     make_base64_config_file,
     runs_if_request_in_progress,
     set_request_state,
+    update_request_env_vars,
+    update_request_with_config_files,
 )
 
 __all__ = ["cleanup_npm_request", "fetch_npm_source"]
@@ -8,10 +8,6 @@ from cachito.errors import NexusError
 from cachito.workers import nexus, run_cmd
 from cachito.workers.config import get_worker_config, validate_pip_config
 from cachito.workers.paths import RequestBundleDir
-from cachito.workers.pkg_managers.general import (
-    update_request_env_vars,
-    update_request_with_config_files,
-)
 from cachito.workers.pkg_managers.pip import (
     PipRequirementsFile,
     finalize_nexus_for_pip_request,
@@ -30,6 +26,8 @@ from cachito.workers.tasks.utils import (
     make_base64_config_file,
     runs_if_request_in_progress,
     set_request_state,
+    update_request_env_vars,
+    update_request_with_config_files,
 )
 
 log = logging.getLogger(__name__)
@@ -10,7 +10,6 @@ from cachito.errors import CachitoError
 from cachito.workers import nexus
 from cachito.workers.config import validate_rubygems_config
 from cachito.workers.paths import RequestBundleDir
-from cachito.workers.pkg_managers.general import update_request_with_config_files
 from cachito.workers.pkg_managers.rubygems import (
     finalize_nexus_for_rubygems_request,
     get_rubygems_hosted_repo_name,
@@ -25,6 +24,7 @@ from cachito.workers.tasks.utils import (
     make_base64_config_file,
     runs_if_request_in_progress,
     set_request_state,
+    update_request_with_config_files,
 )
 
 __all__ = ["cleanup_rubygems_request", "fetch_rubygems_source"]
@@ -1,29 +1,40 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import base64
+import copy
 import functools
 import logging
 from pathlib import Path
-from typing import Callable, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import requests
 
 from cachito.errors import NetworkError, ValidationError
 from cachito.workers.celery_logging import get_function_arg_value
 from cachito.workers.config import get_worker_config
+from cachito.workers.pkg_managers import general
 from cachito.workers.requests import requests_auth_session, requests_session
 
 __all__ = [
     "make_base64_config_file",
     "AssertPackageFiles",
     "runs_if_request_in_progress",
+    "flush_request_updates",
     "get_request",
     "get_request_state",
     "set_packages_and_deps_counts",
     "set_request_state",
+    "update_request_env_vars",
+    "update_request_with_config_files",
+    "verify_request_packages_data",
 ]
 
 log = logging.getLogger(__name__)
 
+# The requests fetched by get_request while a task runs, see runs_if_request_in_progress
+_request_snapshots: Optional[Dict[int, dict]] = None
+# The updates of requests held back while a task runs, see _queue_request_update
+_pending_updates: Optional[Dict[int, Dict[str, Any]]] = None
+
 
 def make_base64_config_file(content: str, dest_relpath: Union[str, Path]) -> dict:
     """
@@ -122,6 +133,10 @@ def runs_if_request_in_progress(task_fn):
 
     If request state is not "in_progress", the task will log an error and exit.
 
+    While the task runs, ``get_request`` only downloads each request once, see ``get_request``,
+    and the updates of requests which aren't state changes are held back and sent along with the
+    next state change, or when the task finishes, see ``flush_request_updates``.
+
     :param task task_fn: the task to run if its state is in_progress
     """
 
@@ -142,7 +157,27 @@ def runs_if_request_in_progress(task_fn):
             )
             return
 
-        return task_fn(*args, **kwargs)
+        global _request_snapshots, _pending_updates
+        if _request_snapshots is not None:
+            # The task is called by another task, which owns the snapshots and the updates
+            return task_fn(*args, **kwargs)
+
+        _request_snapshots = {}
+        _pending_updates = {}
+        try:
+            result = task_fn(*args, **kwargs)
+            flush_request_updates()
+            return result
+        finally:
+            if _pending_updates:
+                # The request fails along with the task, so the updates don't matter anymore
+                log.warning(
+                    "Discarding the updates of requests %s since %s failed",
+                    ", ".join(str(pending_id) for pending_id in _pending_updates),
+                    task_fn.__name__,
+                )
+            _request_snapshots = None
+            _pending_updates = None
 
     return task_with_state_check
 
@@ -151,16 +186,27 @@ def get_request(request_id: int) -> dict:
     """
     Download the JSON representation of a request from the Cachito API.
 
+    Within a task decorated with ``runs_if_request_in_progress``, the request is only downloaded
+    the first time and a copy of that snapshot is returned afterwards. The fields which change
+    while the request is processed, such as the state, are therefore not refreshed; use
+    ``get_request_state`` for the current state.
+
     :param request_id: the Cachito request ID this is for
     :return: JSON representation of the request
     :raises NetworkError: if the connection fails or the API returns an error response
     """
+    if _request_snapshots is not None and request_id in _request_snapshots:
+        log.debug("Using the snapshot of request %d", request_id)
+        return copy.deepcopy(_request_snapshots[request_id])
+
     log.debug("Getting request %d", request_id)
     request = _get_request_or_fail(
         request_id,
         connect_error_msg=f"The connection failed while getting request {request_id}: {{exc}}",
         status_error_msg=f"Failed to get request {request_id}: {{exc}}",
     )
+    if _request_snapshots is not None:
+        _request_snapshots[request_id] = copy.deepcopy(request)
     return request
 
 
@@ -168,6 +214,9 @@ def get_request_state(request_id):
     """
     Get the state of the request.
 
+    The lightweight state endpoint of the API is used, so the packages of the request aren't
+    loaded.
+
     :param int request_id: the Cachito request ID this is for
     """
     log.debug("Getting the state of request %d", request_id)
@@ -177,33 +226,61 @@ def get_request_state(request_id):
             f"The connection failed while getting the state of request {request_id}: {{exc}}"
         ),
         status_error_msg=f"Failed to get the state of request {request_id}: {{exc}}",
+        endpoint="state",
     )
     return request["state"]
 
 
-def get_request_packages_and_dependencies(request_id: int):
+def verify_request_packages_data(
+    request_id: int, checksum: str, packages_count: int, dependencies_count: int
+) -> dict:
     """
-    Get the contents of the packages file from the Cachito API.
+    Verify the packages file of the request using the Cachito API.
 
     :param request_id: the Cachito request ID this is for
+    :param checksum: the expected hex encoded SHA-256 digest of the packages file
+    :param packages_count: the expected number of packages of the request
+    :param dependencies_count: the expected number of dependencies of the request
+    :return: the result of the verification, with the ``verified`` and ``errors`` keys
     :raises NetworkError: if the connection fails or the API returns an error response
     """
-    log.info("Getting packages file for request %d", request_id)
-    request = _get_request_or_fail(
-        request_id,
-        connect_error_msg=(
-            f"The connection failed while loading packages file for request {request_id}: {{exc}}"
-        ),
-        status_error_msg=f"Packages file could not be loaded for request {request_id}: {{exc}}",
-        endpoint="packages",
+    log.info("Verifying the packages file of request %d", request_id)
+    config = get_worker_config()
+    request_url = (
+        f'{config.cachito_api_url.rstrip("/")}/requests/{request_id}/packages/verification'
     )
-    return request
+    payload = {
+        "sha256": checksum,
+        "packages_count": packages_count,
+        "dependencies_count": dependencies_count,
+    }
+
+    try:
+        rv = requests_auth_session.post(
+            request_url, json=payload, timeout=config.cachito_api_timeout
+        )
+        rv.raise_for_status()
+    except requests.HTTPError as e:
+        msg = f"Failed to verify the packages file of request {request_id}: {e}"
+        log.exception(msg)
+        raise NetworkError(msg)
+    except requests.RequestException as e:
+        msg = (
+            f"The connection failed while verifying the packages file of request {request_id}: {e}"
+        )
+        log.exception(msg)
+        raise NetworkError(msg)
+
+    return rv.json()
 
 
 def set_request_state(request_id, state, state_reason, error_origin=None, error_type=None):
     """
     Set the state of the request using the Cachito API.
 
+    The updates of the request held back by the running task are sent along with the state in
+    a single call.
+
     :param int request_id: the ID of the Cachito request
     :param str state: the state to set the Cachito request to
     :param str state_reason: the state reason to set the Cachito request to
@@ -226,14 +303,19 @@ def set_request_state(request_id, state, state_reason, error_origin=None, error_
                 'Both "error_origin" and "error_type" parameters must be set if request failed'
             )
 
-    _patch_request_or_fail(
-        request_id,
-        payload,
-        connect_error_msg=(
-            f'The connection failed when setting the state to "{state}" on request {request_id}'
-        ),
-        status_error_msg=f'Setting the state to "{state}" on request {request_id} failed',
+    connect_error_msg = (
+        f'The connection failed when setting the state to "{state}" on request {request_id}'
     )
+    status_error_msg = f'Setting the state to "{state}" on request {request_id} failed'
+
+    pending_update = _pending_updates.pop(request_id, None) if _pending_updates else None
+    if pending_update:
+        # The state change marks the end of a stage, send the held back updates with it
+        _post_request_updates_or_fail(
+            request_id, [pending_update, payload], connect_error_msg, status_error_msg
+        )
+    else:
+        _patch_request_or_fail(request_id, payload, connect_error_msg, status_error_msg)
 
 
 def set_packages_and_deps_counts(request_id: int, packages_count: int, dependencies_count: int):
@@ -251,9 +333,13 @@ def set_packages_and_deps_counts(request_id: int, packages_count: int, dependenc
         dependencies_count,
         request_id,
     )
+    payload = {"packages_count": packages_count, "dependencies_count": dependencies_count}
+    if _queue_request_update(request_id, payload):
+        return
+
     _patch_request_or_fail(
         request_id,
-        {"packages_count": packages_count, "dependencies_count": dependencies_count},
+        payload,
         connect_error_msg=(
             f"The connection failed when setting packages and deps counts on request {request_id}"
         ),
@@ -261,6 +347,85 @@ def set_packages_and_deps_counts(request_id: int, packages_count: int, dependenc
     )
 
 
+def update_request_env_vars(request_id: int, env_vars: Dict[str, Dict[str, str]]) -> None:
+    """
+    Update the environment variables of a request.
+
+    Within a task decorated with ``runs_if_request_in_progress``, the update is held back until
+    the next state change or the end of the task. Otherwise, this is the same as
+    ``cachito.workers.pkg_managers.general.update_request_env_vars``.
+
+    :param int request_id: the id of a request to update the environment variables.
+    :param dict env_vars: mapping of environment variables to record, e.g.
+        {"NAME": {"value": "VALUE", "kind": "KIND"}}.
+    :raise NetworkError: if connection fails
+    :raise InvalidRequestData: if the request to the Cachito API fails
+    """
+    if not _queue_request_update(request_id, {"environment_variables": env_vars}):
+        general.update_request_env_vars(request_id, env_vars)
+
+
+def update_request_with_config_files(request_id: int, config_files: List[dict]) -> None:
+    """
+    Add configuration files to a request.
+
+    Within a task decorated with ``runs_if_request_in_progress``, the update is held back until
+    the next state change or the end of the task. Otherwise, this is the same as
+    ``cachito.workers.pkg_managers.general.update_request_with_config_files``.
+
+    :param int request_id: the ID of the request to add the configuration files to
+    :param list config_files: the list of configuration files to add to the request
+    :raise NetworkError: if connection fails
+    :raise InvalidRequestData: if the request to the Cachito API fails
+    """
+    if not _queue_request_update(request_id, {"configuration_files": config_files}):
+        general.update_request_with_config_files(request_id, config_files)
+
+
+def _queue_request_update(request_id: int, update: Dict[str, Any]) -> bool:
+    """
+    Hold back an update of a request if a task decorated with ``runs_if_request_in_progress`` runs.
+
+    The held back updates of a request are merged into a single update: environment variables
+    and configuration files are accumulated, and later values of other keys win.
+
+    :param request_id: the ID of the request to update
+    :param update: the update, see the ``/requests/<id>/updates`` API endpoint
+    :return: ``True`` if the update was held back, ``False`` if it must be sent right away
+    """
+    if _pending_updates is None:
+        return False
+
+    pending_update = _pending_updates.setdefault(request_id, {})
+    for key, value in update.items():
+        if key == "environment_variables":
+            pending_update.setdefault(key, {}).update(value)
+        elif key == "configuration_files":
+            pending_update.setdefault(key, []).extend(value)
+        else:
+            pending_update[key] = value
+    return True
+
+
+def flush_request_updates() -> None:
+    """
+    Send the updates of requests held back by the running task to the Cachito API.
+
+    Each request is updated with a single call, and its updates are applied atomically.
+
+    :raise NetworkError: if the request to the Cachito API fails
+    """
+    while _pending_updates:
+        request_id, pending_update = _pending_updates.popitem()
+        log.info("Sending the held back updates of request %d", request_id)
+        _post_request_updates_or_fail(
+            request_id,
+            [pending_update],
+            connect_error_msg=f"The connection failed when updating request {request_id}",
+            status_error_msg=f"Updating request {request_id} failed",
+        )
+
+
 def _get_request_or_fail(
     request_id: int, connect_error_msg: str, status_error_msg: str, endpoint: str = None
 ) -> dict:
@@ -327,3 +492,36 @@ def _patch_request_or_fail(
         msg = connect_error_msg.format(exc=e)
         log.exception(msg)
         raise NetworkError(msg)
+
+
+def _post_request_updates_or_fail(
+    request_id: int, updates: List[dict], connect_error_msg: str, status_error_msg: str
+) -> None:
+    """
+    Try to apply several updates to the specified request using the Cachito API.
+
+    Both error messages can contain the {exc} placeholder which will be replaced by the actual
+    exception.
+
+    :param request_id: ID of the request to update
+    :param updates: the updates to apply in order, see the ``/requests/<id>/updates`` endpoint
+    :param connect_error_msg: error message to raise if the connection fails
+    :param status_error_msg: error message to raise if the response status is 4xx or 5xx
+    :raises NetworkError: if the connection fails or the API returns an error response
+    """
+    config = get_worker_config()
+    request_url = f'{config.cachito_api_url.rstrip("/")}/requests/{request_id}/updates'
+
+    try:
+        rv = requests_auth_session.post(
+            request_url, json=updates, timeout=config.cachito_api_timeout
+        )
+        rv.raise_for_status()
+    except requests.HTTPError as e:
+        msg = status_error_msg.format(exc=e)
+        log.exception(msg)
+        raise NetworkError(msg)
+    except requests.RequestException as e:
+        msg = connect_error_msg.format(exc=e)
+        log.exception(msg)
+        raise NetworkError(msg)
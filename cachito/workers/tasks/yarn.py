@@ -11,10 +11,6 @@ from cachito.errors import InvalidRepoStructure, InvalidRequestData, NexusError,
 from cachito.workers import nexus, run_cmd
 from cachito.workers.config import get_worker_config, validate_yarn_config
 from cachito.workers.paths import RequestBundleDir
-from cachito.workers.pkg_managers.general import (
-    update_request_env_vars,
-    update_request_with_config_files,
-)
 from cachito.workers.pkg_managers.general_js import (
     finalize_nexus_for_js_request,
     prepare_nexus_for_js_request,
@@ -33,6 +29,8 @@ from cachito.workers.tasks.utils import (
     make_base64_config_file,
     runs_if_request_in_progress,
     set_request_state,
+    update_request_env_vars,
+    update_request_with_config_files,
 )
 
 __all__ = ["cleanup_yarn_request", "fetch_yarn_source"]
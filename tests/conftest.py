@@ -12,6 +12,26 @@ from prometheus_client import REGISTRY
 from cachito.web import db as _db
 from cachito.web.app import create_app
 from cachito.web.config import TEST_DB_FILE
+from cachito.web.models import Request
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-slow", action="store_true", help="Run the slow tests, such as the benchmarks"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: the test is only run with the --run-slow option")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="the slow tests are only run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
 
 
 @pytest.fixture()
@@ -33,6 +53,11 @@ def app_no_auth(request):
 def _make_app(request, config):
     """Create an application for the given config name."""
     app = create_app(config)
+    # Use a bundles directory per test so that files stored by the API, such as content
+    # manifests, don't leak between tests
+    bundles_dir = request.getfixturevalue("tmp_path") / "bundles"
+    bundles_dir.mkdir(exist_ok=True)
+    app.config["CACHITO_BUNDLES_DIR"] = str(bundles_dir)
     # Establish an application context before running the tests. This allows the use of
     # Flask-SQLAlchemy in the test setup.
     ctx = app.app_context()
@@ -89,6 +114,27 @@ def db(app, tmpdir):
     return _db
 
 
+@pytest.fixture()
+def create_request(app, db, auth_env):
+    """Return a function which adds a request with the given states to the DB."""
+
+    def _create_request(*state_names, pkg_managers=("npm",)):
+        data = {
+            "repo": "https://localhost.git/dummy.git",
+            "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+            "pkg_managers": list(pkg_managers),
+        }
+        with app.test_request_context(environ_base=auth_env):
+            request = Request.from_json(data)
+        for i, state_name in enumerate(state_names):
+            request.add_state(state_name, f"State {i}")
+        db.session.add(request)
+        db.session.commit()
+        return request
+
+    return _create_request
+
+
 @pytest.fixture()
 def sample_deps():
     return [
@@ -3,6 +3,8 @@ import os
 from pathlib import Path
 from typing import Union
 
+from cachito.common.packages_data import PackagesData
+
 
 def assert_directories_equal(dir_a, dir_b):
     """
@@ -57,3 +59,15 @@ def write_file_tree(tree_def: dict, rooted_at: Union[str, Path], exist_ok: bool
         else:
             entry_path.mkdir(exist_ok=exist_ok)
             write_file_tree(value, entry_path)
+
+
+def load_packages_data(file_name: Union[str, Path]) -> dict:
+    """
+    Load a packages data file and return its content with the dependencies expanded.
+
+    :param file_name: path to the packages data file
+    :return: a dict with the "packages" key as in version 1 of the file format
+    """
+    packages_data = PackagesData()
+    packages_data.load(file_name)
+    return {"packages": packages_data.packages}
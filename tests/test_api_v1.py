@@ -1,7 +1,11 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import copy
+import hashlib
+import io
 import json
+import os
 import re
+import tarfile
 import urllib.parse
 from datetime import datetime, timedelta
 from http import HTTPStatus
@@ -17,12 +21,14 @@ import pytest
 from cachito.common.checksum import hash_file
 from cachito.common.packages_data import PackagesData
 from cachito.common.paths import RequestBundleDir
+from cachito.common.utils import b64encode
 from cachito.errors import NoWorkers, RequestErrorOrigin, ValidationError
 from cachito.web.content_manifest import BASE_ICM, Package
 from cachito.web.models import (
     ConfigFileBase64,
     EnvironmentVariable,
     Flag,
+    IndexedDependency,
     Request,
     RequestError,
     RequestStateMapping,
@@ -1154,6 +1160,40 @@ def test_missing_request(client, db):
     rv = client.get("/api/v1/requests/1/download")
     assert rv.status_code == 404
 
+    rv = client.get("/api/v1/requests/1/state")
+    assert rv.status_code == 404
+
+
+def test_get_request_state(app, client, db, worker_auth_env):
+    data = {
+        "repo": "https://github.com/namespace/project.git",
+        "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+    }
+    # flask_login.current_user is used in Request.from_json, which requires a request context
+    with app.test_request_context(environ_base=worker_auth_env):
+        request = Request.from_json(data)
+    db.session.add(request)
+    db.session.commit()
+
+    rv = client.get(f"/api/v1/requests/{request.id}/state")
+    assert rv.status_code == 200
+    assert rv.json == {
+        "id": request.id,
+        "state": "in_progress",
+        "state_reason": "The request was initiated",
+        "updated": request.state.updated.isoformat(),
+    }
+
+    request.add_state("complete", "Completed successfully")
+    db.session.commit()
+
+    # The packages file isn't needed for the state
+    with mock.patch("cachito.web.models.Request.to_json") as mock_to_json:
+        rv = client.get(f"/api/v1/requests/{request.id}/state")
+    mock_to_json.assert_not_called()
+    assert rv.json["state"] == "complete"
+    assert rv.json["state_reason"] == "Completed successfully"
+
 
 def test_malformed_request_id(client, db):
     rv = client.get("/api/v1/requests/spam")
@@ -1250,6 +1290,72 @@ def test_create_request_using_disabled_pkg_manager(app, auth_env, client, db):
     assert rv.json == {"error": "The following package managers are not enabled: npm"}
 
 
+@pytest.mark.parametrize(
+    "path",
+    ["", "/configuration-files", "/content-manifest", "/environment-variables"],
+)
+@mock.patch("cachito.web.models.Request._get_packages_data")
+def test_get_request_resource_not_modified(mock_get_packages_data, path, app, client, db, auth_env):
+    mock_get_packages_data.return_value = PackagesData()
+    request = create_request_in_db(app, db, auth_env, RequestStateMapping.in_progress)
+    url = f"/api/v1/requests/{request.id}{path}"
+
+    if path != "/content-manifest":
+        rv = client.get(url)
+        assert rv.status_code == 200
+        assert "ETag" not in rv.headers
+        assert "Cache-Control" not in rv.headers
+
+    request.add_state(RequestStateMapping.complete.name, "Completed successfully")
+    db.session.commit()
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert rv.headers["Cache-Control"] == "no-cache"
+    complete_etag = rv.headers["ETag"]
+
+    rv = client.get(url, headers={"If-None-Match": complete_etag})
+    assert rv.status_code == 304
+    assert rv.headers["ETag"] == complete_etag
+
+    request.add_state(RequestStateMapping.stale.name, "The request has expired")
+    db.session.commit()
+
+    rv = client.get(url, headers={"If-None-Match": complete_etag})
+    assert rv.status_code == 200
+    if path == "":
+        # The state history of the request changes when it's compacted
+        assert rv.headers["Cache-Control"] == "no-cache"
+    else:
+        assert rv.headers["Cache-Control"] == "max-age=31536000, immutable"
+    assert rv.headers["ETag"] != complete_etag
+
+    rv = client.get(url, headers={"If-None-Match": rv.headers["ETag"]})
+    assert rv.status_code == 304
+
+
+def test_get_request_compacted_states_modified(app, client, db, auth_env):
+    request = create_request_in_db(app, db, auth_env, RequestStateMapping.in_progress)
+    for state_name in ("in_progress", "complete"):
+        request.add_state(state_name, state_name)
+        db.session.commit()
+    request.add_state(RequestStateMapping.stale.name, "The request has expired")
+    db.session.commit()
+    url = f"/api/v1/requests/{request.id}"
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    stale_etag = rv.headers["ETag"]
+
+    request.compact_states()
+    db.session.commit()
+
+    rv = client.get(url, headers={"If-None-Match": stale_etag})
+    assert rv.status_code == 200
+    assert rv.headers["ETag"] != stale_etag
+    assert len(rv.json["state_history"]) == 4
+
+
 def test_download_archive(app, client, db, tmpdir):
     request = Request(repo="https://git.host/ns/tool.git", ref="1234")
     request.add_state(RequestStateMapping.complete.name, "For testing download.")
@@ -1271,6 +1377,253 @@ def test_download_archive(app, client, db, tmpdir):
     assert "sha-256=A6xnQhbz4Vx2HuGl4lXwZ5U2I8iziLRFnhP5eNfIRvQ=" == resp.headers["Digest"]
 
 
+def test_download_archive_not_modified(app, client, db, tmpdir):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    app.config["CACHITO_BUNDLES_DIR"] = str(tmpdir)
+
+    bundle_dir = RequestBundleDir(request.id, str(tmpdir))
+    bundle_dir.bundle_archive_file.write_bytes(b"1234")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+
+    resp = client.get(f"/api/v1/requests/{request.id}/download")
+    assert resp.status_code == 200
+    assert resp.headers["Cache-Control"] == "no-cache"
+    etag = resp.headers["ETag"]
+
+    # The bundle archive isn't verified again if the client already has it
+    with mock.patch("cachito.web.api_v1.get_file_sha256") as mock_get_file_sha256:
+        resp = client.get(
+            f"/api/v1/requests/{request.id}/download", headers={"If-None-Match": etag}
+        )
+    assert resp.status_code == 304
+    assert resp.data == b""
+    mock_get_file_sha256.assert_not_called()
+
+    # The ETag changes with the bundle archive
+    bundle_dir.bundle_archive_file.write_bytes(b"5678")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+    resp = client.get(f"/api/v1/requests/{request.id}/download", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.data == b"5678"
+
+
+def test_download_archive_range(app, client, db):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    bundle_dir = RequestBundleDir(request.id, app.config["CACHITO_BUNDLES_DIR"])
+    bundle_dir.bundle_archive_file.write_bytes(b"0123456789")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+
+    resp = client.get(f"/api/v1/requests/{request.id}/download", headers={"Range": "bytes=4-"})
+    assert resp.status_code == 206
+    assert resp.data == b"456789"
+    assert resp.headers["Content-Range"] == "bytes 4-9/10"
+    assert resp.headers["Digest"] == f"sha-256={b64encode(hasher.digest())}"
+
+    # The range is only honored if the archive didn't change since the ETag was received
+    etag = resp.headers["ETag"]
+    resp = client.get(
+        f"/api/v1/requests/{request.id}/download",
+        headers={"Range": "bytes=4-", "If-Range": etag},
+    )
+    assert resp.status_code == 206
+    resp = client.get(
+        f"/api/v1/requests/{request.id}/download",
+        headers={"Range": "bytes=4-", "If-Range": '"some-other-etag"'},
+    )
+    assert resp.status_code == 200
+    assert resp.data == b"0123456789"
+
+
+@pytest.mark.parametrize(
+    "offload, location, expected_headers",
+    [
+        (
+            "x-accel-redirect",
+            "/cachito-bundles/",
+            {"X-Accel-Redirect": "/cachito-bundles/1.tar.gz"},
+        ),
+        ("x-accel-redirect", "/internal", {"X-Accel-Redirect": "/internal/1.tar.gz"}),
+        ("x-sendfile", None, {"X-Sendfile": "{bundles_dir}/1.tar.gz"}),
+    ],
+)
+def test_download_archive_offload(offload, location, expected_headers, app, client, db):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    bundles_dir = app.config["CACHITO_BUNDLES_DIR"]
+    app.config["CACHITO_BUNDLE_DOWNLOAD_OFFLOAD"] = offload
+    if location:
+        app.config["CACHITO_BUNDLE_DOWNLOAD_OFFLOAD_LOCATION"] = location
+
+    bundle_dir = RequestBundleDir(request.id, bundles_dir)
+    bundle_dir.bundle_archive_file.write_bytes(b"1234")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+
+    resp = client.get(f"/api/v1/requests/{request.id}/download")
+    assert resp.status_code == 200
+    assert resp.data == b""
+    assert resp.mimetype == "application/gzip"
+    assert resp.headers["Content-Disposition"] == "attachment; filename=cachito-1.tar.gz"
+    assert resp.headers["Digest"] == "sha-256=A6xnQhbz4Vx2HuGl4lXwZ5U2I8iziLRFnhP5eNfIRvQ="
+    assert resp.headers["ETag"]
+    for header, value in expected_headers.items():
+        assert resp.headers[header] == value.format(bundles_dir=bundles_dir)
+
+
+def _create_bundle_components(bundle_dir, components):
+    bundle_dir.bundle_components_dir.joinpath("deps").mkdir(parents=True)
+    for component in components:
+        with tarfile.open(bundle_dir.component_archive_file(component), "w:gz") as archive:
+            data = component.encode("utf-8")
+            tar_info = tarfile.TarInfo(f"{component}/file")
+            tar_info.size = len(data)
+            archive.addfile(tar_info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize(
+    "include, expected_components",
+    [
+        ("app", ["app"]),
+        ("deps/npm", ["deps/npm"]),
+        ("deps/npm,app", ["app", "deps/npm"]),
+        (" app , deps ", ["app", "deps/npm", "deps/pip"]),
+        ("deps", ["deps/npm", "deps/pip"]),
+    ],
+)
+def test_download_archive_components(include, expected_components, app, client, db):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    bundle_dir = RequestBundleDir(request.id, app.config["CACHITO_BUNDLES_DIR"])
+    bundle_dir.bundle_archive_file.write_bytes(b"1234")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+    _create_bundle_components(bundle_dir, ["app", "deps/npm", "deps/pip"])
+
+    resp = client.get(f"/api/v1/requests/{request.id}/download", query_string={"include": include})
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/gzip"
+    name = "-".join(expected_components).replace("/", "-")
+    assert resp.headers["Content-Disposition"] == f"attachment; filename=cachito-1-{name}.tar.gz"
+    with tarfile.open(fileobj=io.BytesIO(resp.data), mode="r:gz") as archive:
+        assert archive.getnames() == [f"{component}/file" for component in expected_components]
+        for component in expected_components:
+            assert archive.extractfile(f"{component}/file").read() == component.encode("utf-8")
+
+    if len(expected_components) == 1:
+        checksum = hash_file(bundle_dir.component_archive_file(expected_components[0]))
+        assert resp.headers["Digest"] == f"sha-256={b64encode(checksum.digest())}"
+    else:
+        assert "Digest" not in resp.headers
+
+    # The ETag depends on the components
+    etag = resp.headers["ETag"]
+    full_resp = client.get(f"/api/v1/requests/{request.id}/download")
+    assert full_resp.headers["ETag"] != etag
+    resp = client.get(
+        f"/api/v1/requests/{request.id}/download",
+        query_string={"include": include},
+        headers={"If-None-Match": etag},
+    )
+    assert resp.status_code == 304
+
+
+def test_download_archive_component_range(app, client, db):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    bundle_dir = RequestBundleDir(request.id, app.config["CACHITO_BUNDLES_DIR"])
+    bundle_dir.bundle_archive_file.write_bytes(b"1234")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+    _create_bundle_components(bundle_dir, ["app"])
+    app_archive = bundle_dir.component_archive_file("app").read_bytes()
+
+    url = f"/api/v1/requests/{request.id}/download?include=app"
+    resp = client.get(url, headers={"Range": "bytes=4-"})
+    assert resp.status_code == 206
+    assert resp.data == app_archive[4:]
+
+    resp = client.get(url, headers={"Range": "bytes=4-", "If-Range": resp.headers["ETag"]})
+    assert resp.status_code == 206
+
+
+def test_download_archive_component_offload(app, client, db):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    app.config["CACHITO_BUNDLE_DOWNLOAD_OFFLOAD"] = "x-accel-redirect"
+    bundle_dir = RequestBundleDir(request.id, app.config["CACHITO_BUNDLES_DIR"])
+    bundle_dir.bundle_archive_file.write_bytes(b"1234")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+    _create_bundle_components(bundle_dir, ["app", "deps/npm"])
+
+    resp = client.get(f"/api/v1/requests/{request.id}/download?include=deps/npm")
+    assert resp.status_code == 200
+    assert resp.data == b""
+    assert resp.headers["X-Accel-Redirect"] == "/cachito-bundles/1-components/deps/npm.tar.gz"
+    assert resp.headers["Content-Disposition"] == "attachment; filename=cachito-1-deps-npm.tar.gz"
+
+
+@pytest.mark.parametrize(
+    "components, include, expected_error",
+    [
+        (
+            ["app", "deps/npm"],
+            "app,deps/pip",
+            'The bundle component "deps/pip" is invalid. It must be one of: deps, app, deps/npm',
+        ),
+        (
+            ["app", "deps/npm"],
+            ",",
+            'The "include" parameter must specify at least one bundle component',
+        ),
+        (
+            [],
+            "app",
+            "The bundle components of this request are not available, download the whole bundle",
+        ),
+    ],
+)
+def test_download_archive_components_invalid(components, include, expected_error, app, client, db):
+    request = Request(repo="https://git.host/ns/tool.git", ref="1234")
+    request.add_state(RequestStateMapping.complete.name, "For testing download.")
+    db.session.add(request)
+    db.session.commit()
+
+    bundle_dir = RequestBundleDir(request.id, app.config["CACHITO_BUNDLES_DIR"])
+    bundle_dir.bundle_archive_file.write_bytes(b"1234")
+    hasher = hash_file(bundle_dir.bundle_archive_file)
+    bundle_dir.bundle_archive_checksum.write_text(hasher.hexdigest(), encoding="utf-8")
+    if components:
+        _create_bundle_components(bundle_dir, components)
+
+    resp = client.get(f"/api/v1/requests/{request.id}/download", query_string={"include": include})
+    assert resp.status_code == 400
+    assert resp.json == {"error": expected_error}
+
+
 @mock.patch("cachito.web.api_v1.Request")
 def test_download_archive_no_bundle(mock_request, client, app):
     request = mock.Mock(id=1)
@@ -1357,6 +1710,36 @@ def test_set_state(state, app, client, db, worker_auth_env, tmpdir):
     assert not bundle_dir.exists()
 
 
+@mock.patch("cachito.web.models.Request._get_packages_data")
+def test_set_state_complete_stores_content_manifest(
+    mock_get_packages_data, app, client, db, worker_auth_env
+):
+    data = {
+        "repo": "https://github.com/release-engineering/retrodep.git",
+        "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+        "pkg_managers": ["gomod"],
+    }
+    # flask_login.current_user is used in Request.from_json, which requires a request context
+    with app.test_request_context(environ_base=worker_auth_env):
+        request = Request.from_json(data)
+    db.session.add(request)
+    db.session.commit()
+    mock_get_packages_data.return_value = PackagesData()
+    bundle_dir = RequestBundleDir(1, app.config["CACHITO_BUNDLES_DIR"])
+    _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+
+    payload = {"state": "complete", "state_reason": "Completed successfully"}
+    patch_rv = client.patch("/api/v1/requests/1", json=payload, environ_base=worker_auth_env)
+    assert patch_rv.status_code == 200
+
+    # The packages file is indexed too
+    assert bundle_dir.packages_data_index.exists()
+    content = bundle_dir.content_manifest.read_bytes()
+    metadata = json.loads(bundle_dir.content_manifest_metadata.read_text())
+    assert json.loads(content) == {**BASE_ICM, "image_contents": []}
+    assert metadata == {"icm_version": 1, "sha256": hashlib.sha256(content).hexdigest()}
+
+
 @pytest.mark.parametrize("bundle_exists", (True, False))
 @pytest.mark.parametrize("pkg_managers", (["gomod"], ["npm"], ["gomod", "npm"]))
 @mock.patch("cachito.web.api_v1.tasks.cleanup_npm_request")
@@ -1385,6 +1768,11 @@ def test_set_state_stale(
     bundle_dir.mkdir(parents=True)
     bundle_dir.bundle_archive_file.write_bytes(b"01234")
     bundle_dir.packages_data.write_bytes(b"{}")
+    bundle_dir.content_manifest.write_bytes(b"{}")
+    bundle_dir.content_manifest_metadata.write_bytes(b"{}")
+    bundle_dir.packages_data_index.write_bytes(b"{}")
+    bundle_dir.bundle_components_dir.mkdir()
+    bundle_dir.component_archive_file("app").write_bytes(b"01234")
 
     bundle_dir.bundle_archive_checksum.write_text("1234", encoding="utf-8")
 
@@ -1407,6 +1795,10 @@ def test_set_state_stale(
     assert not bundle_dir.bundle_archive_file.exists()
     assert not bundle_dir.bundle_archive_checksum.exists()
     assert not bundle_dir.packages_data.exists()
+    assert not bundle_dir.content_manifest.exists()
+    assert not bundle_dir.content_manifest_metadata.exists()
+    assert not bundle_dir.packages_data_index.exists()
+    assert not bundle_dir.bundle_components_dir.exists()
 
     if "npm" in pkg_managers:
         mock_cleanup_npm.delay.assert_called_once_with(1)
@@ -1562,6 +1954,188 @@ def test_set_packages_and_deps_count(app, client, db, worker_auth_env):
     assert request.dependencies_count == 100
 
 
+@pytest.mark.parametrize(
+    "payload, packages_file_exists, expected_errors",
+    [
+        ({"sha256": None, "packages_count": 1, "dependencies_count": 2}, True, []),
+        (
+            {"sha256": "abc123", "packages_count": 1, "dependencies_count": 2},
+            True,
+            ["The checksum of the packages file is {checksum}"],
+        ),
+        (
+            {"sha256": None, "packages_count": 2, "dependencies_count": 2},
+            True,
+            ['The "packages_count" of the request is 1'],
+        ),
+        (
+            {"sha256": "abc123", "packages_count": 1, "dependencies_count": 3},
+            False,
+            [
+                "The packages file doesn't exist",
+                'The "dependencies_count" of the request is 2',
+            ],
+        ),
+    ],
+)
+def test_verify_packages_file(
+    payload, packages_file_exists, expected_errors, app, client, db, worker_auth_env
+):
+    data = {
+        "repo": "https://github.com/release-engineering/retrodep.git",
+        "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+    }
+    # flask_login.current_user is used in Request.from_json, which requires a request context
+    with app.test_request_context(environ_base=worker_auth_env):
+        request = Request.from_json(data)
+    request.packages_count = 1
+    request.dependencies_count = 2
+    db.session.add(request)
+    db.session.commit()
+
+    bundle_dir = RequestBundleDir(request.id, app.config["CACHITO_BUNDLES_DIR"])
+    checksum = None
+    if packages_file_exists:
+        bundle_dir.packages_data.write_text('{"packages": []}', encoding="utf-8")
+        checksum = hash_file(bundle_dir.packages_data).hexdigest()
+    if payload["sha256"] is None:
+        payload = {**payload, "sha256": checksum}
+
+    rv = client.post(
+        "/api/v1/requests/1/packages/verification", json=payload, environ_base=worker_auth_env
+    )
+    assert rv.status_code == 200
+    assert rv.json == {
+        "verified": not expected_errors,
+        "errors": [error.format(checksum=checksum) for error in expected_errors],
+    }
+
+
+@pytest.mark.parametrize(
+    "payload, message",
+    [
+        ([], "The input data must be a JSON object"),
+        (
+            {"sha256": "abc123"},
+            "The following keys are missing: dependencies_count, packages_count",
+        ),
+        (
+            {"sha256": "abc123", "packages_count": 1, "dependencies_count": 2, "spam": 1},
+            "The following keys are not allowed: spam",
+        ),
+        (
+            {"sha256": 1, "packages_count": 1, "dependencies_count": 2},
+            'The value for "sha256" must be a string',
+        ),
+        (
+            {"sha256": "abc123", "packages_count": "1", "dependencies_count": 2},
+            'The value for "packages_count" must be an integer',
+        ),
+    ],
+)
+def test_verify_packages_file_invalid(payload, message, client, db, worker_auth_env):
+    rv = client.post(
+        "/api/v1/requests/1/packages/verification", json=payload, environ_base=worker_auth_env
+    )
+    assert rv.status_code == 400
+    assert rv.json == {"error": message}
+
+
+def test_verify_packages_file_not_worker(client, db, auth_env):
+    payload = {"sha256": "abc123", "packages_count": 1, "dependencies_count": 2}
+    rv = client.post(
+        "/api/v1/requests/1/packages/verification", json=payload, environ_base=auth_env
+    )
+    assert rv.status_code == 403
+
+
+def test_batch_update_request(app, client, db, worker_auth_env):
+    data = {
+        "repo": "https://github.com/release-engineering/retrodep.git",
+        "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+    }
+    # flask_login.current_user is used in Request.from_json, which requires a request context
+    with app.test_request_context(environ_base=worker_auth_env):
+        request = Request.from_json(data)
+    db.session.add(request)
+    db.session.commit()
+
+    config_file = {
+        "content": "cmVnaXN0cnk9aHR0cDovL2RvbWFpbi5sb2NhbC9yZXBvLwo=",
+        "path": "app/.npmrc",
+        "type": "base64",
+    }
+    env_var = {"value": "deps/gomod", "kind": "path"}
+    updates = [
+        {
+            "environment_variables": {"GOPATH": env_var},
+            "configuration_files": [config_file],
+            "packages_count": 1,
+            "dependencies_count": 2,
+        },
+        {"state": "in_progress", "state_reason": "Fetching the gomod dependencies"},
+        {"state": "in_progress", "state_reason": "Assembling the bundle archive"},
+    ]
+    rv = client.post("/api/v1/requests/1/updates", json=updates, environ_base=worker_auth_env)
+    assert rv.status_code == 200
+
+    rv = client.get("/api/v1/requests/1?verbose=true")
+    assert rv.json["state_reason"] == "Assembling the bundle archive"
+    assert [state["state_reason"] for state in rv.json["state_history"]] == [
+        "Assembling the bundle archive",
+        "Fetching the gomod dependencies",
+        "The request was initiated",
+    ]
+    assert rv.json["environment_variables"] == {"GOPATH": "deps/gomod"}
+    assert request.packages_count == 1
+    assert request.dependencies_count == 2
+    rv = client.get("/api/v1/requests/1/configuration-files")
+    assert rv.json == [config_file]
+
+
+@pytest.mark.parametrize(
+    "updates, message",
+    (
+        ({"state": "complete"}, "The input data must be a non-empty JSON array of objects"),
+        ([], "The input data must be a non-empty JSON array of objects"),
+        (
+            [{"packages_count": 1}, "complete"],
+            "The input data must be a JSON object",
+        ),
+        (
+            [{"packages_count": 1}, {"state": "complete"}],
+            'The "state_reason" key is required when "state" is supplied',
+        ),
+        (
+            [{"packages_count": 1}, {"configuration_files": {}}],
+            'The value for "configuration_files" must be an array',
+        ),
+    ),
+)
+def test_batch_update_request_invalid(updates, message, app, client, db, worker_auth_env):
+    data = {
+        "repo": "https://github.com/release-engineering/retrodep.git",
+        "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+    }
+    # flask_login.current_user is used in Request.from_json, which requires a request context
+    with app.test_request_context(environ_base=worker_auth_env):
+        request = Request.from_json(data)
+    db.session.add(request)
+    db.session.commit()
+
+    rv = client.post("/api/v1/requests/1/updates", json=updates, environ_base=worker_auth_env)
+    assert rv.status_code == 400
+    assert rv.json == {"error": message}
+    # None of the updates are applied
+    assert request.packages_count is None
+
+
+def test_batch_update_request_not_worker(app, client, db, auth_env):
+    updates = [{"state": "complete", "state_reason": "Completed successfully"}]
+    rv = client.post("/api/v1/requests/1/updates", json=updates, environ_base=auth_env)
+    assert rv.status_code == 403
+
+
 @pytest.mark.parametrize(
     "request_id, payload, status_code, message",
     (
@@ -1814,6 +2388,58 @@ def test_fetch_request_content_manifest_empty(app, client, db, worker_auth_env):
     assert rv.json == expected
 
 
+@mock.patch("cachito.web.models.Request._get_packages_data")
+def test_fetch_request_content_manifest_stored(
+    mock_get_packages_data, app, client, db, worker_auth_env
+):
+    data = {
+        "repo": "https://github.com/namespace/project.git",
+        "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+    }
+    # flask_login.current_user is used in Request.from_json, which requires a request context
+    with app.test_request_context(environ_base=worker_auth_env):
+        request = Request.from_json(data)
+    request.add_state("complete", "Completed successfully")
+    db.session.add(request)
+    db.session.commit()
+    mock_get_packages_data.return_value = PackagesData()
+
+    rv = client.get("/api/v1/requests/1/content-manifest")
+    assert rv.status_code == 200
+    assert rv.json == {**BASE_ICM, "image_contents": []}
+
+    assert rv.headers["Cache-Control"] == "no-cache"
+    etag = rv.headers["ETag"]
+
+    bundle_dir = RequestBundleDir(1, app.config["CACHITO_BUNDLES_DIR"])
+    checksum = hashlib.sha256(bundle_dir.content_manifest.read_bytes()).hexdigest()
+
+    # The stored content manifest is served without generating it again
+    rv = client.get("/api/v1/requests/1/content-manifest")
+    assert rv.status_code == 200
+    assert rv.json == {**BASE_ICM, "image_contents": []}
+    mock_get_packages_data.assert_called_once()
+
+    rv = client.get("/api/v1/requests/1/content-manifest", headers={"If-None-Match": etag})
+    assert rv.status_code == 304
+
+    # A content manifest generated with a different ICM version is regenerated
+    bundle_dir.content_manifest_metadata.write_text(
+        json.dumps({"icm_version": 0, "sha256": checksum})
+    )
+    rv = client.get("/api/v1/requests/1/content-manifest")
+    assert rv.status_code == 200
+    assert mock_get_packages_data.call_count == 2
+    assert json.loads(bundle_dir.content_manifest_metadata.read_text())["icm_version"] == 1
+
+    # A missing content manifest is regenerated
+    bundle_dir.content_manifest.unlink()
+    rv = client.get("/api/v1/requests/1/content-manifest")
+    assert rv.status_code == 200
+    assert rv.json == {**BASE_ICM, "image_contents": []}
+    assert mock_get_packages_data.call_count == 3
+
+
 def test_request_fetch_request_content_manifest_invalid(client, worker_auth_env):
     rv = client.get("/api/v1/requests/2/content-manifest")
 
@@ -1871,10 +2497,9 @@ def test_fetch_request_content_manifest_go(
     deep_sort_icm(expected)
 
     # mock packages.json file contents
-    sample_pkg_lvl_pkg["dependencies"] = sample_pkg_deps
-    sample_package["dependencies"] = sample_deps
     packages_data = PackagesData()
-    packages_data._packages = [sample_pkg_lvl_pkg, sample_package]
+    packages_data.add_package(sample_pkg_lvl_pkg, os.curdir, sample_pkg_deps)
+    packages_data.add_package(sample_package, os.curdir, sample_deps)
     mock_get_packages_data.return_value = packages_data
 
     rv = client.get("/api/v1/requests/1")
@@ -1931,10 +2556,9 @@ def test_fetch_request_content_manifest_npm_or_pip(
         {"dev": False, "name": "dep-dd", "replaces": None, "type": pkg_manager, "version": "4.0.0"},
     ]
 
-    pkgs[0]["dependencies"] = deps[:2]
-    pkgs[1]["dependencies"] = deps[2:]
     packages_data = PackagesData()
-    packages_data._packages = pkgs
+    packages_data.add_package(pkgs[0], os.curdir, deps[:2])
+    packages_data.add_package(pkgs[1], os.curdir, deps[2:])
 
     mock_get_packages_data.return_value = packages_data
 
@@ -2397,6 +3021,50 @@ def test_get_content_manifests_by_requests(app, client, db, auth_env, tmpdir):
             assert assembled_icm == json.loads(resp.data)
 
 
+def test_get_content_manifests_by_requests_merged(app, client, db, auth_env):
+    image_contents = [
+        [{"purl": "pkg:npm/a@1"}, {"purl": "pkg:npm/c@1"}, {"purl": "pkg:npm/e@1"}],
+        [{"purl": "pkg:npm/b@1"}, {"purl": "pkg:npm/c@1"}, {"purl": "pkg:npm/d@1"}],
+        [],
+    ]
+    bundles_dir = app.config["CACHITO_BUNDLES_DIR"]
+
+    for i, contents in enumerate(image_contents, start=1):
+        with app.test_request_context(environ_base=auth_env):
+            request = Request.from_json(
+                {
+                    "repo": "https://github.com/release-engineering/dummy.git",
+                    "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+                }
+            )
+        request.add_state("complete", "Completed successfully")
+        db.session.add(request)
+
+        # The content manifests stored at completion are used as is
+        bundle_dir = RequestBundleDir(i, root=bundles_dir)
+        content = json.dumps({**BASE_ICM, "image_contents": contents})
+        bundle_dir.content_manifest.write_text(content)
+        bundle_dir.content_manifest_metadata.write_text(
+            json.dumps({"icm_version": 1, "sha256": hashlib.sha256(content.encode()).hexdigest()})
+        )
+
+    db.session.commit()
+
+    resp = client.get("/api/v1/content-manifest?requests=1,2,3")
+    assert resp.status_code == 200
+    assert resp.json == {
+        **BASE_ICM,
+        "image_contents": [
+            {"purl": "pkg:npm/a@1"},
+            {"purl": "pkg:npm/b@1"},
+            {"purl": "pkg:npm/c@1"},
+            {"purl": "pkg:npm/c@1"},
+            {"purl": "pkg:npm/d@1"},
+            {"purl": "pkg:npm/e@1"},
+        ],
+    }
+
+
 @pytest.mark.parametrize(
     "querystring,expected_items_count,expected_repos",
     [
@@ -2647,6 +3315,215 @@ def test_fetch_packages_file(app, db, client, auth_env, tmpdir):
     assert response_data["dependencies"] == expected_deps
 
 
+def test_fetch_packages_file_not_modified(app, db, client, auth_env):
+    request = create_request_in_db(app, db, auth_env)
+    bundle_dir = RequestBundleDir(request.id, root=app.config["CACHITO_BUNDLES_DIR"])
+    _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+
+    rv = client.get(f"/api/v1/requests/{request.id}/packages")
+    assert rv.status_code == 200
+    etag = rv.headers["ETag"]
+
+    rv = client.get(f"/api/v1/requests/{request.id}/packages", headers={"If-None-Match": etag})
+    assert rv.status_code == 304
+
+    # The ETag changes with the packages file
+    _write_test_packages_data(resolved_packages[:1], bundle_dir.packages_data)
+    rv = client.get(f"/api/v1/requests/{request.id}/packages", headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert rv.json["packages"] == resolved_packages[:1]
+
+
+@pytest.mark.parametrize("indexable", [True, False])
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"type": "npm"},
+        {"type": ["gomod", "npm"], "per_page": 2},
+        {"type": "go-package", "page": 2, "per_page": 1},
+        {"name": "d2"},
+        {"name": "async", "type": "npm"},
+        {"name": "missing"},
+        {"dev": "true"},
+        {"dev": "false", "page": 3, "per_page": 2},
+        {"page": 1},
+    ],
+)
+def test_fetch_packages_file_page(query, indexable, app, db, client, auth_env):
+    request = create_request_in_db(app, db, auth_env)
+    bundle_dir = RequestBundleDir(request.id, root=app.config["CACHITO_BUNDLES_DIR"])
+    if indexable:
+        _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+    else:
+        # Packages files written before they could be indexed are filtered in memory
+        bundle_dir.packages_data.write_text(json.dumps({"packages": resolved_packages}))
+
+    rv = client.get(f"/api/v1/requests/{request.id}/packages")
+    everything = rv.json
+
+    rv = client.get(f"/api/v1/requests/{request.id}/packages", query_string=query)
+    assert rv.status_code == 200
+    assert bundle_dir.packages_data_index.exists() == indexable
+
+    types = query.get("type", [])
+    types = [types] if isinstance(types, str) else types
+    page = query.get("page", 1)
+    per_page = query.get("per_page", 10)
+
+    def matches(item):
+        return (
+            (not types or item["type"] in types)
+            and ("dev" not in query or item.get("dev", False) == (query["dev"] == "true"))
+            and ("name" not in query or item["name"] == query["name"])
+        )
+
+    expected = {}
+    for kind in ("packages", "dependencies"):
+        selected = [item for item in everything[kind] if matches(item)]
+        expected[kind] = selected[(page - 1) * per_page : page * per_page]
+        assert rv.json["meta"][f"{kind}_total"] == len(selected)
+    assert rv.json["packages"] == expected["packages"]
+    assert rv.json["dependencies"] == expected["dependencies"]
+    assert rv.json["meta"]["page"] == page
+    assert rv.json["meta"]["per_page"] == per_page
+
+
+def test_fetch_packages_file_page_links(app, db, client, auth_env):
+    request = create_request_in_db(app, db, auth_env)
+    bundle_dir = RequestBundleDir(request.id, root=app.config["CACHITO_BUNDLES_DIR"])
+    _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+
+    rv = client.get(
+        f"/api/v1/requests/{request.id}/packages",
+        query_string={"type": "npm", "per_page": 1, "page": 2},
+    )
+
+    assert rv.status_code == 200
+    assert [package["name"] for package in rv.json["packages"]] == ["p2"]
+    assert [dep["name"] for dep in rv.json["dependencies"]] == ["underscore"]
+    assert rv.json["packages"][0]["dependencies"] == [
+        {"name": "async", "type": "npm", "version": "1.2.0"},
+        {"name": "underscore", "type": "npm", "version": "1.13.0"},
+    ]
+    meta = rv.json["meta"]
+    assert meta["total"] == 2
+    assert meta["pages"] == 2
+    assert meta["next"] is None
+    previous = urllib.parse.urlparse(meta["previous"])
+    assert previous.path == f"/api/v1/requests/{request.id}/packages"
+    assert urllib.parse.parse_qs(previous.query) == {
+        "page": ["1"],
+        "per_page": ["1"],
+        "type": ["npm"],
+    }
+
+
+def test_fetch_packages_file_page_reindexed(app, db, client, auth_env):
+    request = create_request_in_db(app, db, auth_env)
+    bundle_dir = RequestBundleDir(request.id, root=app.config["CACHITO_BUNDLES_DIR"])
+    _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+
+    rv = client.get(f"/api/v1/requests/{request.id}/packages", query_string={"type": "npm"})
+    assert rv.json["meta"]["packages_total"] == 2
+
+    # The index is rebuilt when the packages file changes
+    _write_test_packages_data(resolved_packages[-1:], bundle_dir.packages_data)
+    os.utime(bundle_dir.packages_data, ns=(1, 1))
+    rv = client.get(f"/api/v1/requests/{request.id}/packages", query_string={"type": "npm"})
+    assert rv.json["meta"]["packages_total"] == 1
+
+
+@pytest.mark.parametrize(
+    "query,error",
+    [
+        ({"page": "first"}, 'The "page" and "per_page" parameters must be integers'),
+        ({"per_page": "1.5"}, 'The "page" and "per_page" parameters must be integers'),
+        ({"page": 0}, 'The "page" and "per_page" parameters must be positive'),
+        ({"per_page": -1}, 'The "page" and "per_page" parameters must be positive'),
+    ],
+)
+def test_fetch_packages_file_page_invalid(query, error, app, db, client, auth_env):
+    request = create_request_in_db(app, db, auth_env)
+    bundle_dir = RequestBundleDir(request.id, root=app.config["CACHITO_BUNDLES_DIR"])
+    _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+
+    rv = client.get(f"/api/v1/requests/{request.id}/packages", query_string=query)
+
+    assert rv.status_code == 400
+    assert rv.json == {"error": error}
+
+
+def test_search_dependencies_of_finalized_requests(app, db, client, auth_env, worker_auth_env):
+    request = create_request_in_db(app, db, auth_env, RequestStateMapping.in_progress)
+    bundle_dir = RequestBundleDir(request.id, root=app.config["CACHITO_BUNDLES_DIR"])
+    _write_test_packages_data(resolved_packages, bundle_dir.packages_data)
+
+    # The dependencies are indexed when the request completes
+    payload = {"state": "complete", "state_reason": "Completed successfully"}
+    rv = client.patch(f"/api/v1/requests/{request.id}", json=payload, environ_base=worker_auth_env)
+    assert rv.status_code == 200
+    rv = client.get("/api/v1/dependencies/search", query_string={"name": "d2"})
+    assert rv.status_code == 200
+    assert rv.json["items"] == [
+        {
+            "request_id": request.id,
+            "repo": "https://localhost.git/dummy.git",
+            "ref": "c50b93a32df1c9d700e3e80996845bc2e13be848",
+            "name": "d2",
+            "type": type_,
+            "version": "2",
+        }
+        for type_ in ("go-package", "gomod")
+    ]
+
+    # And removed from the index when it becomes stale
+    payload = {"state": "stale", "state_reason": "The request has expired"}
+    rv = client.patch(f"/api/v1/requests/{request.id}", json=payload, environ_base=worker_auth_env)
+    assert rv.status_code == 200
+    rv = client.get("/api/v1/dependencies/search", query_string={"name": "d2"})
+    assert rv.json["items"] == []
+    assert IndexedDependency.query.count() == 0
+
+
+@pytest.mark.parametrize(
+    "query,expected_items",
+    [
+        ({"name": "async"}, [(3, "1.3.0"), (2, "1.2.0"), (1, "1.2.0")]),
+        ({"name": "async", "version": "1.2.0"}, [(2, "1.2.0"), (1, "1.2.0")]),
+        ({"name": "async", "type": "npm", "per_page": 1, "page": 2}, [(2, "1.2.0")]),
+        ({"name": "async", "type": "yarn"}, []),
+        ({"name": "underscore"}, []),
+    ],
+)
+def test_search_dependencies(query, expected_items, app, db, client, auth_env):
+    for version in ("1.2.0", "1.2.0", "1.3.0"):
+        request = create_request_in_db(app, db, auth_env)
+        IndexedDependency.index_request(
+            request.id, [{"name": "async", "type": "npm", "version": version}]
+        )
+    db.session.commit()
+
+    rv = client.get("/api/v1/dependencies/search", query_string=query)
+
+    assert rv.status_code == 200
+    assert [(item["request_id"], item["version"]) for item in rv.json["items"]] == expected_items
+    meta = rv.json["meta"]
+    assert meta["per_page"] == query.get("per_page", 20)
+    first = urllib.parse.urlparse(meta["first"])
+    assert first.path == "/api/v1/dependencies/search"
+    assert urllib.parse.parse_qs(first.query) == {
+        key: [str(value)]
+        for key, value in {**query, "page": 1, "per_page": meta["per_page"]}.items()
+    }
+
+
+def test_search_dependencies_without_name(app, db, client):
+    rv = client.get("/api/v1/dependencies/search", query_string={"version": "1.2.0"})
+
+    assert rv.status_code == 400
+    assert rv.json == {"errors": {"name": "field required"}}
+
+
 @pytest.mark.parametrize(
     "state,expected_status",
     [
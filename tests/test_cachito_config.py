@@ -1,6 +1,4 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
-import os
-import tempfile
 from unittest.mock import patch
 
 import pytest
@@ -12,7 +10,7 @@ from cachito.web.config import validate_cachito_config
 @patch("os.path.isdir", return_value=True)
 def test_validate_cachito_config_success(mock_isdir, app):
     validate_cachito_config(app.config)
-    mock_isdir.assert_any_call(os.path.join(tempfile.gettempdir(), "cachito-archives/bundles"))
+    mock_isdir.assert_any_call(app.config["CACHITO_BUNDLES_DIR"])
 
 
 @patch("os.path.isdir", return_value=True)
@@ -69,3 +67,22 @@ def test_validate_mutually_exclusive_package_managers(app, value, is_valid, tmpd
         )
         with pytest.raises(ConfigError, match=expected):
             validate_cachito_config(config)
+
+
+@pytest.mark.parametrize(
+    "offload, is_valid",
+    [(None, True), ("x-accel-redirect", True), ("x-sendfile", True), ("nginx", False)],
+)
+def test_validate_bundle_download_offload(app, offload, is_valid, tmpdir):
+    config = app.config.copy()
+    config["CACHITO_BUNDLE_DOWNLOAD_OFFLOAD"] = offload
+
+    if is_valid:
+        validate_cachito_config(config)
+    else:
+        expected = (
+            'The configuration "CACHITO_BUNDLE_DOWNLOAD_OFFLOAD" must be one of: '
+            "x-accel-redirect, x-sendfile"
+        )
+        with pytest.raises(ConfigError, match=expected):
+            validate_cachito_config(config)
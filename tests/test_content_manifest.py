@@ -1,11 +1,20 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
+import json
 from collections import OrderedDict
 from unittest import mock
 
 import pytest
 
 from cachito.errors import ContentManifestError
-from cachito.web.content_manifest import JSON_SCHEMA_URL, ContentManifest, Package
+from cachito.web.content_manifest import (
+    BASE_ICM,
+    JSON_SCHEMA_URL,
+    ContentManifest,
+    Package,
+    _dependency_purl,
+    _dump_content_manifest,
+    iter_stored_image_contents,
+)
 from cachito.web.models import Request
 from cachito.web.purl import PARENT_PURL_PLACEHOLDER, to_purl, to_top_level_purl, to_vcs_purl
 
@@ -495,6 +504,70 @@ def test_to_json_with_multiple_packages(mock_generate_icm, app, packages_json):
     assert res == mock_generate_icm.return_value
 
 
+def test_to_json_shallow_packages(app, default_request):
+    packages_json = [
+        {
+            "name": "example.com/org/project",
+            "type": "go-package",
+            "version": "1.1.1",
+            "dependencies": [
+                {"name": "example.com/org/project/lib", "type": "go-package", "version": "./lib"}
+            ],
+        },
+        {
+            "name": "example.com/org/project",
+            "type": "gomod",
+            "version": "1.1.1",
+            "dependencies": [{"name": "example.com/org/lib", "type": "gomod", "version": "./lib"}],
+        },
+        {
+            "name": "grc-ui",
+            "type": "npm",
+            "version": "1.0.0",
+            "dependencies": [
+                {"name": "@types/events", "type": "npm", "version": "3.0.0", "dev": True},
+            ],
+        },
+        {
+            "name": "my-gem",
+            "type": "rubygems",
+            "version": "0.1.0",
+            "path": "gems/my-gem",
+            "dependencies": [
+                {"name": "pathgem", "type": "rubygems", "version": "./vendor/pathgem"}
+            ],
+        },
+    ]
+
+    packages = _load_packages_from_json(packages_json)
+    shallow_packages = [Package.from_json(package, shallow=True) for package in packages_json]
+
+    assert shallow_packages[0].dependencies == packages_json[0]["dependencies"]
+    assert (
+        ContentManifest(default_request, shallow_packages).to_json()
+        == ContentManifest(default_request, packages).to_json()
+    )
+
+
+@mock.patch("cachito.web.content_manifest.to_purl", wraps=to_purl)
+def test_to_json_memoizes_dependency_purls(mock_to_purl, default_request):
+    dependency = {"name": "requests", "type": "pip", "version": "2.24.0"}
+    packages_json = [
+        {"name": "foo", "type": "pip", "version": "1.0.0", "dependencies": [dependency]},
+        {"name": "bar", "type": "pip", "version": "1.0.0", "dependencies": [dependency]},
+    ]
+    packages = _load_packages_from_json(packages_json)
+
+    _dependency_purl.cache_clear()
+    cm = ContentManifest(default_request, packages)
+    cm.to_json()
+    cm.to_json()
+
+    for package in packages:
+        assert cm._pip_data[package]["dependencies"] == [{"purl": "pkg:pypi/requests@2.24.0"}]
+    mock_to_purl.assert_called_once()
+
+
 @pytest.mark.parametrize("contents", [None, [], "foobar", 42, OrderedDict({"egg": "bacon"})])
 def test_generate_icm(contents, default_request):
     cm = ContentManifest(default_request, [])
@@ -986,3 +1059,29 @@ def test_top_level_purl_conversion_bogus(default_request):
     msg = "'bogus' is not a valid top level package"
     with pytest.raises(ContentManifestError, match=msg):
         to_top_level_purl(pkg, default_request)
+
+
+@pytest.mark.parametrize(
+    "image_contents",
+    [
+        [],
+        [{"purl": "pkg:npm/a@1", "dependencies": [{"purl": "pkg:npm/b@1"}], "sources": []}],
+        [{"purl": "pkg:npm/a@1"}, {"purl": "pkg:npm/c@1"}],
+    ],
+)
+@pytest.mark.parametrize("single_line", [False, True])
+def test_iter_stored_image_contents(image_contents, single_line, tmp_path):
+    icm = {**BASE_ICM, "image_contents": image_contents}
+    path = tmp_path / "content-manifest.json"
+    if single_line:
+        # Content manifests stored before the image contents were put on separate lines
+        content = json.dumps(icm, sort_keys=True)
+    else:
+        content = _dump_content_manifest(icm)
+    path.write_text(content)
+
+    assert json.loads(content) == icm
+    image_contents_iter = iter_stored_image_contents(path)
+    # The file can be deleted once the iterator is created
+    path.unlink()
+    assert list(image_contents_iter) == image_contents
@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+import json
+from datetime import datetime, timedelta
+
+from cachito.common.paths import RequestBundleDir
+from cachito.web.manage import compact_request_states, index_dependencies
+from cachito.web.models import IndexedDependency, RequestState, RequestStateArchive
+
+
+def _write_packages_data(app, request_id, packages):
+    bundle_dir = RequestBundleDir(request_id, root=app.config["CACHITO_BUNDLES_DIR"])
+    bundle_dir.packages_data.write_text(json.dumps({"packages": packages}))
+
+
+def test_index_dependencies(app, db, create_request):
+    packages = [
+        {
+            "name": "p1",
+            "type": "npm",
+            "version": "1.0.0",
+            "dependencies": [{"name": "async", "type": "npm", "version": "1.2.0"}],
+        }
+    ]
+    indexed_id = create_request("complete").id
+    _write_packages_data(app, indexed_id, packages)
+    IndexedDependency.index_request(indexed_id, packages[0]["dependencies"])
+    db.session.commit()
+    missing_id = create_request("complete").id
+    _write_packages_data(app, missing_id, packages)
+    _write_packages_data(app, create_request("stale").id, packages)
+    create_request("complete")
+
+    result = app.test_cli_runner().invoke(index_dependencies)
+
+    assert result.exit_code == 0, result.output
+    assert result.output == f"Indexed 1 dependencies of request {missing_id}\n"
+
+
+def test_index_dependencies_failure(app, db, create_request):
+    packages = [
+        {
+            "name": "p1",
+            "type": "npm",
+            "version": "1.0.0",
+            "dependencies": [{"name": "async", "type": "npm", "version": "1.2.0"}],
+        }
+    ]
+    broken_id = create_request("complete").id
+    RequestBundleDir(broken_id, root=app.config["CACHITO_BUNDLES_DIR"]).packages_data.write_text(
+        "not JSON"
+    )
+    indexed_id = create_request("complete").id
+    _write_packages_data(app, indexed_id, packages)
+
+    result = app.test_cli_runner().invoke(index_dependencies)
+
+    # The requests following the broken one are still indexed
+    assert result.exit_code == 1
+    assert f"Failed to index the dependencies of request {broken_id}: " in result.output
+    assert f"Indexed 1 dependencies of request {indexed_id}\n" in result.output
+    assert f"Error: Failed to index the dependencies of 1 requests: {broken_id}\n" in (
+        result.output
+    )
+
+
+def test_compact_request_states(app, db, create_request):
+    requests = []
+    for state_names, days in (
+        (["in_progress", "in_progress", "complete", "stale"], 40),
+        (["in_progress", "in_progress", "complete"], 40),
+        (["in_progress", "in_progress", "complete", "stale"], 10),
+    ):
+        # The request already has an in_progress state when it's created
+        request = create_request(*state_names)
+        request.updated = datetime.utcnow() - timedelta(days=days)
+        requests.append(request)
+    db.session.commit()
+    request_id = requests[0].id
+
+    result = app.test_cli_runner().invoke(
+        compact_request_states, ["--older-than", "30", "--batch-size", "1"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.output == (
+        "Compacted the state history of 1 requests\n"
+        "Removed 1 states, which were moved to request_state_archive\n"
+    )
+    assert RequestState.query.filter_by(request_id=request_id).count() == 4
+    assert RequestStateArchive.query.filter_by(request_id=request_id).count() == 5
+    assert RequestStateArchive.query.count() == 5
@@ -4,8 +4,17 @@ from typing import Optional
 from unittest import mock
 
 import pytest
+from sqlalchemy.exc import IntegrityError
 
-from cachito.web.models import PackageManager, Request, RequestStateMapping
+from cachito.web.models import (
+    IndexedDependency,
+    PackageManager,
+    Request,
+    RequestMetric,
+    RequestStateArchive,
+    RequestStateMapping,
+    request_indexed_dependency_table,
+)
 
 
 @pytest.mark.parametrize(
@@ -63,3 +72,184 @@ class TestRequest:
 
         # Difference between "created" and current UTC datetimes is within 10 seconds
         assert abs(diff_in_secs) <= 10
+
+
+class TestIndexedDependency:
+    dependencies = [
+        {"name": "async", "type": "npm", "version": "1.2.0", "dev": False},
+        {"name": "async", "type": "npm", "version": "1.3.0", "dev": True},
+        {"name": "d1", "type": "gomod", "version": None, "replaces": None},
+    ]
+
+    def _get_index(self, db):
+        return sorted(
+            [
+                (request_id, dep.name, dep.type, dep.version)
+                for request_id, dep in db.session.query(
+                    request_indexed_dependency_table.c.request_id, IndexedDependency
+                ).join(
+                    IndexedDependency,
+                    IndexedDependency.id
+                    == request_indexed_dependency_table.c.indexed_dependency_id,
+                )
+            ],
+            key=lambda row: (row[0], row[1], row[2], row[3] or ""),
+        )
+
+    @mock.patch.object(IndexedDependency, "BATCH_SIZE", new=2)
+    def test_index_request(self, app, db):
+        assert IndexedDependency.index_request(1, self.dependencies) == 3
+        assert IndexedDependency.index_request(2, self.dependencies[:1]) == 1
+        # Indexing a request again is harmless
+        assert IndexedDependency.index_request(1, self.dependencies) == 0
+        db.session.commit()
+
+        assert IndexedDependency.query.count() == 3
+        assert self._get_index(db) == [
+            (1, "async", "npm", "1.2.0"),
+            (1, "async", "npm", "1.3.0"),
+            (1, "d1", "gomod", None),
+            (2, "async", "npm", "1.2.0"),
+        ]
+
+    def test_index_request_without_versions(self, app, db):
+        dependencies = [
+            {"name": "d1", "type": "gomod", "version": "v1.0.0"},
+            {"name": "d1", "type": "gomod", "version": None},
+        ]
+        assert IndexedDependency.index_request(1, dependencies) == 2
+        db.session.commit()
+        # The dependencies without a version aren't duplicated
+        assert IndexedDependency.index_request(2, dependencies[1:]) == 1
+        db.session.commit()
+
+        assert IndexedDependency.query.count() == 2
+        assert self._get_index(db) == [
+            (1, "d1", "gomod", None),
+            (1, "d1", "gomod", "v1.0.0"),
+            (2, "d1", "gomod", None),
+        ]
+
+    def test_index_request_unique_without_version(self, app, db):
+        db.session.add(IndexedDependency(name="d1", type="gomod", version=None))
+        db.session.commit()
+
+        db.session.add(IndexedDependency(name="d1", type="gomod", version=None))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+    def test_index_request_concurrently_indexed(self, app, db):
+        IndexedDependency.index_request(1, self.dependencies)
+        db.session.commit()
+
+        get_ids = IndexedDependency._get_ids
+        calls = []
+
+        def _get_ids(keys):
+            # The first lookup misses the dependencies inserted by another request
+            calls.append(keys)
+            return {} if len(calls) == 1 else get_ids(keys)
+
+        with mock.patch.object(IndexedDependency, "_get_ids", side_effect=_get_ids):
+            assert IndexedDependency.index_request(2, self.dependencies[:2]) == 2
+        db.session.commit()
+
+        assert IndexedDependency.query.count() == 3
+        assert [row[0] for row in self._get_index(db)] == [1, 1, 1, 2, 2]
+
+    def test_index_request_concurrently_indexed_too_often(self, app, db):
+        IndexedDependency.index_request(1, self.dependencies)
+        db.session.commit()
+
+        with mock.patch.object(IndexedDependency, "_get_ids", return_value={}):
+            with pytest.raises(IntegrityError):
+                IndexedDependency.index_request(2, self.dependencies)
+        db.session.rollback()
+
+        assert IndexedDependency.query.count() == 3
+        assert [row[0] for row in self._get_index(db)] == [1, 1, 1]
+
+    def test_prune_request(self, app, db):
+        IndexedDependency.index_request(1, self.dependencies)
+        IndexedDependency.index_request(2, self.dependencies[:1])
+
+        IndexedDependency.prune_request(1)
+        # Pruning a request which is not indexed is harmless
+        IndexedDependency.prune_request(3)
+        db.session.commit()
+
+        # The dependencies of other requests are kept
+        assert [dep.to_json() for dep in IndexedDependency.query] == [
+            {"name": "async", "type": "npm", "version": "1.2.0"}
+        ]
+        assert self._get_index(db) == [(2, "async", "npm", "1.2.0")]
+
+
+class TestRequestMetric:
+    @pytest.mark.parametrize("final_state", ["complete", "failed"])
+    def test_record_on_final_state(self, final_state, db, create_request):
+        request = create_request()
+        request.add_state("in_progress", "Fetching the dependencies")
+        db.session.commit()
+        created = datetime.datetime(2022, 1, 1)
+        request.states[0].updated = created
+        request.states[1].updated = created + datetime.timedelta(seconds=2)
+        db.session.commit()
+        assert RequestMetric.query.count() == 0
+
+        request.add_state(final_state, "Done")
+        db.session.commit()
+
+        metric = RequestMetric.query.one()
+        assert metric.request_id == request.id
+        assert metric.state == RequestStateMapping[final_state].value
+        assert metric.finished == request.state.updated
+        assert metric.duration == (request.state.updated - created).total_seconds()
+        assert metric.time_in_queue == 2
+
+
+def test_request_denormalized_columns(db, create_request):
+    request = create_request(pkg_managers=["gomod", "npm"])
+    gomod, npm = sorted(request.pkg_managers, key=lambda pkg_manager: pkg_manager.name)
+
+    assert request.current_state == RequestStateMapping.in_progress.value
+    assert request.updated == request.state.updated
+    assert request.pkg_managers_mask == gomod.mask | npm.mask
+
+    request.add_state("complete", "Completed successfully")
+    request.pkg_managers.remove(gomod)
+    db.session.commit()
+
+    assert request.current_state == RequestStateMapping.complete.value
+    assert request.updated == request.state.updated
+    assert request.pkg_managers_mask == npm.mask
+
+
+def test_request_compact_states(db, create_request):
+    request = create_request("in_progress", "in_progress", "in_progress", "complete", "stale")
+    history = [(state.id, state.state_name, state.updated) for state in request.states]
+
+    assert request.compact_states() == 2
+    db.session.commit()
+
+    # The first, final and current states are kept, and so is the first intermediate state
+    assert [state.id for state in request.states] == [history[i][0] for i in (0, 1, 4, 5)]
+    assert request.states[1].state_reason == (
+        "State 0 (2 following in_progress states were archived, the last one was: State 2)"
+    )
+    assert request.state.state_name == "stale"
+    archived = RequestStateArchive.query.order_by(RequestStateArchive.id)
+    assert [(state.id, state.state, state.updated) for state in archived] == [
+        (state_id, RequestStateMapping[state_name].value, updated)
+        for state_id, state_name, updated in history
+    ]
+
+    # The history is only compacted once
+    assert request.compact_states() == 0
+
+
+def test_request_compact_states_nothing_to_do(db, create_request):
+    request = create_request("in_progress", "failed", "stale")
+
+    assert request.compact_states() == 0
+    assert RequestStateArchive.query.count() == 0
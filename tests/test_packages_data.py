@@ -1,10 +1,18 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
+import gc
 import json
 import os
+import tracemalloc
+from unittest import mock
 
 import pytest
 
-from cachito.common.packages_data import PackagesData, unique_packages
+from cachito.common.packages_data import (
+    PackagesData,
+    PackagesDataIndex,
+    merge_packages_data_files,
+    unique_packages,
+)
 from cachito.errors import InvalidRequestData
 
 
@@ -168,7 +176,7 @@ def test_add_package(params, expected):
     if isinstance(expected, list):
         for pkg_info, path, deps in params:
             pd.add_package(pkg_info, path, deps)
-        assert expected == pd._packages
+        assert expected == pd.packages
     else:
         with expected:
             for pkg_info, path, deps in params:
@@ -178,7 +186,7 @@ def test_add_package(params, expected):
 @pytest.mark.parametrize(
     "params,expected",
     [
-        [[], {"packages": []}],
+        [[], {"version": 2, "dependencies": [], "packages": []}],
         [
             [
                 [{"name": "pkg1", "type": "gomod", "version": "1.0.0"}, "path1", []],
@@ -189,6 +197,8 @@ def test_add_package(params, expected):
                 ],
             ],
             {
+                "version": 2,
+                "dependencies": [{"name": "async", "type": "npm", "version": "15.0.0"}],
                 "packages": [
                     {
                         "name": "pkg1",
@@ -201,7 +211,47 @@ def test_add_package(params, expected):
                         "name": "pkg3",
                         "type": "npm",
                         "version": "1.2.3",
-                        "dependencies": [{"name": "async", "type": "npm", "version": "15.0.0"}],
+                        "dependencies": [0],
+                    },
+                ],
+            },
+        ],
+        [
+            [
+                [
+                    {"name": "pkg1", "type": "npm", "version": "1.0.0"},
+                    "path1",
+                    [
+                        {"name": "async", "type": "npm", "version": "15.0.0"},
+                        {"name": "underscore", "type": "npm", "version": "1.13.1"},
+                    ],
+                ],
+                [
+                    {"name": "pkg2", "type": "npm", "version": "2.0.0"},
+                    "path2",
+                    [{"name": "underscore", "type": "npm", "version": "1.13.1"}],
+                ],
+            ],
+            {
+                "version": 2,
+                "dependencies": [
+                    {"name": "async", "type": "npm", "version": "15.0.0"},
+                    {"name": "underscore", "type": "npm", "version": "1.13.1"},
+                ],
+                "packages": [
+                    {
+                        "name": "pkg1",
+                        "type": "npm",
+                        "version": "1.0.0",
+                        "path": "path1",
+                        "dependencies": [0, 1],
+                    },
+                    {
+                        "name": "pkg2",
+                        "type": "npm",
+                        "version": "2.0.0",
+                        "path": "path2",
+                        "dependencies": [1],
                     },
                 ],
             },
@@ -267,7 +317,7 @@ def test_load_from_file(packages_data, expected, tmpdir):
             f.write(json.dumps(packages_data))
     pd = PackagesData()
     pd.load(filename)
-    assert expected == pd._packages
+    assert expected == pd.packages
 
 
 @pytest.mark.parametrize(
@@ -339,3 +389,304 @@ def test_all_dependencies(packages_data, expected_dependencies, tmpdir):
     pd = PackagesData()
     pd.load(filename)
     assert expected_dependencies == pd.all_dependencies
+
+
+def test_load_from_file_version_2(tmpdir):
+    filename = os.path.join(tmpdir, "data.json")
+    packages_data = {
+        "version": 2,
+        "dependencies": [{"name": "async", "type": "npm", "version": "15.0.0"}],
+        "packages": [
+            {"name": "pkg1", "type": "npm", "version": "1.0.0", "dependencies": [0]},
+            {"name": "pkg2", "type": "npm", "version": "2.0.0", "dependencies": [0]},
+        ],
+    }
+    with open(filename, "w") as f:
+        f.write(json.dumps(packages_data))
+    pd = PackagesData()
+    pd.load(filename)
+
+    dep = {"name": "async", "type": "npm", "version": "15.0.0"}
+    assert pd.packages == [
+        {"name": "pkg1", "type": "npm", "version": "1.0.0", "dependencies": [dep]},
+        {"name": "pkg2", "type": "npm", "version": "2.0.0", "dependencies": [dep]},
+    ]
+    assert pd.all_dependencies == [dep]
+
+
+def test_load_from_file_unsupported_version(tmpdir):
+    filename = os.path.join(tmpdir, "data.json")
+    with open(filename, "w") as f:
+        f.write(json.dumps({"version": 3, "packages": []}))
+    pd = PackagesData()
+    with pytest.raises(InvalidRequestData, match="Unsupported version 3 of the packages data file"):
+        pd.load(filename)
+
+
+def test_write_and_load_round_trip(tmpdir):
+    pd = PackagesData()
+    pd.add_package(
+        {"name": "pkg1", "type": "npm", "version": "1.0.0"},
+        os.curdir,
+        [
+            {"name": "async", "type": "npm", "version": "15.0.0", "dev": False},
+            {"name": "underscore", "type": "npm", "version": "1.13.1", "dev": True},
+        ],
+    )
+    pd.add_package(
+        {"name": "pkg2", "type": "npm", "version": "2.0.0"},
+        "path2",
+        [{"name": "async", "type": "npm", "version": "15.0.0", "dev": False}],
+    )
+    filename = os.path.join(tmpdir, "data.json")
+    pd.write_to_file(filename)
+
+    loaded = PackagesData()
+    loaded.load(filename)
+    assert loaded.packages == pd.packages
+    assert loaded.all_dependencies == pd.all_dependencies
+
+
+def _traced_memory(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize(
+    "packages_count",
+    [
+        200,
+        # A Go monorepo request with 2,000 packages and 200,000 dependencies
+        pytest.param(2_000, marks=pytest.mark.slow),
+    ],
+)
+def test_load_memory_benchmark(packages_count, tmp_path):
+    # Each package has 100 dependencies of its own. The fixed overhead of loading the data
+    # outweighs the records of fewer dependencies.
+    filename = tmp_path / "data.json"
+    dependencies_count = packages_count * 100
+    dependencies = [
+        {
+            "name": f"github.com/org/repo{i // 10}/pkg{i}",
+            "replaces": None,
+            "type": "go-package",
+            "version": f"v1.{i % 50}.0",
+        }
+        for i in range(dependencies_count)
+    ]
+    packages = [
+        {
+            "name": f"example.com/monorepo/pkg{i}",
+            "type": "go-package",
+            "version": "v1.0.0",
+            "path": f"pkg{i}",
+            "dependencies": list(range(i * 100, (i + 1) * 100)),
+        }
+        for i in range(packages_count)
+    ]
+    filename.write_text(
+        json.dumps({"version": 2, "dependencies": dependencies, "packages": packages})
+    )
+    del dependencies, packages
+
+    def load_dicts():
+        with open(filename) as f:
+            return json.load(f)
+
+    def load_packages_data():
+        pd = PackagesData()
+        pd.load(filename)
+        return pd
+
+    _, dicts_size = _traced_memory(load_dicts)
+    pd, records_size = _traced_memory(load_packages_data)
+
+    assert pd.packages_count == packages_count
+    assert pd.dependencies_count == dependencies_count
+    # The records take less memory than the dicts parsed from the file
+    assert records_size < dicts_size * 0.7
+
+
+def _write_packages_data_file(file_name, packages):
+    pd = PackagesData()
+    for pkg_info, path, deps in packages:
+        pd.add_package(pkg_info, path, deps)
+    pd.write_to_file(file_name)
+    return pd
+
+
+def test_write_to_file_one_item_per_line(tmp_path):
+    filename = tmp_path / "data.json"
+    _write_packages_data_file(
+        filename,
+        [
+            [
+                {"name": "pkg1", "type": "npm", "version": "1.0.0"},
+                os.curdir,
+                [
+                    {"name": "underscore", "type": "npm", "version": "1.13.1"},
+                    {"name": "async", "type": "npm", "version": "15.0.0"},
+                ],
+            ],
+        ],
+    )
+    assert filename.read_text().splitlines() == [
+        '{"version": 2, "dependencies": [',
+        '{"name": "async", "type": "npm", "version": "15.0.0"},',
+        '{"name": "underscore", "type": "npm", "version": "1.13.1"}',
+        '], "packages": [',
+        '{"name": "pkg1", "type": "npm", "version": "1.0.0", "dependencies": [0, 1]}',
+        "]}",
+    ]
+
+
+def test_merge_packages_data_files(tmp_path):
+    npm_deps = [
+        {"name": "async", "type": "npm", "version": "15.0.0", "dev": False},
+        {"name": "underscore", "type": "npm", "version": "1.13.1", "dev": True},
+    ]
+    gomod_deps = [
+        {"name": "golang.org/x/text", "type": "gomod", "version": "v0.3.0", "replaces": None},
+    ]
+    npm_packages = [
+        [{"name": "pkg1", "type": "npm", "version": "1.0.0"}, os.curdir, npm_deps],
+        [{"name": "pkg3", "type": "npm", "version": "1.0.0"}, "pkg3", npm_deps[:1]],
+    ]
+    gomod_packages = [
+        [{"name": "pkg2", "type": "gomod", "version": "v1.0.0"}, "pkg2", gomod_deps],
+        [{"name": "pkg2/cmd", "type": "go-package", "version": "v1.0.0"}, "pkg2", gomod_deps],
+    ]
+    _write_packages_data_file(tmp_path / "npm.json", npm_packages)
+    _write_packages_data_file(tmp_path / "gomod.json", gomod_packages)
+    expected = _write_packages_data_file(tmp_path / "all.json", npm_packages + gomod_packages)
+
+    output_file = tmp_path / "merged.json"
+    counts = merge_packages_data_files(
+        [tmp_path / "npm.json", tmp_path / "missing.json", tmp_path / "gomod.json"], output_file
+    )
+
+    assert counts == (4, 3)
+    merged = PackagesData()
+    merged.load(output_file)
+    assert merged.packages == expected.packages
+    assert merged.all_dependencies == expected.all_dependencies
+
+
+def test_merge_packages_data_files_version_1(tmp_path):
+    dep = {"name": "async", "type": "npm", "version": "15.0.0"}
+    packages = [
+        {"name": "pkg2", "type": "npm", "version": "1.0.0", "dependencies": [dep]},
+        {"name": "pkg1", "type": "npm", "version": "1.0.0", "dependencies": [dep]},
+    ]
+    (tmp_path / "npm.json").write_text(json.dumps({"packages": packages}))
+
+    output_file = tmp_path / "merged.json"
+    assert merge_packages_data_files([tmp_path / "npm.json"], output_file) == (2, 1)
+    assert json.loads(output_file.read_text()) == {
+        "version": 2,
+        "dependencies": [dep],
+        "packages": [
+            {"name": "pkg1", "type": "npm", "version": "1.0.0", "dependencies": [0]},
+            {"name": "pkg2", "type": "npm", "version": "1.0.0", "dependencies": [0]},
+        ],
+    }
+
+
+def test_merge_packages_data_files_duplicate_package(tmp_path):
+    package = [{"name": "pkg1", "type": "npm", "version": "1.0.0"}, os.curdir, []]
+    _write_packages_data_file(tmp_path / "a.json", [package])
+    _write_packages_data_file(tmp_path / "b.json", [package])
+
+    with pytest.raises(InvalidRequestData, match="Duplicate package"):
+        merge_packages_data_files([tmp_path / "a.json", tmp_path / "b.json"], tmp_path / "c.json")
+
+
+INDEXED_PACKAGES = [
+    [
+        {"name": "pkg1", "type": "npm", "version": "1.0.0"},
+        os.curdir,
+        [
+            {"name": "async", "type": "npm", "version": "15.0.0", "dev": False},
+            {"name": "lodash", "type": "npm", "version": "4.17.21", "dev": True},
+            {"name": "underscore", "type": "npm", "version": "1.13.1", "dev": True},
+        ],
+    ],
+    [
+        {"name": "pkg1", "type": "npm", "version": "2.0.0"},
+        "v2",
+        [
+            {"name": "async", "type": "npm", "version": "15.0.0", "dev": True},
+            {"name": "lodash", "type": "npm", "version": "4.17.20", "dev": True},
+        ],
+    ],
+    [
+        {"name": "pkg2", "type": "pip", "version": "1.0.0"},
+        "pkg2",
+        [
+            {"name": "async", "type": "pip", "version": "1.0", "dev": False},
+            {"name": "requests", "type": "pip", "version": "2.28.1", "dev": False},
+        ],
+    ],
+]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"types": ["npm"]},
+        {"types": ["pip", "gomod"]},
+        {"dev": True},
+        {"dev": False},
+        {"name": "pkg1"},
+        {"name": "lodash"},
+        {"name": "async", "dev": False},
+        {"name": "missing"},
+        {"types": ["npm"], "dev": True, "name": "underscore"},
+    ],
+)
+def test_packages_data_index(filters, tmp_path):
+    filename = tmp_path / "data.json"
+    pd = _write_packages_data_file(filename, INDEXED_PACKAGES)
+
+    index = PackagesDataIndex.open(filename, tmp_path / "data.index")
+
+    for kind, items in (("packages", pd.packages), ("dependencies", pd.all_dependencies)):
+        expected = [
+            item
+            for item in items
+            if ("types" not in filters or item["type"] in filters["types"])
+            and ("dev" not in filters or item.get("dev", False) == filters["dev"])
+            and ("name" not in filters or item["name"] == filters["name"])
+        ]
+        ranges = index.select(kind, **filters)
+        assert sum(len(selected) for selected in ranges) == len(expected)
+        assert index.read(kind, ranges, 0, 100) == expected
+        assert index.read(kind, ranges, 1, 2) == expected[1:3]
+
+
+def test_packages_data_index_stored(tmp_path):
+    filename = tmp_path / "data.json"
+    index_filename = tmp_path / "data.index"
+    _write_packages_data_file(filename, INDEXED_PACKAGES)
+
+    assert PackagesDataIndex.open(filename, index_filename) is not None
+    assert index_filename.exists()
+    # The stored index is used as long as the packages data file does not change
+    with mock.patch.object(PackagesDataIndex, "build") as mock_build:
+        assert PackagesDataIndex.open(filename, index_filename) is not None
+        mock_build.assert_not_called()
+
+
+def test_packages_data_index_not_indexable(tmp_path):
+    filename = tmp_path / "data.json"
+    filename.write_text(json.dumps({"packages": []}))
+
+    assert PackagesDataIndex.open(filename, tmp_path / "data.index") is None
+    assert not (tmp_path / "data.index").exists()
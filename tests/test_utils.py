@@ -1,8 +1,21 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
+import hashlib
+import io
+import json
+import os
+import tarfile
+from unittest import mock
 
 import pytest
 
-from cachito.web.utils import deep_sort_icm
+from cachito.common.checksum import hash_file
+from cachito.web.utils import (
+    deep_sort_icm,
+    get_file_sha256,
+    iter_json,
+    iter_merged_tar_gz,
+    json_stream_response,
+)
 
 
 @pytest.mark.parametrize(
@@ -82,3 +95,102 @@ def test_deep_sort_icm(orig_items):
 def test_deep_sort_icm_raises_error_when_unknown_type_included(error_icm):
     with pytest.raises(TypeError, match="Unknown type is included in the content manifest"):
         deep_sort_icm(error_icm)
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        {},
+        [],
+        "foo",
+        42,
+        None,
+        {"b": [], "a": {}, "c": [1, "2", None, {"z": 1, "y": [True, {"x": [1, 2]}]}]},
+        [{"purl": "pkg:npm/foo@1.0.0", "dependencies": [{"purl": "pkg:npm/bar@2.0.0"}]}],
+        {2: "non-string keys", 1: [{"b": 2, "a": 1}]},
+    ],
+)
+@pytest.mark.parametrize("sort_keys", [True, False])
+@pytest.mark.parametrize("depth", [0, 1, 3, 10])
+def test_iter_json(obj, sort_keys, depth):
+    serialized = "".join(iter_json(obj, sort_keys=sort_keys, depth=depth))
+    assert serialized == json.dumps(obj, sort_keys=sort_keys)
+
+
+@pytest.mark.parametrize("depth", [1, 3])
+def test_iter_json_iterator(depth):
+    obj = {
+        "packages": (package for package in [{"name": "foo"}, {"name": "bar"}]),
+        "empty": iter([]),
+    }
+    serialized = "".join(iter_json(obj, depth=depth))
+    assert json.loads(serialized) == {
+        "packages": [{"name": "foo"}, {"name": "bar"}],
+        "empty": [],
+    }
+
+
+@mock.patch("cachito.web.utils.JSON_STREAM_CHUNK_SIZE", 10)
+def test_json_stream_response(app):
+    obj = {"image_contents": [{"purl": f"pkg:npm/foo@{i}.0.0"} for i in range(10)], "a": 1}
+    response = json_stream_response(obj, sort_keys=True)
+
+    assert response.mimetype == "application/json"
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert len(chunks) > 1
+    assert all(len(chunk) < 10 + len('{"purl": "pkg:npm/foo@0.0.0"}') for chunk in chunks)
+    assert "".join(chunks) == json.dumps(obj, sort_keys=True)
+
+
+def test_get_file_sha256(tmp_path):
+    path = tmp_path / "bundle.tar.gz"
+    path.write_bytes(b"1234")
+    expected = hashlib.sha256(b"1234").hexdigest()
+
+    with mock.patch("cachito.web.utils.hash_file", wraps=hash_file) as mock_hash_file:
+        assert get_file_sha256(path) == expected
+        assert get_file_sha256(str(path)) == expected
+        mock_hash_file.assert_called_once()
+
+        # The digest is computed again once the file changes
+        path.write_bytes(b"12345")
+        os.utime(path, ns=(0, 0))
+        assert get_file_sha256(path) == hashlib.sha256(b"12345").hexdigest()
+        assert mock_hash_file.call_count == 2
+
+
+def test_iter_merged_tar_gz(tmp_path):
+    app_dir = tmp_path / "src" / "app"
+    app_dir.mkdir(parents=True)
+    app_dir.joinpath("main.go").write_text("package main")
+    app_dir.joinpath("link.go").symlink_to("main.go")
+    os.link(app_dir / "main.go", app_dir / "hardlink.go")
+    app_archive = tmp_path / "app.tar.gz"
+    with tarfile.open(app_archive, "w:gz") as archive:
+        archive.add(app_dir, "app")
+    deps_archive = tmp_path / "deps-npm.tar.gz"
+    with tarfile.open(deps_archive, "w:gz") as archive:
+        tar_info = tarfile.TarInfo("deps/npm/dep.tgz")
+        tar_info.size = 3
+        archive.addfile(tar_info, io.BytesIO(b"dep"))
+
+    merged = b"".join(iter_merged_tar_gz([app_archive, deps_archive]))
+
+    with tarfile.open(fileobj=io.BytesIO(merged), mode="r:gz") as archive:
+        members = {member.name: member for member in archive}
+        assert sorted(members) == [
+            "app",
+            "app/hardlink.go",
+            "app/link.go",
+            "app/main.go",
+            "deps/npm/dep.tgz",
+        ]
+        assert members["app/link.go"].issym()
+        assert members["app/link.go"].linkname == "main.go"
+        assert archive.extractfile("app/main.go").read() == b"package main"
+        assert archive.extractfile("deps/npm/dep.tgz").read() == b"dep"
+        # The hard link is resolved to the file it links to
+        hardlinks = [m for m in members.values() if m.islnk()]
+        assert len(hardlinks) == 1
+        assert archive.extractfile(hardlinks[0]).read() == b"package main"
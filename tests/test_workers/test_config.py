@@ -231,6 +231,27 @@ def test_validate_pip_config(mock_vnc, mock_gwc, missing_configs):
         validate_pip_config()
 
 
+@pytest.mark.parametrize("is_dir", [True, False])
+@patch("os.path.isdir")
+@patch("cachito.workers.config.get_worker_config")
+@patch("cachito.workers.config.validate_nexus_config")
+def test_validate_pip_config_index_cache_dir(mock_vnc, mock_gwc, mock_isdir, is_dir):
+    mock_gwc.return_value = {
+        "cachito_nexus_pypi_proxy_url": "foo",
+        "cachito_nexus_pip_raw_repo_name": "bar",
+        "cachito_pip_index_cache_dir": "/tmp/pip-index-cache",
+    }
+    mock_isdir.return_value = is_dir
+
+    if is_dir:
+        validate_pip_config()
+    else:
+        expected = 'The configuration "cachito_pip_index_cache_dir" must be set to an existing dir'
+        with pytest.raises(ConfigError, match=expected):
+            validate_pip_config()
+    mock_isdir.assert_called_once_with("/tmp/pip-index-cache")
+
+
 @pytest.mark.parametrize(
     "file_type, access, error",
     (
@@ -269,3 +290,20 @@ def test_validate_celery_config_request_logs_dir_misconfigured(file_type, access
     error = error.format(logs_dir=cachito_request_file_logs_dir)
     with pytest.raises(ConfigError, match=error):
         validate_celery_config(celery_app.conf)
+
+
+@pytest.mark.parametrize(
+    "concurrency_conf", ("cachito_download_concurrency", "cachito_nexus_upload_concurrency")
+)
+@pytest.mark.parametrize("concurrency", (0, -1, "4", 2.5))
+@patch("os.path.isdir", return_value=True)
+def test_validate_celery_config_invalid_concurrency(mock_isdir, concurrency_conf, concurrency):
+    celery_app = celery.Celery()
+    celery_app.conf.cachito_api_url = "http://cachito-api/api/v1/"
+    celery_app.conf.cachito_bundles_dir = "/tmp/some-path/bundles"
+    celery_app.conf.cachito_default_environment_variables = {}
+    celery_app.conf.cachito_sources_dir = "/tmp/some-path/sources"
+    setattr(celery_app.conf, concurrency_conf, concurrency)
+    expected = f'The configuration "{concurrency_conf}" must be a positive integer'
+    with pytest.raises(ConfigError, match=expected):
+        validate_celery_config(celery_app.conf)
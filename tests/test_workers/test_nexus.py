@@ -474,6 +474,135 @@ def test_get_raw_component_asset_url_sanity_check(mock_get_component_info, compo
         nexus.get_raw_component_asset_url("cachito-pip-raw", "foo/bar/foobar-1.0.tar.gz")
 
 
+def _raw_component(name):
+    return {"name": name, "assets": [{"downloadUrl": f"http://nexus/repository/raw/{name}"}]}
+
+
+@pytest.fixture()
+def mock_cache_config():
+    with mock.patch("cachito.workers.nexus.get_worker_config") as mock_get_config:
+        mock_get_config.return_value = mock.Mock(
+            cachito_nexus_raw_component_cache_hit_ttl=3600,
+            cachito_nexus_raw_component_cache_miss_ttl=60,
+        )
+        yield mock_get_config.return_value
+
+
+@mock.patch("time.monotonic")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_raw_component_cache_lookups(mock_get_url, mock_monotonic, mock_cache_config):
+    cache = nexus.RawComponentCache()
+    mock_get_url.side_effect = lambda repo, name: None if name == "missing" else f"url/{name}"
+    mock_monotonic.return_value = 1000
+
+    assert cache.get_asset_url("raw", "found") == "url/found"
+    assert cache.get_asset_url("raw", "missing") is None
+    assert mock_get_url.call_count == 2
+
+    # Both results are cached within their TTL
+    mock_monotonic.return_value = 1059
+    assert cache.get_asset_url("raw", "found") == "url/found"
+    assert cache.get_asset_url("raw", "missing") is None
+    assert mock_get_url.call_count == 2
+
+    # Misses expire sooner than hits
+    mock_monotonic.return_value = 1060
+    assert cache.get_asset_url("raw", "found") == "url/found"
+    assert cache.get_asset_url("raw", "missing") is None
+    assert mock_get_url.call_count == 3
+
+    # Invalidated components are searched for again
+    cache.invalidate("raw", "found")
+    assert cache.get_asset_url("raw", "found") == "url/found"
+    assert mock_get_url.call_count == 4
+
+
+@mock.patch("time.monotonic")
+@mock.patch("cachito.workers.nexus.search_components")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_raw_component_cache_fill(mock_get_url, mock_search, mock_monotonic, mock_cache_config):
+    cache = nexus.RawComponentCache()
+    mock_monotonic.return_value = 1000
+    mock_search.return_value = [
+        _raw_component("foo/foo-1.0.tar.gz"),
+        # Left for the search to report
+        {"name": "bar/bar-1.0.tar.gz", "assets": []},
+    ]
+    mock_get_url.return_value = None
+
+    cache.fill("raw")
+    # The repo is only listed once until the listing expires
+    cache.fill("raw")
+    mock_search.assert_called_once_with(format="raw", repository="raw")
+
+    assert cache.get_asset_url("raw", "foo/foo-1.0.tar.gz") == (
+        "http://nexus/repository/raw/foo/foo-1.0.tar.gz"
+    )
+    assert cache.get_asset_url("raw", "spam/spam-1.0.tar.gz") is None
+    mock_get_url.assert_not_called()
+
+    assert cache.get_asset_url("raw", "bar/bar-1.0.tar.gz") is None
+    mock_get_url.assert_called_once_with("raw", "bar/bar-1.0.tar.gz")
+
+    # Uploaded components are not considered missing because they were not listed
+    cache.invalidate("raw", "spam/spam-1.0.tar.gz")
+    cache.get_asset_url("raw", "spam/spam-1.0.tar.gz")
+    assert mock_get_url.call_count == 2
+
+    # Once the listing expires, the components that were not listed are searched for
+    mock_monotonic.return_value = 1060
+    cache.get_asset_url("raw", "eggs/eggs-1.0.tar.gz")
+    assert mock_get_url.call_count == 3
+    cache.fill("raw")
+    assert mock_search.call_count == 2
+
+
+@mock.patch("cachito.workers.nexus.search_components")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_raw_component_cache_fill_without_hit_ttl(mock_get_url, mock_search, mock_cache_config):
+    mock_cache_config.cachito_nexus_raw_component_cache_hit_ttl = 0
+    cache = nexus.RawComponentCache()
+    mock_search.return_value = [_raw_component("foo/foo-1.0.tar.gz")]
+    mock_get_url.return_value = "url"
+
+    cache.fill("raw")
+
+    # Listed components are not cached, but they must not be considered missing either
+    assert cache.get_asset_url("raw", "foo/foo-1.0.tar.gz") == "url"
+    assert cache.get_asset_url("raw", "spam/spam-1.0.tar.gz") is None
+    mock_get_url.assert_called_once_with("raw", "foo/foo-1.0.tar.gz")
+
+
+@pytest.mark.parametrize("error", [NetworkError("oops"), NexusError("oops")])
+@mock.patch("cachito.workers.nexus.search_components")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_raw_component_cache_fill_failed(mock_get_url, mock_search, mock_cache_config, error):
+    cache = nexus.RawComponentCache()
+    mock_search.side_effect = error
+    mock_get_url.return_value = None
+
+    cache.fill("raw")
+    cache.get_asset_url("raw", "foo/foo-1.0.tar.gz")
+
+    mock_get_url.assert_called_once_with("raw", "foo/foo-1.0.tar.gz")
+
+
+@mock.patch("cachito.workers.nexus.search_components")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_raw_component_cache_disabled(mock_get_url, mock_search, mock_cache_config):
+    mock_cache_config.cachito_nexus_raw_component_cache_hit_ttl = 0
+    mock_cache_config.cachito_nexus_raw_component_cache_miss_ttl = 0
+    cache = nexus.RawComponentCache()
+    mock_get_url.return_value = "url"
+
+    cache.fill("raw")
+    cache.get_asset_url("raw", "foo/foo-1.0.tar.gz")
+    cache.get_asset_url("raw", "foo/foo-1.0.tar.gz")
+
+    mock_search.assert_not_called()
+    assert mock_get_url.call_count == 2
+
+
 @mock.patch.object(nexus.nexus_requests_session, "get")
 def test_search_components(mock_get, components_search_results):
     # Split up the components_search_results fixture into two pages to test pagination
@@ -9,6 +9,7 @@ from cachito.errors import InvalidChecksum, InvalidRequestData, NetworkError
 from cachito.workers.pkg_managers import general
 from cachito.workers.pkg_managers.general import (
     ChecksumInfo,
+    ConcurrentJobs,
     download_binary_file,
     pkg_requests_session,
     update_request_env_vars,
@@ -87,6 +88,20 @@ def test_verify_checksum_invalid_hexdigest(tmpdir):
         verify_checksum(str(file), ChecksumInfo("sha512", "spam"))
 
 
+@pytest.mark.parametrize("hexdigest, valid", [("abcdef", True), ("fedcba", False)])
+@mock.patch("cachito.workers.pkg_managers.general.hash_file")
+def test_verify_checksum_precomputed_digest(mock_hash_file, hexdigest, valid):
+    checksum_info = ChecksumInfo("sha256", hexdigest)
+    digests = {"sha256": "abcdef"}
+
+    if valid:
+        verify_checksum("/spells.txt", checksum_info, digests=digests)
+    else:
+        with pytest.raises(InvalidChecksum, match="expected fedcba but computed abcdef"):
+            verify_checksum("/spells.txt", checksum_info, digests=digests)
+    mock_hash_file.assert_not_called()
+
+
 def test_verify_checksum_unsupported_algorithm(tmpdir):
     file = tmpdir.join("spells.txt")
     file.write("Beetlejuice! Beetlejuice! Beetlejuice!")
@@ -117,6 +132,95 @@ def test_download_binary_file(mock_get, auth, insecure, chunk_size, tmpdir):
     mock_response.iter_content.assert_called_with(chunk_size=chunk_size)
 
 
+@mock.patch.object(pkg_requests_session, "get")
+def test_download_binary_file_digests(mock_get, tmp_path):
+    url = "http://example.org/example.tar.gz"
+    mock_response = mock_get.return_value
+    mock_response.headers = {"Content-Length": "38"}
+    mock_response.iter_content.return_value = [b"Beetlejuice! ", b"Beetlejuice! Beetlejuice!"]
+
+    download_path = tmp_path / "example.tar.gz"
+    digests = download_binary_file(url, download_path, hash_algorithms=["sha256", "md5"])
+
+    assert download_path.read_bytes() == b"Beetlejuice! Beetlejuice! Beetlejuice!"
+    assert digests == {
+        "sha256": "ed1f8cd69bfacf0528744b6a7084f36e8841b6128de0217503e215612a0ee835",
+        "md5": "308764bc995153f7d853827a675e6731",
+    }
+    mock_response.iter_content.assert_called_with(chunk_size=general.MIN_DOWNLOAD_CHUNK_SIZE)
+
+
+@pytest.mark.parametrize(
+    "content_length, expected_chunk_size",
+    [
+        (None, general.MIN_DOWNLOAD_CHUNK_SIZE),
+        ("not-a-number", general.MIN_DOWNLOAD_CHUNK_SIZE),
+        ("1024", general.MIN_DOWNLOAD_CHUNK_SIZE),
+        (str(64 * general.MIN_DOWNLOAD_CHUNK_SIZE), 4 * general.MIN_DOWNLOAD_CHUNK_SIZE),
+        (str(1024 * general.MAX_DOWNLOAD_CHUNK_SIZE), general.MAX_DOWNLOAD_CHUNK_SIZE),
+    ],
+)
+def test_get_download_chunk_size(content_length, expected_chunk_size):
+    headers = {} if content_length is None else {"Content-Length": content_length}
+    resp = mock.Mock(headers=headers)
+    assert general._get_download_chunk_size(resp) == expected_chunk_size
+
+
+@mock.patch.object(pkg_requests_session, "get")
+def test_download_binary_file_unknown_algorithm(mock_get):
+    expected = "Cannot perform checksum on the file downloaded from http://example.org/x.tar.gz"
+    with pytest.raises(InvalidChecksum, match=expected):
+        download_binary_file("http://example.org/x.tar.gz", "/x.tar.gz", hash_algorithms=["bacon"])
+    mock_get.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "current_url, expect_download",
+    [
+        # The component was removed from Nexus
+        (None, False),
+        # The component was re-uploaded elsewhere
+        ("http://nexus/repository/raw/new/foo.tar.gz", True),
+    ],
+)
+@mock.patch("cachito.workers.pkg_managers.general.download_binary_file")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_download_raw_component_stale_url(
+    mock_get_url, mock_download, current_url, expect_download, tmp_path
+):
+    cached_url = "http://nexus/repository/raw/foo.tar.gz"
+    mock_get_url.side_effect = [cached_url, current_url]
+    mock_download.side_effect = [NetworkError("Not found"), {"sha256": "abcdef"}]
+    download_path = tmp_path / "foo.tar.gz"
+
+    digests = general.download_raw_component(
+        "foo/foo.tar.gz", "raw", download_path, ("user", "password"), ["sha256"]
+    )
+
+    if expect_download:
+        assert digests == {"sha256": "abcdef"}
+        mock_download.assert_called_with(
+            current_url, download_path, auth=("user", "password"), hash_algorithms=["sha256"]
+        )
+    else:
+        assert digests is None
+        assert mock_download.call_count == 1
+
+
+@mock.patch("cachito.workers.pkg_managers.general.download_binary_file")
+@mock.patch("cachito.workers.nexus.get_raw_component_asset_url")
+def test_download_raw_component_failed(mock_get_url, mock_download, tmp_path):
+    mock_get_url.return_value = "http://nexus/repository/raw/foo.tar.gz"
+    mock_download.side_effect = NetworkError("Could not download")
+
+    with pytest.raises(NetworkError, match="Could not download"):
+        general.download_raw_component(
+            "foo/foo.tar.gz", "raw", tmp_path / "foo.tar.gz", ("user", "password")
+        )
+    assert mock_get_url.call_count == 2
+    assert mock_download.call_count == 1
+
+
 @mock.patch.object(pkg_requests_session, "get")
 def test_download_binary_file_failed(mock_get):
     mock_get.side_effect = [requests.RequestException("Something went wrong")]
@@ -162,9 +266,75 @@ def test_update_request_env_vars_failed(mock_patch, side_effect, expected_error)
         update_request_env_vars(1, {"environment_variables": {}})
 
 
+@pytest.mark.parametrize("max_workers", [1, 4, None])
+def test_concurrent_jobs(max_workers):
+    with ConcurrentJobs(max_workers) as jobs:
+        futures = [jobs.submit(f"job {i}", pow, i, 2) for i in range(10)]
+
+    assert [f.result() for f in futures] == [i**2 for i in range(10)]
+    assert jobs.wait() == [i**2 for i in range(10)]
+
+
+def test_concurrent_jobs_reports_first_failure(caplog):
+    def job(i):
+        if i in (3, 7):
+            raise NetworkError(f"job {i} failed")
+        return i
+
+    with pytest.raises(NetworkError, match="job 3 failed"):
+        with ConcurrentJobs(4) as jobs:
+            for i in range(10):
+                jobs.submit(f"job {i}", job, i)
+
+    assert "The job 7 also failed: job 7 failed" in caplog.text
+
+
+def test_concurrent_jobs_cancelled_on_error():
+    job = mock.Mock()
+
+    with pytest.raises(ValueError, match="stop"):
+        with ConcurrentJobs(1) as jobs:
+            jobs.submit("blocking job", lambda: None)
+            for i in range(100):
+                jobs.submit(f"job {i}", job, i)
+            raise ValueError("stop")
+
+    assert job.call_count < 100
+
+
+@pytest.mark.parametrize("dest_exists", [True, False])
+def test_link_or_copy(dest_exists, tmp_path):
+    src = tmp_path / "src.tar.gz"
+    src.write_text("archive")
+    dest = tmp_path / "dest.tar.gz"
+    if dest_exists:
+        dest.write_text("old archive")
+
+    general.link_or_copy(src, dest)
+
+    assert dest.read_text() == "archive"
+    assert dest.stat().st_ino == src.stat().st_ino
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dest.tar.gz", "src.tar.gz"]
+
+
+@mock.patch("os.link")
+def test_link_or_copy_fallback(mock_link, tmp_path, caplog):
+    mock_link.side_effect = OSError("Invalid cross-device link")
+    src = tmp_path / "src.tar.gz"
+    src.write_text("archive")
+    dest = tmp_path / "dest.tar.gz"
+
+    general.link_or_copy(src, dest)
+
+    assert dest.read_text() == "archive"
+    assert dest.stat().st_ino != src.stat().st_ino
+    assert f"Could not hardlink {src}, will copy it instead" in caplog.text
+
+
+@mock.patch.object(general.nexus.raw_component_cache, "invalidate")
 @mock.patch("cachito.workers.pkg_managers.general.nexus.upload_raw_component")
 @pytest.mark.parametrize("is_request_repo", [True, False])
-def test_upload_raw_package(mock_upload, caplog, is_request_repo):
+def test_upload_raw_package(mock_upload, mock_invalidate, caplog, is_request_repo):
     """Check Nexus upload calls."""
     name = "name"
     path = "fakepath"
@@ -177,6 +347,10 @@ def test_upload_raw_package(mock_upload, caplog, is_request_repo):
     log_msg = f"Uploading {path!r} as a raw package to the {name!r} Nexus repository"
     assert log_msg in caplog.text
     mock_upload.assert_called_once_with(name, dest_dir, components, not is_request_repo)
+    if is_request_repo:
+        mock_invalidate.assert_not_called()
+    else:
+        mock_invalidate.assert_called_once_with(name, f"{dest_dir}/{filename}")
 
 
 @pytest.mark.parametrize(
@@ -23,6 +23,7 @@ from cachito.workers.errors import CachitoCalledProcessError
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.pkg_managers import gomod
 from cachito.workers.pkg_managers.gomod import (
+    ModuleTrie,
     _fail_unless_allowed,
     _get_allowed_local_deps,
     _merge_bundle_dirs,
@@ -1108,10 +1109,13 @@ def test_path_to_subpackage_not_a_subpackage():
             "github.com/foo/bar/baz",
         ),
         ("github.com/foo/bar", {"github.com/foo/bar": 1}, "github.com/foo/bar"),
+        ("github.com/foo/barbaz", ["github.com/foo/bar"], None),
+        ("github.com/foo", ["github.com/foo/bar"], None),
     ],
 )
 def test_match_parent_module(package_name, module_names, expect_parent_module):
     assert match_parent_module(package_name, module_names) == expect_parent_module
+    assert ModuleTrie(module_names).match_parent_module(package_name) == expect_parent_module
 
 
 @pytest.mark.parametrize(
@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import logging
 import re
+import threading
 from pathlib import Path
 from textwrap import dedent
 from unittest import mock
@@ -2415,7 +2416,7 @@ class TestDownload:
         )
 
         pypi_resp = self.mock_pypi_response(sdist_exists, sdist_not_yanked)
-        pypi_success = mock.Mock(text=pypi_resp)
+        pypi_success = mock.Mock(text=pypi_resp, status_code=200, headers={})
         pypi_fail = requests.RequestException("Something went wrong")
 
         mock_get.side_effect = [
@@ -2440,13 +2441,17 @@ class TestDownload:
                 "package": "aiowsgi",
                 "version": "0.7",
                 "path": tmp_path / "aiowsgi" / "aiowsgi-0.7.tar.gz",
+                "digests": mock_download_file.return_value,
             }
 
             proxied_file_url = (
                 "https://pypi-proxy.org/simple/aiowsgi/../../packages/aiowsgi-0.7.tar.gz"
             )
             mock_download_file.assert_called_once_with(
-                proxied_file_url, download_info["path"], auth=("user", "password")
+                proxied_file_url,
+                download_info["path"],
+                auth=("user", "password"),
+                hash_algorithms=[],
             )
         else:
             with pytest.raises((InvalidRequestData, NetworkError)) as exc_info:
@@ -2456,7 +2461,114 @@ class TestDownload:
             assert str(exc_info.value) == expect_error
 
         mock_get.assert_called_once_with(
-            "https://pypi-proxy.org/simple/aiowsgi/", auth=("user", "password")
+            "https://pypi-proxy.org/simple/aiowsgi/",
+            auth=("user", "password"),
+            headers={"Accept": pip.PYPI_SIMPLE_ACCEPT},
+        )
+
+    @mock.patch.object(general.pkg_requests_session, "get")
+    @mock.patch("cachito.workers.pkg_managers.general.download_binary_file")
+    def test_download_pypi_package_json_api(self, mock_download_file, mock_get, tmp_path):
+        """Test downloading of a single PyPI package using the JSON simple API."""
+        mock_requirement = self.mock_requirement(
+            "aiowsgi",
+            "pypi",
+            version_specs=[("==", "0.7")],
+            hashes=["sha256:abcdef", "md5:123456", "sha256:fedcba", "unknown:654321"],
+        )
+        mock_download_file.return_value = {"md5": "123456", "sha256": "abcdef"}
+        mock_get.return_value = mock.Mock(
+            status_code=200, headers={"Content-Type": "application/vnd.pypi.simple.v1+json"}
+        )
+        mock_get.return_value.json.return_value = {
+            "meta": {"api-version": "1.0"},
+            "name": "aiowsgi",
+            "files": [
+                {"filename": "aiowsgi-0.7.egg", "url": "../../packages/aiowsgi-0.7.egg"},
+                {
+                    "filename": "aiowsgi-0.7.zip",
+                    "url": "https://files.example.org/aiowsgi-0.7.zip",
+                    "yanked": False,
+                },
+                {
+                    "filename": "aiowsgi-0.7.tar.gz",
+                    "url": "https://files.example.org/aiowsgi-0.7.tar.gz",
+                    "yanked": "Broken release",
+                },
+                {"filename": "aiowsgi-0.8.tar.gz", "url": "../../packages/aiowsgi-0.8.tar.gz"},
+            ],
+        }
+
+        download_info = pip._download_pypi_package(
+            mock_requirement, tmp_path, "https://pypi-proxy.org/", ("user", "password")
+        )
+
+        assert download_info == {
+            "package": "aiowsgi",
+            "version": "0.7",
+            "path": tmp_path / "aiowsgi" / "aiowsgi-0.7.zip",
+            "digests": {"md5": "123456", "sha256": "abcdef"},
+        }
+        mock_download_file.assert_called_once_with(
+            "https://files.example.org/aiowsgi-0.7.zip",
+            download_info["path"],
+            auth=("user", "password"),
+            hash_algorithms=["md5", "sha256"],
+        )
+
+    @mock.patch("cachito.workers.pkg_managers.pip.get_worker_config")
+    @mock.patch.object(general.pkg_requests_session, "get")
+    def test_get_package_sdists_cached(self, mock_get, mock_config, tmp_path):
+        """Test that the processed package index is cached and revalidated."""
+        mock_config.return_value.cachito_pip_index_cache_dir = str(tmp_path)
+        package_url = "https://pypi-proxy.org/simple/aiowsgi/"
+        html = self.mock_pypi_response(sdist_exists=True, sdist_not_yanked=True)
+        expect_sdists = {
+            "0.7": [
+                {
+                    "name": "aiowsgi",
+                    "version": "0.7",
+                    "filename": "aiowsgi-0.7.tar.gz",
+                    "url": "../../packages/aiowsgi-0.7.tar.gz",
+                    "yanked": False,
+                }
+            ]
+        }
+        mock_get.side_effect = [
+            mock.Mock(status_code=200, text=html, headers={"ETag": '"v1"'}),
+            mock.Mock(status_code=304, headers={"ETag": '"v1"'}),
+        ]
+
+        assert pip._get_package_sdists(package_url, "aiowsgi", None) == expect_sdists
+        assert len(list(tmp_path.iterdir())) == 1
+        # The second lookup is served from the cache after revalidating it
+        assert pip._get_package_sdists(package_url, "aiowsgi", None) == expect_sdists
+
+        mock_get.assert_has_calls(
+            [
+                mock.call(package_url, auth=None, headers={"Accept": pip.PYPI_SIMPLE_ACCEPT}),
+                mock.call(
+                    package_url,
+                    auth=None,
+                    headers={"Accept": pip.PYPI_SIMPLE_ACCEPT, "If-None-Match": '"v1"'},
+                ),
+            ]
+        )
+
+    @mock.patch("cachito.workers.pkg_managers.pip.get_worker_config")
+    @mock.patch.object(general.pkg_requests_session, "get")
+    def test_get_package_sdists_corrupted_cache(self, mock_get, mock_config, tmp_path, caplog):
+        """Test that an unreadable cache file is ignored."""
+        mock_config.return_value.cachito_pip_index_cache_dir = str(tmp_path)
+        package_url = "https://pypi-proxy.org/simple/aiowsgi/"
+        pip._get_index_cache_path(package_url).write_text("{not json")
+        html = self.mock_pypi_response(sdist_exists=False, sdist_not_yanked=True)
+        mock_get.return_value = mock.Mock(status_code=200, text=html, headers={})
+
+        assert pip._get_package_sdists(package_url, "aiowsgi", None) == {}
+        assert "Ignoring the unreadable PyPI index cache" in caplog.text
+        mock_get.assert_called_once_with(
+            package_url, auth=None, headers={"Accept": pip.PYPI_SIMPLE_ACCEPT}
         )
 
     def test_process_package_links(self):
@@ -2618,10 +2730,10 @@ class TestDownload:
     @mock.patch("cachito.workers.pkg_managers.pip.nexus.get_raw_component_asset_url")
     @mock.patch("cachito.workers.pkg_managers.general.download_binary_file")
     @mock.patch("cachito.workers.pkg_managers.pip.Git")
-    @mock.patch("shutil.copy")
+    @mock.patch("cachito.workers.pkg_managers.pip.link_or_copy")
     def test_download_vcs_package(
         self,
-        mock_shutil_copy,
+        mock_link_or_copy,
         mock_git,
         mock_download_file,
         mock_get_component_url,
@@ -2670,16 +2782,16 @@ class TestDownload:
         if have_raw_component:
             assert f"Found raw component, will download from '{raw_url}'" in caplog.text
             mock_download_file.assert_called_once_with(
-                raw_url, download_path, auth=("username", "password")
+                raw_url, download_path, auth=("username", "password"), hash_algorithms=()
             )
             mock_git.assert_not_called()
-            mock_shutil_copy.assert_not_called()
+            mock_link_or_copy.assert_not_called()
         else:
             assert "Raw component not found, will fetch from git" in caplog.text
             mock_download_file.assert_not_called()
             mock_git.assert_called_once_with("https://github.com/spam/eggs", GIT_REF)
             mock_git.return_value.fetch_source.assert_called_once_with(gitsubmodule=False)
-            mock_shutil_copy.assert_called_once_with(git_archive_path, download_path)
+            mock_link_or_copy.assert_called_once_with(git_archive_path, download_path)
 
     @pytest.mark.parametrize("have_raw_component", [True, False])
     @pytest.mark.parametrize("hash_as_qualifier", [True, False])
@@ -2747,6 +2859,7 @@ class TestDownload:
             "url_with_hash": url_with_hash,
             "raw_component_name": raw_component,
             "have_raw_component": have_raw_component,
+            "digests": mock_download_file.return_value,
         }
 
         download_path = download_info["path"]
@@ -2756,12 +2869,12 @@ class TestDownload:
         if have_raw_component:
             assert f"Found raw component, will download from '{raw_url}'" in caplog.text
             mock_download_file.assert_called_once_with(
-                raw_url, download_path, auth=("username", "password")
+                raw_url, download_path, auth=("username", "password"), hash_algorithms=["sha256"]
             )
         else:
             assert f"Raw component not found, will download from '{original_url}'" in caplog.text
             mock_download_file.assert_called_once_with(
-                original_url, download_path, insecure=host_is_trusted
+                original_url, download_path, insecure=host_is_trusted, hash_algorithms=["sha256"]
             )
 
     @pytest.mark.parametrize(
@@ -3062,7 +3175,12 @@ class TestDownload:
         )
         url_download = pip_deps / "external-bar" / "bar-external-sha256-654321.tar.gz"
 
-        pypi_info = {"package": "foo", "version": "1.0", "path": pypi_download}
+        pypi_info = {
+            "package": "foo",
+            "version": "1.0",
+            "path": pypi_download,
+            "digests": {"sha256": "abcdef"},
+        }
         vcs_info = {
             "package": "eggs",
             "path": vcs_download,
@@ -3078,11 +3196,14 @@ class TestDownload:
             "path": url_download,
             "raw_component_name": "bar/bar-external-sha256-654321.tar.gz",
             "have_raw_component": have_url_raw_component,
+            "digests": {"sha256": "654321"},
         }
 
         mock_request_bundle_dir.return_value = mock_bundle_dir
         mock_get_config.return_value = mock.Mock(
-            cachito_nexus_pypi_proxy_url=proxy_url, cachito_nexus_pip_raw_repo_name=raw_repo
+            cachito_download_concurrency=2,
+            cachito_nexus_pypi_proxy_url=proxy_url,
+            cachito_nexus_pip_raw_repo_name=raw_repo,
         )
         mock_get_nexus_creds.return_value = ("username", "password")
         mock_pypi_download.return_value = pypi_info
@@ -3113,15 +3234,23 @@ class TestDownload:
 
         # <check calls to checksum verification method>
         verify_url_checksum_call = mock.call(
-            str(url_download), general.ChecksumInfo("sha256", "654321")
+            str(url_download),
+            general.ChecksumInfo("sha256", "654321"),
+            digests=url_info["digests"],
         )
         if use_hashes:
             msg = "At least one dependency uses the --hash option, will require hashes"
             assert msg in caplog.text
 
             verify_checksum_calls = [
-                mock.call(str(pypi_download), general.ChecksumInfo("sha256", "abcdef")),
-                mock.call(str(vcs_download), general.ChecksumInfo("sha256", "123456")),
+                mock.call(
+                    str(pypi_download),
+                    general.ChecksumInfo("sha256", "abcdef"),
+                    digests=pypi_info["digests"],
+                ),
+                mock.call(
+                    str(vcs_download), general.ChecksumInfo("sha256", "123456"), digests=None
+                ),
                 verify_url_checksum_call,
             ]
         else:
@@ -3133,7 +3262,7 @@ class TestDownload:
             # Hashes for URL dependencies should be verified no matter what
             verify_checksum_calls = [verify_url_checksum_call]
 
-        mock_verify_checksum.assert_has_calls(verify_checksum_calls)
+        mock_verify_checksum.assert_has_calls(verify_checksum_calls, any_order=True)
         assert mock_verify_checksum.call_count == len(verify_checksum_calls)
 
         if use_hashes:
@@ -3196,6 +3325,59 @@ class TestDownload:
         ) in caplog.text
         # </check basic logging output>
 
+    @pytest.mark.parametrize("fail_on", [None, "bar", "baz"])
+    @mock.patch("cachito.workers.pkg_managers.pip.RequestBundleDir")
+    @mock.patch("cachito.workers.pkg_managers.pip.get_worker_config")
+    @mock.patch("cachito.workers.pkg_managers.pip.nexus.get_nexus_hoster_credentials")
+    @mock.patch("cachito.workers.pkg_managers.pip._download_pypi_package")
+    @mock.patch("cachito.workers.pkg_managers.pip.check_metadata_in_sdist")
+    def test_download_dependencies_concurrently(
+        self,
+        mock_check_metadata,
+        mock_pypi_download,
+        mock_get_nexus_creds,
+        mock_get_config,
+        mock_request_bundle_dir,
+        fail_on,
+        tmp_path,
+    ):
+        """Test that the downloads are reported in order, no matter when they finish."""
+        names = ["foo", "bar", "baz", "spam"]
+        requirements = [
+            self.mock_requirement(name, "pypi", download_line=f"{name}==1.0") for name in names
+        ]
+        req_file = self.mock_requirements_file(requirements=requirements)
+
+        mock_bundle_dir = MockBundleDir(tmp_path)
+        mock_request_bundle_dir.return_value = mock_bundle_dir
+        mock_get_config.return_value = mock.Mock(
+            cachito_download_concurrency=len(names),
+            cachito_nexus_pypi_proxy_url="https://pypi-proxy.example.org",
+            cachito_nexus_pip_raw_repo_name="cachito-pip-raw",
+        )
+        mock_get_nexus_creds.return_value = ("username", "password")
+
+        # Every download waits until all of them are running, which only works if they run
+        # concurrently
+        all_started = threading.Barrier(len(names), timeout=10)
+
+        def download(req, *args):
+            all_started.wait()
+            if req.package == fail_on:
+                raise NetworkError(f"Could not download {req.package}")
+            path = mock_bundle_dir.pip_deps_dir / req.package / f"{req.package}-1.0.tar.gz"
+            return {"package": req.package, "version": "1.0", "path": path}
+
+        mock_pypi_download.side_effect = download
+
+        if fail_on:
+            with pytest.raises(NetworkError, match=f"Could not download {fail_on}"):
+                pip.download_dependencies(1, req_file)
+        else:
+            downloads = pip.download_dependencies(1, req_file)
+            assert [d["package"] for d in downloads] == names
+            assert mock_check_metadata.call_count == len(names)
+
     @pytest.mark.parametrize(
         "hashes, success",
         [
@@ -3232,7 +3414,7 @@ class TestDownload:
             num_calls = num_fails = len(hashes)
 
         calls = [
-            mock.call(str(path), general.ChecksumInfo(*hash_spec.split(":", 1)))
+            mock.call(str(path), general.ChecksumInfo(*hash_spec.split(":", 1)), digests=None)
             for hash_spec in hashes[:num_calls]
         ]
         mock_verify_checksum.assert_has_calls(calls)
@@ -3538,10 +3720,20 @@ def test_resolve_pip(mock_download, mock_metadata, mock_upload, tmp_path, custom
     req_file.write_text("bar==2.1")
     build_req_file.write_text("baz==0.0.5")
     mock_metadata.return_value = ("foo", "1.0")
-    mock_download.side_effect = [
-        [{"kind": "pypi", "path": "some/path", "package": "bar", "version": "2.1"}],
-        [{"kind": "pypi", "path": "another/path", "package": "baz", "version": "0.0.5"}],
-    ]
+    downloads = iter(
+        [
+            [{"kind": "pypi", "path": "some/path", "package": "bar", "version": "2.1"}],
+            [{"kind": "pypi", "path": "another/path", "package": "baz", "version": "0.0.5"}],
+        ]
+    )
+    events = []
+
+    def download(request_id, requirements_file):
+        events.append("download")
+        return next(downloads)
+
+    mock_download.side_effect = download
+    mock_upload.side_effect = lambda *args: events.append("upload")
     request = {"id": 1}
     if custom_requirements:
         pkg_info = pip.resolve_pip(
@@ -3557,9 +3749,12 @@ def test_resolve_pip(mock_download, mock_metadata, mock_upload, tmp_path, custom
         [
             mock.call("cachito-pip-hosted-1", "some/path"),
             mock.call("cachito-pip-hosted-1", "another/path"),
-        ]
+        ],
+        any_order=True,
     )
     assert mock_upload.call_count == 2
+    # Nothing is uploaded until all the dependencies are downloaded
+    assert events == ["download", "download", "upload", "upload"]
     expected = {
         "package": {"name": "foo", "version": "1.0", "type": "pip"},
         "dependencies": [
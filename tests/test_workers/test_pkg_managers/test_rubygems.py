@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import logging
+import threading
 from pathlib import Path
 from textwrap import dedent
 from unittest import mock
@@ -7,7 +8,7 @@ from unittest import mock
 import pytest
 import requests
 
-from cachito.errors import NexusError, ValidationError
+from cachito.errors import NetworkError, NexusError, ValidationError
 from cachito.workers.errors import NexusScriptError, UploadError
 from cachito.workers.pkg_managers import general, rubygems
 from cachito.workers.pkg_managers.rubygems import GemMetadata, parse_gemlock
@@ -474,10 +475,10 @@ class TestDownload:
     @mock.patch("cachito.workers.pkg_managers.rubygems.nexus.get_raw_component_asset_url")
     @mock.patch("cachito.workers.pkg_managers.general.download_binary_file")
     @mock.patch("cachito.workers.pkg_managers.rubygems.Git")
-    @mock.patch("shutil.copy")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.link_or_copy")
     def test_download_git_package(
         self,
-        mock_shutil_copy,
+        mock_link_or_copy,
         mock_git,
         mock_download_file,
         mock_get_component_url,
@@ -519,16 +520,16 @@ class TestDownload:
         if have_raw_component:
             assert f"Found raw component, will download from '{raw_url}'" in caplog.text
             mock_download_file.assert_called_once_with(
-                raw_url, download_info["path"], auth=("username", "password")
+                raw_url, download_info["path"], auth=("username", "password"), hash_algorithms=()
             )
             mock_git.assert_not_called()
-            mock_shutil_copy.assert_not_called()
+            mock_link_or_copy.assert_not_called()
         else:
             assert "Raw component not found, will fetch from git" in caplog.text
             mock_download_file.assert_not_called()
             mock_git.assert_called_once_with("https://github.com/org/json.git", GIT_REF)
             mock_git.return_value.fetch_source.assert_called_once_with(gitsubmodule=False)
-            mock_shutil_copy.assert_called_once_with(git_archive_path, download_info["path"])
+            mock_link_or_copy.assert_called_once_with(git_archive_path, download_info["path"])
 
     @pytest.mark.parametrize("have_raw_component", [True, False])
     @mock.patch("cachito.workers.pkg_managers.rubygems.RequestBundleDir")
@@ -589,6 +590,7 @@ class TestDownload:
         proxy_url = "https://proxy-rubygems.org/"
         raw_repo = "cachito_rubygems_raw"
         mock_get_config.return_value = mock.Mock(
+            cachito_download_concurrency=2,
             cachito_nexus_rubygems_proxy_url=proxy_url,
             cachito_nexus_rubygems_raw_repo_name=raw_repo,
         )
@@ -652,9 +654,126 @@ class TestDownload:
             f"to deps/rubygems/github.com/baz/bar/"
             f"bar-external-gitcommit-{GIT_REF}.tar.gz"
         ) in caplog.text
+        # The PATH dependency is not downloaded, so it is not counted
+        assert "(2/2)" in caplog.text
         # </check basic logging output>
         # </verify>
 
+    @pytest.mark.parametrize("fail_on", [None, "bar", "baz"])
+    @mock.patch("cachito.workers.pkg_managers.rubygems.RequestBundleDir")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.get_worker_config")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.nexus.get_nexus_hoster_credentials")
+    @mock.patch("cachito.workers.pkg_managers.rubygems._download_rubygems_package")
+    def test_download_dependencies_concurrently(
+        self,
+        mock_rubygems_download,
+        mock_get_nexus_creds,
+        mock_get_config,
+        mock_request_bundle_dir,
+        fail_on,
+        tmp_path,
+        caplog,
+    ):
+        """Test that the downloads are reported in order, no matter when they finish."""
+        names = ["foo", "bar", "baz", "spam"]
+        dependencies = [
+            GemMetadata(name, "1.0.0", "GEM", "https://rubygems.org/") for name in names
+        ]
+
+        mock_bundle_dir = MockBundleDir(tmp_path)
+        mock_request_bundle_dir.return_value = mock_bundle_dir
+        mock_get_config.return_value = mock.Mock(
+            cachito_download_concurrency=len(names),
+            cachito_nexus_rubygems_proxy_url="https://proxy-rubygems.org/",
+            cachito_nexus_rubygems_raw_repo_name="cachito-rubygems-raw",
+        )
+        mock_get_nexus_creds.return_value = ("username", "password")
+
+        # Every download waits until all of them are running, which only works if they run
+        # concurrently
+        all_started = threading.Barrier(len(names), timeout=10)
+
+        def download(gem, *args):
+            all_started.wait()
+            if gem.name == fail_on:
+                raise NetworkError(f"Could not download {gem.name}")
+            path = mock_bundle_dir.rubygems_deps_dir / gem.name / f"{gem.name}-1.0.0.gem"
+            return {"name": gem.name, "version": "1.0.0", "path": path}
+
+        mock_rubygems_download.side_effect = download
+
+        if fail_on:
+            with pytest.raises(NetworkError, match=f"Could not download {fail_on}"):
+                rubygems.download_dependencies(1, dependencies, mock_bundle_dir.source_root_dir)
+        else:
+            downloads = rubygems.download_dependencies(
+                1, dependencies, mock_bundle_dir.source_root_dir
+            )
+            assert [d["name"] for d in downloads] == names
+            assert f"({len(names)}/{len(names)})" in caplog.text
+
+    @mock.patch("cachito.workers.pkg_managers.rubygems.RequestBundleDir")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.get_worker_config")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.nexus.get_nexus_hoster_credentials")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.nexus.raw_component_cache.fill")
+    @mock.patch("cachito.workers.pkg_managers.rubygems._download_git_package")
+    @mock.patch("cachito.workers.pkg_managers.rubygems.upload_raw_package")
+    def test_download_dependencies_same_git_source(
+        self,
+        mock_upload_raw,
+        mock_git_download,
+        mock_fill_cache,
+        mock_get_nexus_creds,
+        mock_get_config,
+        mock_request_bundle_dir,
+        tmp_path,
+        caplog,
+    ):
+        """Test that the gems from the same git repository and revision share one archive."""
+        git_url = "https://github.com/baz/monorepo.git"
+        dependencies = [
+            GemMetadata("bar", GIT_REF, "GIT", git_url),
+            GemMetadata("baz", GIT_REF, "GIT", git_url),
+            GemMetadata("spam", GIT_REF, "GIT", "https://github.com/baz/spam.git"),
+        ]
+
+        mock_bundle_dir = MockBundleDir(tmp_path)
+        mock_request_bundle_dir.return_value = mock_bundle_dir
+        raw_repo = "cachito_rubygems_raw"
+        mock_get_config.return_value = mock.Mock(
+            cachito_download_concurrency=3,
+            cachito_nexus_rubygems_proxy_url="https://proxy-rubygems.org/",
+            cachito_nexus_rubygems_raw_repo_name=raw_repo,
+        )
+        mock_get_nexus_creds.return_value = ("username", "password")
+
+        def download(gem, *args):
+            repo = gem.source.rsplit("/", 1)[1][: -len(".git")]
+            archive_name = f"{repo}-external-gitcommit-{GIT_REF}.tar.gz"
+            return {
+                "name": gem.name,
+                "path": mock_bundle_dir.rubygems_deps_dir.joinpath(
+                    "github.com", "baz", repo, archive_name
+                ),
+                "version": f"git+{gem.source}@{GIT_REF}",
+                "raw_component_name": f"{repo}/{archive_name}",
+                "have_raw_component": False,
+            }
+
+        mock_git_download.side_effect = download
+
+        downloads = rubygems.download_dependencies(1, dependencies, mock_bundle_dir.source_root_dir)
+
+        assert [d["name"] for d in downloads] == ["bar", "baz", "spam"]
+        assert downloads[1] == {**downloads[0], "name": "baz"}
+        # Each archive is downloaded and uploaded once
+        assert sorted(c.args[0].name for c in mock_git_download.call_args_list) == ["bar", "spam"]
+        assert sorted(c.args[3] for c in mock_upload_raw.call_args_list) == [
+            f"monorepo-external-gitcommit-{GIT_REF}.tar.gz",
+            f"spam-external-gitcommit-{GIT_REF}.tar.gz",
+        ]
+        assert "(2/2)" in caplog.text
+
 
 def test_get_path_package_info(tmp_path):
     bundle_dir = MockBundleDir(tmp_path)
@@ -13,6 +13,7 @@ import pytest
 from requests import Timeout
 
 from cachito.common.checksum import hash_file
+from cachito.common.packages_data import PackagesData
 from cachito.errors import (
     FileAccessError,
     InvalidRequestData,
@@ -23,7 +24,7 @@ from cachito.errors import (
 from cachito.workers import tasks
 from cachito.workers.paths import RequestBundleDir, SourcesDir
 from cachito.workers.tasks.general import _enforce_sandbox, save_bundle_archive_checksum
-from tests.helper_utils import Symlink, write_file_tree
+from tests.helper_utils import Symlink, load_packages_data, write_file_tree
 
 
 @pytest.mark.parametrize("gitsubmodule", [True, False])
@@ -143,18 +144,27 @@ def test_failed_request_callback_unknown_error(mock_set_request_state):
     )
 
 
+@pytest.mark.parametrize("component_archives", (True, False))
 @pytest.mark.parametrize("deps_present", (True, False))
 @pytest.mark.parametrize("include_git_dir", (True, False))
+@mock.patch("cachito.workers.tasks.general.get_worker_config")
 @mock.patch("cachito.workers.tasks.general.set_request_state")
 @mock.patch("cachito.workers.paths.get_worker_config")
 def test_create_bundle_archive(
-    mock_gwc, mock_set_request_state, deps_present, include_git_dir, tmpdir
+    mock_gwc,
+    mock_set_request_state,
+    mock_general_gwc,
+    deps_present,
+    include_git_dir,
+    component_archives,
+    tmpdir,
 ):
     flags = ["include-git-dir"] if include_git_dir else []
 
     # Make the bundles and sources dir configs point to under the pytest managed temp dir
     bundles_dir = tmpdir.mkdir("bundles")
     mock_gwc.return_value.cachito_bundles_dir = str(bundles_dir)
+    mock_general_gwc.return_value.cachito_bundle_component_archives = component_archives
     request_id = 3
     request_bundle_dir = bundles_dir.mkdir("temp").mkdir(str(request_id))
 
@@ -210,12 +220,66 @@ def test_create_bundle_archive(
         expected |= set(deps_archive_contents.keys())
 
     assert bundle_contents == expected
+
+    # The component archives together have the same contents as the bundle archive
+    components_dir = bundles_dir.join(f"{request_id}-components")
+    if component_archives:
+        component_contents = {}
+        for component in ("app", "deps/gomod"):
+            component_archive_path = components_dir.join(f"{component}.tar.gz")
+            if component == "deps/gomod" and not deps_present:
+                assert not component_archive_path.exists()
+                continue
+            with tarfile.open(component_archive_path, mode="r:*") as component_archive:
+                component_contents[component] = {
+                    path
+                    for path in component_archive.getnames()
+                    if pathlib.Path(path).suffix in (".go", ".zip")
+                    or os.path.basename(path) == ".git"
+                }
+        assert set().union(*component_contents.values()) == expected
+        assert all(path.startswith("app/") for path in component_contents["app"])
+    else:
+        assert not components_dir.exists()
+
     assert mock_set_request_state.call_count == 1
     mock_set_request_state.assert_called_once_with(
         request_id, "in_progress", "Assembling the bundle archive"
     )
 
 
+@mock.patch("cachito.workers.paths.get_worker_config")
+def test_create_bundle_component_archives_again(mock_gwc, tmp_path):
+    mock_gwc.return_value.cachito_bundles_dir = str(tmp_path)
+    bundle_dir = RequestBundleDir(3)
+    bundle_dir.source_dir.mkdir(parents=True)
+    bundle_dir.source_dir.joinpath("main.go").write_text("package main")
+    bundle_dir.deps_dir.joinpath("gomod").mkdir(parents=True)
+    components_dir = bundle_dir.bundle_components_dir
+    components_dir.joinpath("deps").mkdir(parents=True)
+    stale_archive = bundle_dir.component_archive_file("deps/npm")
+    stale_archive.write_bytes(b"old archive")
+    app_archive = bundle_dir.component_archive_file("app")
+    app_archive.write_bytes(b"old archive")
+
+    # The existing archives are kept if an archive can't be created
+    with mock.patch("tarfile.TarFile.add", side_effect=OSError("disk full")):
+        with pytest.raises(OSError, match="disk full"):
+            tasks.create_bundle_component_archives(bundle_dir)
+    assert app_archive.read_bytes() == b"old archive"
+    assert stale_archive.read_bytes() == b"old archive"
+    assert not list(components_dir.rglob("*.tmp"))
+
+    tasks.create_bundle_component_archives(bundle_dir)
+
+    with tarfile.open(app_archive, mode="r:*") as archive:
+        assert archive.getnames() == ["app/main.go"]
+    # The archives of the package managers which are no longer used are removed
+    assert sorted(path.name for path in components_dir.joinpath("deps").iterdir()) == [
+        "gomod.tar.gz"
+    ]
+
+
 GOMOD_PKG1 = {
     "name": "pkg1",
     "version": "1.0",
@@ -273,29 +337,37 @@ def test_aggregate_packages_data(
         with open(data_file, "w", encoding="utf-8") as f:
             json.dump(data, f)
 
-    tasks.aggregate_packages_data(request_id, list(packages_data.keys()))
+    counts = tasks.aggregate_packages_data(request_id, list(packages_data.keys()))
 
     set_request_state.assert_called_once_with(
         request_id, "in_progress", "Aggregating packages data"
     )
 
-    with open(bundle_dir.packages_data, "r", encoding="utf-8") as f:
-        assert expected == json.load(f)
+    assert expected == load_packages_data(bundle_dir.packages_data)
+    aggregated_data = PackagesData()
+    aggregated_data.load(bundle_dir.packages_data)
+    assert counts == (aggregated_data.packages_count, aggregated_data.dependencies_count)
 
 
+@mock.patch("cachito.workers.tasks.general.hash_file")
 @mock.patch("cachito.workers.tasks.general.get_request")
 @mock.patch("cachito.workers.tasks.general.create_bundle_archive")
 @mock.patch("cachito.workers.tasks.general.aggregate_packages_data")
 @mock.patch("cachito.workers.tasks.general.set_packages_and_deps_counts")
 @mock.patch("cachito.workers.tasks.general.save_bundle_archive_checksum")
+@mock.patch("cachito.workers.paths.get_worker_config")
 def test_process_fetched_sources(
+    mock_gwc,
     mock_save_bundle_archive_checksum,
     mock_set_counts,
     mock_aggregate_data,
     mock_create_archive,
     mock_get_request,
+    mock_hash_file,
     task_passes_state_check,
+    tmp_path,
 ):
+    mock_gwc.return_value.cachito_bundles_dir = str(tmp_path)
     pkg = {"name": "foo", "version": "1.0", "type": "pip"}
     mock_get_request.return_value = {
         "flags": ["some-flag"],
@@ -304,65 +376,86 @@ def test_process_fetched_sources(
         "dependencies": [pkg, pkg],
     }
 
-    mock_aggregate_data.return_value = mock.Mock(packages=[pkg], all_dependencies=[pkg, pkg])
+    mock_aggregate_data.return_value = (1, 2)
+    mock_hash_file.return_value.hexdigest.return_value = "abc123"
 
-    tasks.process_fetched_sources(42)
+    assert tasks.process_fetched_sources(42) == (1, 2, "abc123")
 
     mock_get_request.assert_called_once_with(42)
     mock_create_archive.assert_called_once_with(42, ["some-flag"])
     mock_save_bundle_archive_checksum.assert_called_once_with(42)
     mock_aggregate_data.assert_called_once_with(42, ["pip"])
     mock_set_counts.assert_called_once_with(42, 1, 2)
+    mock_hash_file.assert_called_once_with(tmp_path / "42-packages.json")
 
 
-@mock.patch("cachito.workers.tasks.general.get_request_packages_and_dependencies")
+@mock.patch("cachito.workers.tasks.general.verify_request_packages_data")
 @mock.patch("cachito.workers.tasks.general.set_request_state")
-@pytest.mark.parametrize("expected_counts,raise_error", [[(1, 2), False], [(2, 3), True]])
+@pytest.mark.parametrize("errors", [[], ["The checksum of the packages file is abc"]])
 def test_finalize_request(
     mock_set_state,
-    mock_get_request_packages_and_dependencies,
+    mock_verify_request_packages_data,
     task_passes_state_check,
-    expected_counts,
-    raise_error,
+    errors,
 ):
     request_id = 42
-    pkg = {"name": "foo", "version": "1.0", "type": "pip"}
-    packages_data = {
-        "packages": [pkg],
-        "dependencies": [pkg, pkg],
-    }
+    mock_verify_request_packages_data.return_value = {"verified": not errors, "errors": errors}
 
     error_message = f"Error checking packages data for request {request_id}."
 
-    with raise_error and pytest.raises(InvalidRequestData, match=error_message) or nullcontext():
-        mock_get_request_packages_and_dependencies.return_value = packages_data
-        tasks.finalize_request(expected_counts, request_id)
+    with errors and pytest.raises(InvalidRequestData, match=error_message) or nullcontext():
+        tasks.finalize_request((1, 2, "def456"), request_id)
 
-    mock_get_request_packages_and_dependencies.assert_called_once_with(request_id)
+    mock_verify_request_packages_data.assert_called_once_with(request_id, "def456", 1, 2)
 
-    if not raise_error:
+    if not errors:
         mock_set_state.assert_called_once_with(request_id, "complete", "Completed successfully")
+    else:
+        mock_set_state.assert_not_called()
+
+
+@mock.patch("cachito.workers.tasks.general.hash_file")
+@mock.patch("cachito.workers.tasks.general.verify_request_packages_data")
+@mock.patch("cachito.workers.tasks.general.set_request_state")
+@mock.patch("cachito.workers.paths.get_worker_config")
+def test_finalize_request_without_checksum(
+    mock_gwc,
+    mock_set_state,
+    mock_verify_request_packages_data,
+    mock_hash_file,
+    task_passes_state_check,
+    tmp_path,
+):
+    mock_gwc.return_value.cachito_bundles_dir = str(tmp_path)
+    mock_verify_request_packages_data.return_value = {"verified": True, "errors": []}
+    mock_hash_file.return_value.hexdigest.return_value = "def456"
+
+    tasks.finalize_request((1, 2), 42)
+
+    mock_hash_file.assert_called_once_with(tmp_path / "42-packages.json")
+    mock_verify_request_packages_data.assert_called_once_with(42, "def456", 1, 2)
+    mock_set_state.assert_called_once_with(42, "complete", "Completed successfully")
 
 
-@mock.patch("cachito.workers.tasks.general.get_request_packages_and_dependencies")
+@mock.patch("cachito.workers.tasks.general.verify_request_packages_data")
 @mock.patch("cachito.workers.tasks.general.set_request_state")
 def test_finalize_request_with_error_when_fetching_api(
     mock_set_state,
-    mock_get_request_packages_and_dependencies,
+    mock_verify_request_packages_data,
     task_passes_state_check,
 ):
     request_id = 42
-    error_message = f"Packages file could not be loaded for request {request_id}"
+    error_message = f"Failed to verify the packages file of request {request_id}"
 
     def side_effect(*args):
         raise NetworkError(error_message)
 
-    mock_get_request_packages_and_dependencies.side_effect = side_effect
+    mock_verify_request_packages_data.side_effect = side_effect
 
     with pytest.raises(NetworkError, match=error_message):
-        tasks.finalize_request((1, 2), request_id)
+        tasks.finalize_request((1, 2, "def456"), request_id)
 
-    mock_get_request_packages_and_dependencies.assert_called_once_with(42)
+    mock_verify_request_packages_data.assert_called_once_with(42, "def456", 1, 2)
     mock_set_state.assert_not_called()
 
 
@@ -1,8 +1,8 @@
-import json
 from unittest import mock
 
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.tasks import gitsubmodule
+from tests.helper_utils import load_packages_data
 
 url = "https://github.com/release-engineering/retrodep.git"
 ref = "c50b93a32df1c9d700e3e80996845bc2e13be848"
@@ -32,6 +32,4 @@ def test_add_git_submodules_as_package(
     expected = package.copy()
     expected["path"] = "tour"
     expected["dependencies"] = []
-    assert {"packages": [expected]} == json.loads(
-        bundle_dir.git_submodule_packages_data.read_bytes()
-    )
+    assert {"packages": [expected]} == load_packages_data(bundle_dir.git_submodule_packages_data)
@@ -1,6 +1,5 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import copy
-import json
 from pathlib import Path
 from unittest import mock
 
@@ -10,6 +9,7 @@ from cachito.common.packages_data import PackagesData
 from cachito.errors import FileAccessError, UnsupportedFeature
 from cachito.workers import tasks
 from cachito.workers.tasks import gomod
+from tests.helper_utils import load_packages_data
 
 
 @pytest.mark.parametrize(
@@ -199,8 +199,8 @@ def test_fetch_gomod_source(
             packages_data.add_package(pkg_info, path, package.get("pkg_deps", []))
 
     packages_data.sort()
-    assert {"packages": packages_data._packages} == json.loads(
-        mock_bundle_dir.return_value.gomod_packages_data.read_bytes()
+    assert {"packages": packages_data.packages} == load_packages_data(
+        mock_bundle_dir.return_value.gomod_packages_data
     )
 
 
@@ -1,5 +1,4 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
-import json
 import os
 from unittest import mock
 
@@ -9,6 +8,7 @@ from cachito.common.paths import RequestBundleDir as BaseRequestBundleDir
 from cachito.errors import FileAccessError, InvalidRepoStructure
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.tasks import npm
+from tests.helper_utils import load_packages_data
 
 
 def test_verify_npm_files(tmpdir):
@@ -202,7 +202,7 @@ def test_fetch_npm_source(
     pkg_info["dependencies"] = deps
     if package_subpath and package_subpath != os.curdir:
         pkg_info["path"] = package_subpath
-    assert {"packages": [pkg_info]} == json.loads(bundle_dir.npm_packages_data.read_bytes())
+    assert {"packages": [pkg_info]} == load_packages_data(bundle_dir.npm_packages_data)
 
 
 @mock.patch("cachito.workers.tasks.npm.RequestBundleDir")
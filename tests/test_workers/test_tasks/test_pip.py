@@ -1,6 +1,5 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import base64
-import json
 import os
 from unittest import mock
 
@@ -10,6 +9,7 @@ from cachito.errors import NexusError
 from cachito.workers.config import get_worker_config
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.tasks import pip
+from tests.helper_utils import load_packages_data
 
 
 @mock.patch("cachito.workers.tasks.pip.nexus.execute_script")
@@ -122,9 +122,7 @@ def test_fetch_pip_source(
     expected["dependencies"] = pkg_data["dependencies"]
     if package_subpath and package_subpath != os.curdir:
         expected["path"] = package_subpath
-    assert {"packages": [expected]} == json.loads(
-        RequestBundleDir(1).pip_packages_data.read_bytes()
-    )
+    assert {"packages": [expected]} == load_packages_data(RequestBundleDir(1).pip_packages_data)
 
 
 @pytest.mark.parametrize(
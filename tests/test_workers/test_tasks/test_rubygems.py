@@ -1,6 +1,5 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 import base64
-import json
 import os
 from pathlib import Path
 from textwrap import dedent
@@ -12,6 +11,7 @@ import pytest
 from cachito.errors import CachitoError
 from cachito.workers.paths import RequestBundleDir
 from cachito.workers.tasks import rubygems
+from tests.helper_utils import load_packages_data
 
 
 @mock.patch("cachito.workers.tasks.rubygems.nexus.execute_script")
@@ -187,8 +187,8 @@ def test_fetch_rubygems_source(
     expected["dependencies"] = expected_dependencies
     if not package_subpath or package_subpath == os.curdir:
         del expected["path"]
-    assert {"packages": [expected]} == json.loads(
-        RequestBundleDir(1).rubygems_packages_data.read_bytes()
+    assert {"packages": [expected]} == load_packages_data(
+        RequestBundleDir(1).rubygems_packages_data
     )
 
 
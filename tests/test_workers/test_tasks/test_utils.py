@@ -128,6 +128,58 @@ def test_get_request(mock_get_request_or_fail):
     )
 
 
+@mock.patch("cachito.workers.tasks.utils.get_request_state")
+@mock.patch("cachito.workers.tasks.utils._get_request_or_fail")
+def test_get_request_snapshot(mock_get_request_or_fail, mock_get_state):
+    mock_get_state.return_value = "in_progress"
+    mock_get_request_or_fail.side_effect = lambda request_id, **kwargs: {
+        "id": request_id,
+        "flags": [],
+    }
+
+    @utils.runs_if_request_in_progress
+    def nested_task(request_id):
+        return utils.get_request(request_id)
+
+    @utils.runs_if_request_in_progress
+    def dummy_task(request_id):
+        request = utils.get_request(request_id)
+        # Changing the returned request doesn't change the snapshot
+        request["flags"].append("some-flag")
+        assert utils.get_request(request_id) == {"id": request_id, "flags": []}
+        assert nested_task(request_id) == {"id": request_id, "flags": []}
+        assert utils.get_request(43) == {"id": 43, "flags": []}
+        return 42
+
+    assert dummy_task(42) == 42
+    assert mock_get_request_or_fail.call_count == 2
+
+    # The snapshots are only used while a task runs
+    mock_get_request_or_fail.reset_mock()
+    assert dummy_task(42) == 42
+    utils.get_request(42)
+    utils.get_request(42)
+    assert mock_get_request_or_fail.call_count == 4
+
+
+@mock.patch("cachito.workers.tasks.utils.get_request_state")
+@mock.patch("cachito.workers.tasks.utils._get_request_or_fail")
+def test_get_request_snapshot_task_fails(mock_get_request_or_fail, mock_get_state):
+    mock_get_state.return_value = "in_progress"
+    mock_get_request_or_fail.return_value = {"id": 42}
+
+    @utils.runs_if_request_in_progress
+    def dummy_task(request_id):
+        utils.get_request(request_id)
+        raise ValueError("Something went wrong")
+
+    with pytest.raises(ValueError, match="Something went wrong"):
+        dummy_task(42)
+
+    utils.get_request(42)
+    assert mock_get_request_or_fail.call_count == 2
+
+
 @pytest.mark.parametrize("id, state", [(2, "stale"), (3, "complete"), (1, "in-progress")])
 @mock.patch("cachito.workers.tasks.utils._get_request_or_fail")
 def test_get_request_state(mock_get_request_or_fail, id, state):
@@ -138,6 +190,7 @@ def test_get_request_state(mock_get_request_or_fail, id, state):
         id,
         connect_error_msg=f"The connection failed while getting the state of request {id}: {{exc}}",
         status_error_msg=f"Failed to get the state of request {id}: {{exc}}",
+        endpoint="state",
     )
 
 
@@ -182,6 +235,135 @@ def test_set_packages_and_deps_counts(
     )
 
 
+@pytest.mark.parametrize(
+    "error, expected_error",
+    [
+        (None, None),
+        (
+            requests.ConnectionError("connection failed"),
+            "The connection failed while verifying the packages file of request 42",
+        ),
+        (requests.HTTPError("404 Not Found"), "Failed to verify the packages file of request 42"),
+    ],
+)
+@mock.patch.object(requests_auth_session, "post")
+def test_verify_request_packages_data(mock_post, error, expected_error):
+    mock_post.return_value.raise_for_status.side_effect = error
+    mock_post.return_value.json.return_value = {"verified": True, "errors": []}
+
+    if expected_error:
+        with pytest.raises(NetworkError, match=expected_error):
+            utils.verify_request_packages_data(42, "abc123", 1, 2)
+    else:
+        result = utils.verify_request_packages_data(42, "abc123", 1, 2)
+        assert result == {"verified": True, "errors": []}
+
+    mock_post.assert_called_once_with(
+        "http://cachito.domain.local/api/v1/requests/42/packages/verification",
+        json={"sha256": "abc123", "packages_count": 1, "dependencies_count": 2},
+        timeout=60,
+    )
+
+
+@mock.patch("cachito.workers.tasks.utils.general")
+@mock.patch("cachito.workers.tasks.utils.get_request_state")
+@mock.patch.object(requests_auth_session, "post")
+@mock.patch.object(requests_auth_session, "patch")
+def test_request_updates_held_back(mock_patch, mock_post, mock_get_state, mock_general):
+    mock_get_state.return_value = "in_progress"
+    config_file = {"content": "Y29udGVudA==", "path": "app/.npmrc", "type": "base64"}
+
+    @utils.runs_if_request_in_progress
+    def dummy_task(request_id):
+        utils.update_request_env_vars(request_id, {"A": {"value": "a", "kind": "literal"}})
+        utils.update_request_with_config_files(request_id, [config_file])
+        utils.update_request_env_vars(request_id, {"B": {"value": "b", "kind": "literal"}})
+        mock_post.assert_not_called()
+        # The held back updates are sent along with the state change
+        utils.set_request_state(request_id, "in_progress", "Fetching the dependencies")
+        assert mock_post.call_count == 1
+        # Without held back updates, the state is set as usual
+        utils.set_request_state(request_id, "in_progress", "Still fetching the dependencies")
+        assert mock_patch.call_count == 1
+        utils.set_packages_and_deps_counts(request_id, 1, 2)
+        return 42
+
+    assert dummy_task(42) == 42
+
+    url = "http://cachito.domain.local/api/v1/requests/42/updates"
+    assert mock_post.call_args_list == [
+        mock.call(
+            url,
+            json=[
+                {
+                    "environment_variables": {
+                        "A": {"value": "a", "kind": "literal"},
+                        "B": {"value": "b", "kind": "literal"},
+                    },
+                    "configuration_files": [config_file],
+                },
+                {"state": "in_progress", "state_reason": "Fetching the dependencies"},
+            ],
+            timeout=60,
+        ),
+        # The updates left are sent when the task finishes
+        mock.call(url, json=[{"packages_count": 1, "dependencies_count": 2}], timeout=60),
+    ]
+    mock_general.update_request_env_vars.assert_not_called()
+    mock_general.update_request_with_config_files.assert_not_called()
+
+    # Outside of tasks, the updates are sent right away
+    utils.update_request_env_vars(42, {"A": {"value": "a", "kind": "literal"}})
+    mock_general.update_request_env_vars.assert_called_once_with(
+        42, {"A": {"value": "a", "kind": "literal"}}
+    )
+    utils.update_request_with_config_files(42, [config_file])
+    mock_general.update_request_with_config_files.assert_called_once_with(42, [config_file])
+    assert mock_post.call_count == 2
+
+
+@mock.patch("cachito.workers.tasks.utils.log")
+@mock.patch("cachito.workers.tasks.utils.get_request_state")
+@mock.patch.object(requests_auth_session, "post")
+def test_request_updates_discarded_on_failure(mock_post, mock_get_state, mock_log):
+    mock_get_state.return_value = "in_progress"
+
+    @utils.runs_if_request_in_progress
+    def dummy_task(request_id):
+        utils.set_packages_and_deps_counts(request_id, 1, 2)
+        raise ValueError("Something went wrong")
+
+    with pytest.raises(ValueError, match="Something went wrong"):
+        dummy_task(42)
+
+    mock_post.assert_not_called()
+    mock_log.warning.assert_called_once_with(
+        "Discarding the updates of requests %s since %s failed", "42", "dummy_task"
+    )
+
+
+@pytest.mark.parametrize(
+    "status_error, expected_error",
+    [
+        (requests.ConnectionError("connection failed"), "The connection failed"),
+        (requests.HTTPError("404 Not Found"), "Setting the state"),
+    ],
+)
+@mock.patch("cachito.workers.tasks.utils.get_request_state")
+@mock.patch.object(requests_auth_session, "post")
+def test_request_updates_fail(mock_post, mock_get_state, status_error, expected_error):
+    mock_get_state.return_value = "in_progress"
+    mock_post.return_value.raise_for_status.side_effect = status_error
+
+    @utils.runs_if_request_in_progress
+    def dummy_task(request_id):
+        utils.update_request_env_vars(request_id, {"A": {"value": "a", "kind": "literal"}})
+        utils.set_request_state(request_id, "in_progress", "Fetching the dependencies")
+
+    with pytest.raises(NetworkError, match=expected_error):
+        dummy_task(42)
+
+
 @pytest.mark.parametrize(
     "connect_error, status_error, expect_error",
     [
@@ -1,5 +1,4 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
-import json
 from textwrap import dedent
 from unittest import mock
 
@@ -8,6 +7,7 @@ import pytest
 from cachito.common.paths import RequestBundleDir
 from cachito.errors import InvalidRepoStructure, InvalidRequestData
 from cachito.workers.tasks import yarn
+from tests.helper_utils import load_packages_data
 
 
 @mock.patch("cachito.workers.tasks.yarn.nexus.execute_script")
@@ -286,7 +286,7 @@ def test_fetch_yarn(
             },
         ],
     }
-    assert expected == json.loads(bundle_dir.yarn_packages_data.read_bytes())
+    assert expected == load_packages_data(bundle_dir.yarn_packages_data)
     # /VALIDATION
 
 